@@ -1,96 +1,352 @@
+import time
+
+# Referência para o tempo até a primeira janela (antes dos demais imports)
+INICIO_PROCESSO = time.perf_counter()
+
+import bisect
+import sys
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog
 import sqlite3
-import bcrypt
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+
+from banco import Banco, CAMINHO_PADRAO, epoch_para_texto
+from cache import CacheProdutos
+from movimentacao import LoteInvalidoError
+from autenticacao import CUSTO_BCRYPT, Autenticador, CredenciaisInvalidasError, SessaoExpiradaError
+from servico import ServicoEstoque, criar_usuario_padrao
+from tarefas import ExecutorTarefas
+from instrumentacao import METRICAS, medir_tela
+import alertas
+import arquivamento
+import busca
+import historico
+import locais
+import relatorios
+import snapshots
 
 # ==============================================
-# BANCO DE DADOS
+# INTERFACE GRÁFICA
 # ==============================================
 
-def connect_db():
-    """
-    Cria e retorna uma conexão com o banco de dados SQLite
-    Cria as tabelas se não existirem:
-    - usuarios: armazena os usuários do sistema
-    - produtos: cadastro de itens do estoque
-    - movimentacoes: histórico de entradas/saídas
-    """
-    conn = sqlite3.connect('estoque.db')
-    cursor = conn.cursor()
-    
-    # Tabela de usuários (admin/comum)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY,
-            username TEXT UNIQUE,
-            password TEXT,
-            perfil TEXT
-        )
-    ''')
-    
-    # Tabela de produtos em estoque
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS produtos (
-            id INTEGER PRIMARY KEY,
-            nome TEXT UNIQUE,
-            quantidade INTEGER,
-            quantidade_minima INTEGER
-        )
-    ''')
-    
-    # Tabela de histórico de movimentações
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS movimentacoes (
-            id INTEGER PRIMARY KEY,
-            produto_id INTEGER,
-            tipo TEXT,
-            quantidade INTEGER,
-            data TEXT,
-            usuario TEXT,
-            FOREIGN KEY (produto_id) REFERENCES produtos(id)
-        )
-    ''')
-    
-    conn.commit()
-    return conn
-
-def criar_usuario_padrao():
-    """
-    Cria o usuário admin padrão se não existir
-    Login: admin
-    Senha: admin123 (criptografada)
-    """
-    conn = connect_db()
-    cursor = conn.cursor()
-    try:
-        # Usa INSERT OR IGNORE para evitar duplicação
-        cursor.execute(
-            "INSERT OR IGNORE INTO usuarios (username, password, perfil) VALUES (?, ?, ?)",
-            ("admin", bcrypt.hashpw(b"admin123", bcrypt.gensalt()).decode('utf-8'), "Administrador")
-        )
-        conn.commit()
-    finally:
-        conn.close()
+# Máximo de linhas mantidas na tabela do histórico (as demais são buscadas ao rolar)
+JANELA_HISTORICO = 1000
 
-# ==============================================
-# INTERFACE GRÁFICA
-# ==============================================
+# Pausa na digitação (ms) antes de reaplicar os filtros do histórico
+ATRASO_FILTRO_MS = 400
+
+# Grupos de tarefas cujos resultados só interessam à tela atual
+# (cancelados ao trocar de tela; gravações nunca entram nesses grupos)
+GRUPOS_TELA = ("tela", "produtos", "info_produto", "historico")
+
+# Máximo de produtos exibidos na lista quando há um termo de busca
+LIMITE_BUSCA_LISTA = 500
+
+# Máximo de produtos exibidos na tela de alertas (os mais críticos)
+LIMITE_ALERTAS_TELA = 1000
+
+# Período padrão da tela de relatórios (dias até hoje)
+DIAS_RELATORIO_PADRAO = 30
+
+# Opções de período da tela de relatórios (texto -> período do módulo relatorios)
+PERIODOS_RELATORIO = {"Dia": "dia", "Semana": "semana", "Mês": "mes", "Total do período": None}
+
+# Validade (s) da previsão de demanda usada nas sugestões de estoque mínimo
+VALIDADE_PREVISAO_S = 15 * 60
+
+# Atalho da tela de diagnóstico (somente administradores; fora do menu)
+ATALHO_DIAGNOSTICO = "<Control-Shift-D>"
+
+# Teclas que não alteram o texto da busca de produtos
+TECLAS_NAVEGACAO = ("Up", "Down", "Return", "KP_Enter", "Escape", "Tab")
 
 class ControleEstoqueApp:
-    def __init__(self):
-        """Inicializa a aplicação com configurações básicas"""
+    def __init__(self, caminho_banco=CAMINHO_PADRAO, arquivo_metricas=None, custo_bcrypt=CUSTO_BCRYPT):
+        """
+        Inicializa a aplicação com configurações básicas
+        A janela é exibida antes de o banco estar pronto: migrações e usuário
+        padrão são preparados em segundo plano e o login aguarda por eles.
+        - arquivo_metricas: JSON gravado com as métricas ao encerrar (opcional)
+        - custo_bcrypt: custo do bcrypt para senhas novas (o mesmo do servidor, se
+          os dois usarem o mesmo banco)
+        """
         self.root = tk.Tk()
         self.root.title("Controle de Estoque v3.0")
         self.root.geometry("1100x750")
         self.current_user = None  # Armazena o usuário logado
+        self.sessao = None  # Sessão do login (token usado nas ações que pedem confirmação)
         self.produto_selecionado = None  # Produto selecionado para edição
         
-        # Configurações iniciais
-        criar_usuario_padrao()
+        # Tempos de consultas, telas e tarefas (ver instrumentacao.py)
+        self.metricas = METRICAS
+        self.arquivo_metricas = arquivo_metricas
+        
+        # Produtos exibidos na lista (atualizada de forma incremental)
+        self.produtos_exibidos = {}  # produto_id -> (nome, quantidade, quantidade_minima)
+        self.ordem_produtos = []  # [(nome, produto_id)] na ordem da tabela
+        self.versao_produtos = None  # versão do contador de alterações já aplicada
+        self.filtro_lista_produtos = None  # ids exibidos quando há termo de busca (None = todos)
+        
+        # Índice em memória para a busca de produtos por nome
+        self.indice_produtos = busca.IndiceProdutos()
+        self.sincronizando_indice = False
+        self.indice_desatualizado = False  # nova sincronização pedida durante a atual
+        self.aguardando_indice = []  # funções chamadas quando o índice estiver atualizado
+        self.locais_por_nome = {}  # nome -> id dos locais (preenchido pelos combobox de local)
+
+        # Remoção do histórico dos produtos excluídos (uma tarefa por vez)
+        self.purgando = False
+        self.purga_pedida = False  # nova exclusão durante a remoção atual
+        self.texto_purga = ""
+        self.interromper_purga = threading.Event()  # ligado ao fechar a aplicação
+        
+        # Consultas e bcrypt rodam em segundo plano; a interface só recebe os resultados
+        self.tarefas = ExecutorTarefas(self.root, ao_mudar_ocupado=self._indicar_ocupado,
+                                       ao_erro=self._mostrar_erro_tarefa, metricas=self.metricas)
+        
+        # Conexão persistente com o banco (estrutura criada uma única vez)
+        self.banco = Banco(caminho_banco)
+        self.cache_produtos = CacheProdutos(self.banco)
+        self.previsao = None  # previsão de demanda (calculada ao editar um produto)
+        self.custo_bcrypt = custo_bcrypt
+        self.servico = ServicoEstoque(self.banco, cache=self.cache_produtos,
+                                      autenticador=Autenticador(self.banco, custo=custo_bcrypt))
+        self.root.protocol("WM_DELETE_WINDOW", self._encerrar)
+        
+        # Tempos de inicialização (segundos desde o início do processo)
+        self.tempo_primeira_janela = None
+        self.tempo_banco_pronto = None
+        self.root.bind("<Map>", self._janela_exibida, add="+")
+        
+        # Configurações iniciais (o banco é preparado enquanto a tela de login é exibida)
+        self.preparo_banco = self.tarefas.submeter(self._preparar_banco, ao_concluir=self._banco_pronto,
+                                                   nome="preparar_banco")
         self._configurar_estilos()
         self._mostrar_tela_login()
 
+    def _preparar_banco(self):
+        """Aplica as migrações e cria o usuário padrão (roda em segundo plano)"""
+        self.banco.inicializar()
+        criar_usuario_padrao(self.banco, self.custo_bcrypt)
+
+    # ===== TEMPO DE INICIALIZAÇÃO =====
+    def _janela_exibida(self, event):
+        """Agenda o registro do tempo até a primeira janela (após o primeiro desenho)"""
+        if event.widget is self.root and self.tempo_primeira_janela is None:
+            self.tempo_primeira_janela = 0  # evita agendar duas vezes
+            self.root.after_idle(self._registrar_primeira_janela)
+
+    def _registrar_primeira_janela(self):
+        self.tempo_primeira_janela = time.perf_counter() - INICIO_PROCESSO
+        self.metricas.registrar("inicio", "primeira_janela", self.tempo_primeira_janela)
+
+    def _banco_pronto(self, _):
+        self.tempo_banco_pronto = time.perf_counter() - INICIO_PROCESSO
+        self.metricas.registrar("inicio", "banco_pronto", self.tempo_banco_pronto)
+
+        # Retrato diário do estoque (consultas de estoque em datas passadas)
+        self.tarefas.submeter(snapshots.criar_snapshot_se_necessario, self.banco, nome="snapshot_estoque")
+
+        # Exclusões interrompidas na última execução
+        self._purgar_excluidos()
+
+    def _encerrar(self):
+        """Aguarda as tarefas em andamento, fecha as conexões e encerra a aplicação"""
+        # A remoção do histórico para no próximo bloco e continua na próxima execução
+        self.interromper_purga.set()
+        self.tarefas.encerrar()
+        if self.arquivo_metricas:
+            self.metricas.exportar(self.arquivo_metricas, self._estatisticas_diagnostico())
+        self.servico.encerrar()
+        self.banco.fechar()
+        self.root.destroy()
+
+    # ===== TAREFAS EM SEGUNDO PLANO =====
+    def _indicar_ocupado(self, ocupado):
+        """Mostra o indicador de processamento enquanto há tarefas pendentes"""
+        self.root.config(cursor="watch" if ocupado else "")
+        lbl = getattr(self, "lbl_ocupado", None)
+        if lbl is not None and lbl.winfo_exists():
+            lbl.config(text="⏳ Processando..." if ocupado else "")
+
+    def _mostrar_erro_tarefa(self, erro):
+        """Tratamento padrão dos erros das tarefas"""
+        if isinstance(erro, sqlite3.Error):
+            messagebox.showerror("Erro no Banco de Dados", f"Erro: {str(erro)}")
+        else:
+            messagebox.showerror("Erro", str(erro))
+
+    def _purgar_excluidos(self):
+        """Remove em segundo plano o histórico dos produtos excluídos, mostrando o progresso"""
+        if self.purgando:
+            self.purga_pedida = True
+            return
+        self.purgando = True
+        self.purga_pedida = False
+
+        def progresso(produto, removidas, total):
+            # Chamado na thread da tarefa: a atualização vai para a thread da interface
+            self.tarefas.na_interface(self._mostrar_purga,
+                                      f"🗑️ Removendo histórico de {produto.nome}: {removidas}/{total}")
+
+        def terminar():
+            self.purgando = False
+            self._mostrar_purga("")
+            if self.purga_pedida and not self.interromper_purga.is_set():
+                self._purgar_excluidos()
+
+        def concluir(_):
+            terminar()
+
+        def falhar(e):
+            # O produto continua excluído; a remoção é tentada de novo na próxima execução
+            print(f"Falha ao remover o histórico dos produtos excluídos: {e}", file=sys.stderr)
+            terminar()
+
+        self.tarefas.submeter(self.servico.purgar_pendentes, progresso=progresso,
+                              interromper=self.interromper_purga, ao_concluir=concluir, ao_falhar=falhar,
+                              nome="purgar_excluidos")
+
+    def _mostrar_purga(self, texto):
+        self.texto_purga = texto
+        lbl = getattr(self, "lbl_purga", None)
+        if lbl is not None and lbl.winfo_exists():
+            lbl.config(text=texto)
+
+    def _submeter_com_botao(self, botao, funcao, *args, ao_concluir=None, ao_falhar=None, nome=None):
+        """
+        Submete uma tarefa desabilitando o botão que a disparou até o fim
+        (evita gravar duas vezes com cliques repetidos)
+        """
+        botao.state(["disabled"])
+
+        def liberar():
+            if botao.winfo_exists():
+                botao.state(["!disabled"])
+
+        def concluir(resultado):
+            liberar()
+            if ao_concluir:
+                ao_concluir(resultado)
+
+        def falhar(erro):
+            liberar()
+            (ao_falhar or self._mostrar_erro_tarefa)(erro)
+
+        return self.tarefas.submeter(funcao, *args, ao_concluir=concluir, ao_falhar=falhar, nome=nome)
+
+    def _limpar_conteudo(self):
+        """Limpa a área de conteúdo e descarta as consultas pendentes da tela anterior"""
+        for grupo in GRUPOS_TELA:
+            self.tarefas.cancelar(grupo)
+        for widget in self.frame_conteudo.winfo_children():
+            widget.destroy()
+
+    # ===== BUSCA DE PRODUTOS =====
+    def _sincronizar_indice(self, ao_concluir=None):
+        """
+        Atualiza o índice de busca com as alterações dos produtos (em segundo plano)
+        ao_concluir() é chamada quando o índice estiver atualizado.
+        """
+        if ao_concluir:
+            self.aguardando_indice.append(ao_concluir)
+        if self.sincronizando_indice:
+            # A consulta em andamento pode ser anterior à alteração: repete ao final
+            self.indice_desatualizado = True
+            return
+        self.sincronizando_indice = True
+        self.indice_desatualizado = False
+
+        def aplicar(resultado):
+            self.sincronizando_indice = False
+            alteracoes, novo_indice = resultado
+            if novo_indice is not None:
+                self.indice_produtos.substituir(novo_indice)
+            else:
+                self.indice_produtos.aplicar(alteracoes)
+            if self.indice_desatualizado:
+                self._sincronizar_indice()
+                return
+            pendentes, self.aguardando_indice = self.aguardando_indice, []
+            for funcao in pendentes:
+                funcao()
+
+        def falhar(erro):
+            self.sincronizando_indice = False
+            self.aguardando_indice = []
+            self._mostrar_erro_tarefa(erro)
+
+        self.tarefas.submeter(self._consultar_alteracoes_indice, self.indice_produtos.versao,
+                              ao_concluir=aplicar, ao_falhar=falhar, nome="sincronizar_indice")
+
+    def _consultar_alteracoes_indice(self, versao):
+        """
+        Consulta as alterações para o índice de busca e as aplica também no
+        cache de produtos (roda em segundo plano)
+        """
+        marca = self.cache_produtos.marca_atual()
+        alteracoes, novo_indice = busca.consultar_alteracoes_indice(self.banco, versao)
+        self.cache_produtos.aplicar_alteracoes(alteracoes, marca)
+        return alteracoes, novo_indice
+
+    def _configurar_busca_produto(self, combo, extras=(), ao_selecionar=None):
+        """
+        Transforma o combobox em uma busca incremental pelo nome do produto
+        Parâmetros:
+        - extras: opções fixas exibidas antes dos produtos (ex.: 'Todos')
+        - ao_selecionar: chamada quando um produto é escolhido na lista ou com Enter
+        """
+        def sugerir(event=None):
+            if not combo.winfo_exists() or (event is not None and event.keysym in TECLAS_NAVEGACAO):
+                return
+            texto = combo.get()
+            if texto in extras or self._produto_do_combo(combo) is not None:
+                return
+            ids = self.indice_produtos.buscar(texto)
+            combo['values'] = list(extras) + [self.indice_produtos.rotulo(i) for i in ids]
+
+        def confirmar(event=None):
+            # Enter com o texto incompleto escolhe a primeira sugestão
+            if combo.get() not in extras and self._produto_do_combo(combo) is None:
+                opcoes = combo['values'][len(extras):]
+                if not opcoes:
+                    return
+                combo.set(opcoes[0])
+            if ao_selecionar:
+                ao_selecionar()
+
+        combo.bind("<KeyRelease>", sugerir, add="+")
+        combo.bind("<Return>", confirmar, add="+")
+        if ao_selecionar:
+            combo.bind("<<ComboboxSelected>>", lambda e: ao_selecionar(), add="+")
+        self._sincronizar_indice(sugerir)
+
+    def _produto_do_combo(self, combo):
+        """Retorna o id do produto escolhido no combobox de busca (ou None)"""
+        return self.indice_produtos.produto_do_rotulo(combo.get())
+
+    # ===== SELEÇÃO DE LOCAIS =====
+    def _carregar_locais(self, *combos, extras=()):
+        """
+        Preenche os combobox com os locais (em segundo plano)
+        - extras: opções fixas antes dos locais (ex.: 'Todos'); a primeira opção
+          fica selecionada nos combobox ainda vazios
+        """
+        def preencher(lista):
+            self.locais_por_nome = {local.nome: local.id for local in lista}
+            for combo in combos:
+                if combo.winfo_exists():
+                    combo['values'] = list(extras) + [local.nome for local in lista]
+                    if not combo.get():
+                        combo.current(0)
+
+        self.tarefas.submeter(self.servico.listar_locais, ao_concluir=preencher, grupo="tela", nome="listar_locais")
+
+    def _local_do_combo(self, combo):
+        """Retorna o id do local escolhido no combobox (ou None)"""
+        return self.locais_por_nome.get(combo.get())
+
     def _configurar_estilos(self):
         """Configura os temas e estilos visuais da interface"""
         style = ttk.Style()
@@ -109,8 +365,11 @@ class ControleEstoqueApp:
     def _mostrar_tela_login(self):
         """Exibe a tela de login com campos para usuário e senha"""
         # Limpa a tela removendo todos os widgets
+        for grupo in GRUPOS_TELA:
+            self.tarefas.cancelar(grupo)
         for widget in self.root.winfo_children():
             widget.destroy()
+        self.root.unbind(ATALHO_DIAGNOSTICO)
 
         frame = ttk.Frame(self.root, padding=20)
         frame.pack(expand=True)
@@ -129,31 +388,69 @@ class ControleEstoqueApp:
         self.entry_pass.grid(row=2, column=1, pady=5, padx=5)
 
         # Botão de login
-        ttk.Button(frame, text="Login", command=self._fazer_login).grid(row=3, columnspan=2, pady=20)
+        self.btn_login = ttk.Button(frame, text="Login", command=self._fazer_login)
+        self.btn_login.grid(row=3, columnspan=2, pady=20)
     
     def _fazer_login(self):
-        """Valida as credenciais e faz o login do usuário"""
+        """Valida as credenciais (em segundo plano) e faz o login do usuário"""
         username = self.entry_user.get()
         password = self.entry_pass.get()
 
-        conn = connect_db()
-        cursor = conn.cursor()
-        try:
-            # Busca o usuário no banco de dados
-            cursor.execute("SELECT password, perfil FROM usuarios WHERE username=?", (username,))
-            resultado = cursor.fetchone()
-            
-            # Verifica a senha com bcrypt
-            if resultado and bcrypt.checkpw(password.encode('utf-8'), resultado[0].encode('utf-8')):
-                self.current_user = {
-                    'username': username,
-                    'perfil': resultado[1]  # 'Administrador' ou 'Comum'
-                }
-                self._mostrar_tela_principal()  # Vai para a tela principal
+        def verificar():
+            # O banco precisa estar preparado antes da consulta
+            self.preparo_banco.futuro.result()
+            return self.servico.iniciar_sessao(username, password)
+
+        def concluir(sessao):
+            self.sessao = sessao
+            self.current_user = sessao.usuario  # {'username', 'perfil' ('Administrador' ou 'Comum')}
+            self._mostrar_tela_principal()  # Vai para a tela principal
+
+        def falhar(e):
+            if isinstance(e, CredenciaisInvalidasError):
+                messagebox.showerror("Erro", str(e))
+            else:
+                self._mostrar_erro_tarefa(e)
+
+        self._submeter_com_botao(self.btn_login, verificar, ao_concluir=concluir, ao_falhar=falhar, nome="login")
+
+    def _sair(self):
+        """Encerra a sessão e volta para a tela de login"""
+        if self.sessao is not None:
+            self.servico.encerrar_sessao(self.sessao.token)
+            self.sessao = None
+        self._mostrar_tela_login()
+
+    def _confirmar_sessao(self):
+        """
+        Verifica se a sessão do login ainda vale (usado em segundo plano antes
+        de ações que pedem confirmação); lança SessaoExpiradaError
+        """
+        return self.servico.validar_sessao(self.sessao.token if self.sessao else None)
+
+    def _reautenticar(self, ao_confirmar):
+        """Pede a senha do usuário logado, renova a sessão e chama ao_confirmar()"""
+        senha = simpledialog.askstring("Confirmar Identidade",
+                                       f"Sessão expirada. Senha de {self.current_user['username']}:",
+                                       show="*", parent=self.root)
+        if not senha:
+            return
+
+        def concluir(sessao):
+            # A sessão anterior (vencida ou não) deixa de valer
+            if self.sessao is not None:
+                self.servico.encerrar_sessao(self.sessao.token)
+            self.sessao = sessao
+            ao_confirmar()
+
+        def falhar(e):
+            if isinstance(e, CredenciaisInvalidasError):
+                messagebox.showerror("Erro", str(e))
             else:
-                messagebox.showerror("Erro", "Credenciais inválidas!")
-        finally:
-            conn.close()
+                self._mostrar_erro_tarefa(e)
+
+        self.tarefas.submeter(self.servico.iniciar_sessao, self.current_user['username'], senha,
+                              ao_concluir=concluir, ao_falhar=falhar, nome="reautenticar")
 
     # ===== TELA PRINCIPAL =====
     def _mostrar_tela_principal(self):
@@ -168,7 +465,19 @@ class ControleEstoqueApp:
         
         ttk.Label(frame_superior, 
                  text=f"Usuário: {self.current_user['username']} ({self.current_user['perfil']})").pack(side=tk.LEFT)
-        ttk.Button(frame_superior, text="Sair", command=self._mostrar_tela_login).pack(side=tk.RIGHT)
+        ttk.Button(frame_superior, text="Sair", command=self._sair).pack(side=tk.RIGHT)
+
+        # Diagnóstico: atalho sem item de menu, apenas para administradores
+        if self.current_user['perfil'] == "Administrador":
+            self.root.bind(ATALHO_DIAGNOSTICO, lambda event: self._mostrar_diagnostico())
+        else:
+            self.root.unbind(ATALHO_DIAGNOSTICO)
+        
+        # Indicador de tarefas em andamento
+        self.lbl_ocupado = ttk.Label(frame_superior, text="⏳ Processando..." if self.tarefas.ocupado else "")
+        self.lbl_ocupado.pack(side=tk.RIGHT, padx=10)
+        self.lbl_purga = ttk.Label(frame_superior, text=self.texto_purga)
+        self.lbl_purga.pack(side=tk.RIGHT, padx=10)
 
         # Menu principal
         frame_menu = ttk.Frame(self.root)
@@ -178,7 +487,11 @@ class ControleEstoqueApp:
         botoes_menu = [
             ("📦 Produtos", self._mostrar_lista_produtos),
             ("🔃 Movimentação", self._mostrar_movimentacao),
-            ("📊 Histórico", self._mostrar_historico)
+            ("📋 Movimentação em Lote", self._mostrar_movimentacao_lote),
+            ("📊 Histórico", self._mostrar_historico),
+            ("🏬 Locais", self._mostrar_locais),
+            ("🔔 Alertas", self._mostrar_alertas),
+            ("📈 Relatórios", self._mostrar_relatorios)
         ]
         
         for texto, comando in botoes_menu:
@@ -196,6 +509,7 @@ class ControleEstoqueApp:
         self._mostrar_lista_produtos()
 
     # ===== CADASTRO/EDIÇÃO DE PRODUTOS =====
+    @medir_tela("formulario_produto")
     def _mostrar_formulario_produto(self, mode="cadastro", produto_id=None):
         """
         Exibe o formulário para cadastrar ou editar produtos
@@ -204,8 +518,7 @@ class ControleEstoqueApp:
         - produto_id: ID do produto para edição (opcional)
         """
         # Limpa a área de conteúdo
-        for widget in self.frame_conteudo.winfo_children():
-            widget.destroy()
+        self._limpar_conteudo()
 
         frame = ttk.Frame(self.frame_conteudo, padding=20)
         frame.pack(expand=True)
@@ -223,17 +536,14 @@ class ControleEstoqueApp:
 
         # Se for edição, carrega os dados do produto
         if mode == "edicao" and produto_id:
-            conn = connect_db()
-            try:
-                cursor = conn.cursor()
-                cursor.execute("SELECT nome, quantidade, quantidade_minima FROM produtos WHERE id=?", (produto_id,))
-                resultado = cursor.fetchone()
-                if resultado:
-                    campos[0][1].set(resultado[0])  # Nome
-                    campos[1][1].set(resultado[1])  # Quantidade
-                    campos[2][1].set(resultado[2])  # Quantidade mínima
-            finally:
-                conn.close()
+            def preencher(registro):
+                if registro:
+                    campos[0][1].set(registro.nome)  # Nome
+                    campos[1][1].set(registro.quantidade)  # Quantidade
+                    campos[2][1].set(registro.quantidade_minima)  # Quantidade mínima
+
+            self.tarefas.submeter(self.servico.obter_produto, produto_id,
+                                  ao_concluir=preencher, grupo="tela", nome="carregar_produto")
 
         # Cria os campos do formulário
         entries = []
@@ -248,34 +558,84 @@ class ControleEstoqueApp:
                 entry.config(validate="key", 
                            validatecommand=(frame.register(lambda p: p.isdigit() or p == ""), '%P'))
 
+        # Mínimo sugerido pelo consumo (apenas na edição)
+        if mode == "edicao" and produto_id:
+            self._mostrar_sugestao_minimo(frame, produto_id, campos[2][1])
+
         # Frame para os botões
         btn_frame = ttk.Frame(frame)
-        btn_frame.grid(row=4, columnspan=2, pady=20)
+        btn_frame.grid(row=5, columnspan=2, pady=20)
 
         if mode == "edicao":
             # Botões para edição
-            ttk.Button(btn_frame, text="Salvar Alterações", 
+            self.btn_salvar_produto = ttk.Button(btn_frame, text="Salvar Alterações", 
                       command=lambda: self._salvar_produto(
                           produto_id,
                           campos[0][1].get(),
                           campos[1][1].get(),
                           campos[2][1].get()
-                      )).pack(side=tk.LEFT, padx=5)
+                      ))
+            self.btn_salvar_produto.pack(side=tk.LEFT, padx=5)
             
             ttk.Button(btn_frame, text="Cancelar", 
                       command=self._mostrar_lista_produtos).pack(side=tk.LEFT, padx=5)
             
-            ttk.Button(btn_frame, text="Excluir Produto", 
+            self.btn_excluir_produto = ttk.Button(btn_frame, text="Excluir Produto", 
                       command=lambda: self._confirmar_exclusao_produto(produto_id),
-                      style="Red.TButton").pack(side=tk.RIGHT, padx=5)
+                      style="Red.TButton")
+            self.btn_excluir_produto.pack(side=tk.RIGHT, padx=5)
         else:
             # Botão para cadastro
-            ttk.Button(btn_frame, text="Cadastrar", 
+            self.btn_cadastrar_produto = ttk.Button(btn_frame, text="Cadastrar", 
                       command=lambda: self._cadastrar_produto(
                           campos[0][1].get(),
                           campos[1][1].get(),
                           campos[2][1].get()
-                      )).pack(side=tk.LEFT)
+                      ))
+            self.btn_cadastrar_produto.pack(side=tk.LEFT)
+
+    def _mostrar_sugestao_minimo(self, frame, produto_id, var_minimo):
+        """Exibe o estoque mínimo sugerido pela previsão de demanda, com opção de usá-lo"""
+        frame_sugestao = ttk.Frame(frame)
+        frame_sugestao.grid(row=4, columnspan=2, sticky='w', pady=5)
+        lbl = ttk.Label(frame_sugestao, text="Calculando mínimo sugerido...")
+        lbl.pack(side=tk.LEFT)
+        btn_usar = ttk.Button(frame_sugestao, text="Usar sugestão", state=tk.DISABLED)
+        btn_usar.pack(side=tk.LEFT, padx=5)
+
+        def exibir(previsao):
+            if not lbl.winfo_exists():
+                return
+            sugestao = previsao.sugestao_produto(produto_id)
+            if sugestao is None:
+                lbl.config(text="Sem sugestão para este produto (nenhuma movimentação no histórico)")
+                return
+            lbl.config(text=f"Mínimo sugerido: {sugestao.minimo_sugerido} "
+                            f"(saída média {sugestao.demanda_diaria:.1f}/dia, "
+                            f"entrega em {previsao.prazo_entrega:g} dias)")
+            btn_usar.config(state=tk.NORMAL, command=lambda: var_minimo.set(sugestao.minimo_sugerido))
+
+        def falhar(e):
+            if isinstance(e, ImportError):
+                if lbl.winfo_exists():
+                    lbl.config(text="Sugestão de mínimo indisponível (requer numpy)")
+            else:
+                self._mostrar_erro_tarefa(e)
+
+        self.tarefas.submeter(self._calcular_previsao, ao_concluir=exibir, ao_falhar=falhar,
+                              grupo="tela", nome="previsao_demanda")
+
+    def _calcular_previsao(self):
+        """
+        Retorna a previsão de demanda do catálogo inteiro (roda em segundo plano)
+        Reaproveitada por VALIDADE_PREVISAO_S segundos entre os produtos abertos.
+        """
+        import previsao  # numpy é carregado apenas aqui
+
+        atual = self.previsao
+        if atual is None or time.time() - atual.calculado_em > VALIDADE_PREVISAO_S:
+            atual = self.previsao = previsao.calcular_previsoes(self.banco)
+        return atual
 
     def _salvar_produto(self, produto_id, nome, quantidade, quantidade_minima):
         """Salva as alterações de um produto existente no banco de dados"""
@@ -284,33 +644,28 @@ class ControleEstoqueApp:
             messagebox.showerror("Erro", "Preencha todos os campos!")
             return
 
-        try:
-            conn = connect_db()
-            cursor = conn.cursor()
-            
-            # Atualiza o produto no banco
-            cursor.execute(
-                "UPDATE produtos SET nome=?, quantidade=?, quantidade_minima=? WHERE id=?",
-                (nome, int(quantidade), int(quantidade_minima), produto_id)
-            )
-            
-            conn.commit()
+        def concluir(_):
             messagebox.showinfo("Sucesso", "Produto atualizado com sucesso!")
-            self._mostrar_lista_produtos()  # Atualiza a lista
-            
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Erro", "Já existe um produto com este nome!")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao atualizar: {str(e)}")
-        finally:
-            if 'conn' in locals():
-                conn.close()
+            if self.btn_salvar_produto.winfo_exists():
+                self._mostrar_lista_produtos()  # Atualiza a lista
+
+        def falhar(e):
+            if isinstance(e, ValueError):
+                messagebox.showerror("Erro", str(e))  # nome duplicado, campos inválidos...
+            else:
+                messagebox.showerror("Erro", f"Falha ao atualizar: {str(e)}")
+
+        # Atualiza o produto no banco
+        self._submeter_com_botao(self.btn_salvar_produto, self.servico.atualizar_produto,
+                                produto_id, nome, quantidade, quantidade_minima, self.current_user['username'],
+                                ao_concluir=concluir, ao_falhar=falhar, nome="salvar_produto")
 
     def _confirmar_exclusao_produto(self, produto_id):
         """Exibe confirmação antes de excluir um produto"""
         resposta = messagebox.askyesno(
             "Confirmar Exclusão", 
-            "Tem certeza que deseja excluir este produto?\nTodas as movimentações relacionadas também serão excluídas!",
+            "Tem certeza que deseja excluir este produto?\nTodas as movimentações relacionadas também serão excluídas "
+            "(em segundo plano)!",
             icon='warning'
         )
         
@@ -318,33 +673,38 @@ class ControleEstoqueApp:
             self._excluir_produto(produto_id)
 
     def _excluir_produto(self, produto_id):
-        """Remove um produto e suas movimentações do banco de dados"""
-        conn = connect_db()
-        try:
-            cursor = conn.cursor()
-            
-            # Primeiro exclui as movimentações relacionadas
-            cursor.execute("DELETE FROM movimentacoes WHERE produto_id=?", (produto_id,))
-            
-            # Depois exclui o produto
-            cursor.execute("DELETE FROM produtos WHERE id=?", (produto_id,))
-            
-            conn.commit()
+        """
+        Exclui um produto (some da lista na hora) e agenda a remoção das suas movimentações
+        Exige uma sessão válida: se ela tiver expirado, a senha é pedida novamente.
+        """
+        def excluir():
+            self._confirmar_sessao()  # consulta em memória, sem bcrypt
+            self.servico.excluir_produto(produto_id)
+
+        def concluir(_):
+            self._purgar_excluidos()
             messagebox.showinfo("Sucesso", "Produto excluído com sucesso!")
-            self._mostrar_lista_produtos()  # Atualiza a lista
-            
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao excluir: {str(e)}")
-            conn.rollback()
-        finally:
-            conn.close()
+            if self.btn_excluir_produto.winfo_exists():
+                self._mostrar_lista_produtos()  # Atualiza a lista
+
+        def falhar(e):
+            if isinstance(e, SessaoExpiradaError):
+                def repetir():
+                    if self.btn_excluir_produto.winfo_exists():
+                        self._excluir_produto(produto_id)
+                self._reautenticar(repetir)
+            else:
+                messagebox.showerror("Erro", f"Falha ao excluir: {str(e)}")
+
+        self._submeter_com_botao(self.btn_excluir_produto, excluir, ao_concluir=concluir, ao_falhar=falhar,
+                                 nome="excluir_produto")
 
     # ===== LISTAGEM DE PRODUTOS =====
+    @medir_tela("lista_produtos")
     def _mostrar_lista_produtos(self):
         """Exibe a lista de produtos em formato de tabela"""
         # Limpa a área de conteúdo
-        for widget in self.frame_conteudo.winfo_children():
-            widget.destroy()
+        self._limpar_conteudo()
 
         frame = ttk.Frame(self.frame_conteudo)
         frame.pack(expand=True, fill=tk.BOTH)
@@ -358,6 +718,20 @@ class ControleEstoqueApp:
         
         ttk.Button(frame_toolbar, text="🔄 Atualizar", 
                   command=self._carregar_produtos).pack(side=tk.LEFT, padx=5)
+        
+        self.btn_importar = ttk.Button(frame_toolbar, text="📥 Importar", 
+                  command=self._importar_arquivo)
+        self.btn_importar.pack(side=tk.LEFT)
+        
+        # Progresso da importação
+        self.lbl_importacao = ttk.Label(frame_toolbar, text="")
+        self.lbl_importacao.pack(side=tk.LEFT, padx=10)
+        
+        # Busca por nome (sem acentos e sem diferenciar maiúsculas)
+        self.entry_busca_produtos = ttk.Entry(frame_toolbar, width=30)
+        self.entry_busca_produtos.pack(side=tk.RIGHT)
+        self.entry_busca_produtos.bind("<KeyRelease>", lambda e: self._filtrar_lista_produtos())
+        ttk.Label(frame_toolbar, text="🔍 Buscar:").pack(side=tk.RIGHT, padx=5)
 
         # Cria a tabela (Treeview)
         colunas = ("ID", "Nome", "Estoque", "Mínimo", "Status")
@@ -390,43 +764,359 @@ class ControleEstoqueApp:
         # Evento de duplo clique para edição
         self.tree_produtos.bind("<Double-1>", self._editar_produto_selecionado)
         
-        # Carrega os dados
+        # Reexibe os produtos já carregados e busca apenas as alterações
+        self.filtro_lista_produtos = None
+        self._preencher_lista_produtos([id_ for nome, id_ in self.ordem_produtos])
         self._carregar_produtos()
 
+    def _preencher_lista_produtos(self, ids):
+        """Recria as linhas da tabela com os produtos informados (dados já em memória)"""
+        self.tree_produtos.delete(*self.tree_produtos.get_children())
+        for id_ in ids:
+            valores, tags = self._valores_linha_produto(id_, *self.produtos_exibidos[id_])
+            self.tree_produtos.insert("", tk.END, iid=str(id_), values=valores, tags=tags)
+
+    def _filtrar_lista_produtos(self):
+        """Exibe apenas os produtos cujo nome corresponde à busca (índice em memória)"""
+        termo = self.entry_busca_produtos.get().strip()
+        if not termo:
+            if self.filtro_lista_produtos is None:
+                return
+            self.filtro_lista_produtos = None
+            ids = [id_ for nome, id_ in self.ordem_produtos]
+        else:
+            ids = [id_ for id_ in self.indice_produtos.buscar(termo, LIMITE_BUSCA_LISTA)
+                   if id_ in self.produtos_exibidos]
+            self.filtro_lista_produtos = set(ids)
+        self._preencher_lista_produtos(ids)
+
+    def _importar_arquivo(self):
+        """Importa produtos ou movimentações de um arquivo CSV/JSON-lines"""
+        from tkinter import filedialog
+
+        caminho = filedialog.askopenfilename(
+            title="Importar arquivo",
+            filetypes=[("CSV ou JSON-lines", "*.csv *.jsonl *.ndjson *.json *.gz"), ("Todos", "*.*")]
+        )
+        if not caminho:
+            return
+
+        # As linhas recusadas vão para um CSV ao lado do arquivo importado
+        caminho_rejeitados = caminho + ".rejeitados.csv"
+
+        def mostrar_progresso(lidas, importadas, rejeitadas):
+            if self.lbl_importacao.winfo_exists():
+                self.lbl_importacao.config(text=f"{lidas} lidas, {importadas} importadas, {rejeitadas} rejeitadas")
+
+        def progresso(*contagens):
+            # Chamado na thread da importação: a atualização vai para a thread da interface
+            self.tarefas.na_interface(mostrar_progresso, *contagens)
+
+        def importar():
+            from importacao import Importador  # carregado apenas ao importar
+
+            importador = Importador(self.banco, self.current_user['username'], progresso=progresso)
+            return importador.importar(caminho, caminho_rejeitados=caminho_rejeitados)
+
+        def concluir(resumo):
+            mensagem = f"{resumo.importadas} de {resumo.lidas} registros importados."
+            if resumo.rejeitadas:
+                mensagem += f"\n{resumo.rejeitadas} rejeitados (veja {caminho_rejeitados})"
+            messagebox.showinfo("Importação concluída", mensagem)
+            if self.tree_produtos.winfo_exists():
+                self._carregar_produtos()
+
+        def falhar(e):
+            if isinstance(e, (OSError, ValueError, sqlite3.Error)):
+                messagebox.showerror("Erro", f"Falha ao importar: {str(e)}")
+            else:
+                self._mostrar_erro_tarefa(e)
+
+        self._submeter_com_botao(self.btn_importar, importar, ao_concluir=concluir, ao_falhar=falhar,
+                                nome="importar")
+
     def _editar_produto_selecionado(self, event):
         """Abre o formulário de edição quando um produto é selecionado"""
         item = self.tree_produtos.selection()[0]
-        produto_id = self.tree_produtos.item(item, 'values')[0]
+        produto_id = int(self.tree_produtos.item(item, 'values')[0])
         self._mostrar_formulario_produto("edicao", produto_id)
 
     def _carregar_produtos(self):
-        """Carrega os produtos do banco de dados e exibe na tabela"""
-        # Limpa a tabela
-        for item in self.tree_produtos.get_children():
-            self.tree_produtos.delete(item)
-            
-        conn = connect_db()
+        """
+        Atualiza a tabela de produtos aplicando apenas as alterações desde a
+        última consulta (contador de versão mantido pelos gatilhos do banco)
+        """
+        # O índice de busca acompanha as mesmas alterações
+        self._sincronizar_indice()
+
+        # Apenas a consulta mais recente é aplicada
+        self.tarefas.cancelar("produtos")
+        self.tarefas.submeter(self.servico.alteracoes_produtos, self.versao_produtos,
+                              ao_concluir=self._aplicar_alteracoes_produtos, grupo="produtos",
+                              nome="carregar_produtos")
+
+    def _aplicar_alteracoes_produtos(self, resultado):
+        """Aplica na tabela o resultado de produtos.consultar_alteracoes()"""
+        if not self.tree_produtos.winfo_exists():
+            return
+        versao, alterados, removidos, completo = resultado
+        if completo:
+            # Carga completa: os produtos que não vieram mais foram excluídos
+            removidos = set(self.produtos_exibidos) - {p[0] for p in alterados}
+
+        for produto_id in removidos:
+            self._remover_linha_produto(produto_id)
+        for produto in alterados:
+            self._atualizar_linha_produto(*produto)
+        self.versao_produtos = versao
+
+    def _valores_linha_produto(self, id_, nome, qtd, min_qtd):
+        """Retorna (valores, tags) da linha de um produto na tabela"""
+        # Define o status com base no estoque
+        status = "OK" if qtd >= min_qtd else f"ESTOQUE BAIXO (mín: {min_qtd})"
+        
+        # Aplica estilo diferente para estoque baixo
+        tags = ('alerta',) if qtd < min_qtd else ()
+        return (id_, nome, qtd, min_qtd, status), tags
+
+    def _atualizar_linha_produto(self, id_, nome, qtd, min_qtd):
+        """Insere ou atualiza a linha de um produto, mantendo a ordem por nome"""
+        anterior = self.produtos_exibidos.get(id_)
+        if anterior == (nome, qtd, min_qtd):
+            return
+
+        # Nova posição na ordem por nome (apenas se o produto é novo ou mudou de nome)
+        posicao = None
+        if anterior is None or anterior[0] != nome:
+            if anterior is not None:
+                self.ordem_produtos.pop(bisect.bisect_left(self.ordem_produtos, (anterior[0], id_)))
+            posicao = bisect.bisect_left(self.ordem_produtos, (nome, id_))
+            self.ordem_produtos.insert(posicao, (nome, id_))
+        self.produtos_exibidos[id_] = (nome, qtd, min_qtd)
+
+        # A linha da tabela usa o id do produto como iid
+        iid = str(id_)
+        valores, tags = self._valores_linha_produto(id_, nome, qtd, min_qtd)
+        if self.filtro_lista_produtos is not None:
+            # Com busca ativa, apenas as linhas exibidas são atualizadas (sem reordenar)
+            if self.tree_produtos.exists(iid):
+                self.tree_produtos.item(iid, values=valores, tags=tags)
+        elif self.tree_produtos.exists(iid):
+            self.tree_produtos.item(iid, values=valores, tags=tags)
+            if posicao is not None:
+                self.tree_produtos.move(iid, "", posicao)
+        else:
+            self.tree_produtos.insert("", posicao, iid=iid, values=valores, tags=tags)
+
+    def _remover_linha_produto(self, id_):
+        """Remove a linha de um produto excluído"""
+        anterior = self.produtos_exibidos.pop(id_, None)
+        if anterior is None:
+            return
+        self.ordem_produtos.pop(bisect.bisect_left(self.ordem_produtos, (anterior[0], id_)))
+        if self.tree_produtos.exists(str(id_)):
+            self.tree_produtos.delete(str(id_))
+
+    # ===== ALERTAS DE ESTOQUE BAIXO =====
+    @medir_tela("alertas")
+    def _mostrar_alertas(self):
+        """Exibe os produtos abaixo do estoque mínimo (candidatos à reposição)"""
+        self._limpar_conteudo()
+
+        frame = ttk.Frame(self.frame_conteudo)
+        frame.pack(expand=True, fill=tk.BOTH)
+
+        # Barra de ferramentas
+        frame_toolbar = ttk.Frame(frame)
+        frame_toolbar.pack(fill=tk.X, pady=5)
+
+        ttk.Button(frame_toolbar, text="🔄 Atualizar",
+                  command=self._carregar_alertas).pack(side=tk.LEFT)
+
+        self.lbl_total_alertas = ttk.Label(frame_toolbar, text="")
+        self.lbl_total_alertas.pack(side=tk.LEFT, padx=10)
+
+        # Cria a tabela (mais críticos primeiro)
+        colunas = ("ID", "Nome", "Estoque", "Mínimo", "Repor")
+        self.tree_alertas = ttk.Treeview(frame, columns=colunas, show="headings", selectmode="browse")
+
+        for col in colunas:
+            self.tree_alertas.heading(col, text=col)
+            self.tree_alertas.column(col, width=80, anchor='center')
+        self.tree_alertas.column("Nome", width=250, anchor='w')
+
+        self.tree_alertas.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+
+        scroll = ttk.Scrollbar(self.tree_alertas, orient="vertical", command=self.tree_alertas.yview)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_alertas.configure(yscrollcommand=scroll.set)
+
+        # Duplo clique abre o produto para edição
+        self.tree_alertas.bind("<Double-1>", self._editar_produto_alerta)
+
+        self._carregar_alertas()
+
+    def _carregar_alertas(self):
+        """Consulta os alertas em segundo plano (índice parcial, sem percorrer o catálogo)"""
+        def consultar():
+            return alertas.consultar_alertas(self.banco, LIMITE_ALERTAS_TELA), alertas.contar_alertas(self.banco)
+
+        self.tarefas.cancelar("tela")
+        self.tarefas.submeter(consultar, ao_concluir=self._exibir_alertas, grupo="tela", nome="carregar_alertas")
+
+    def _exibir_alertas(self, resultado):
+        """Preenche a tabela de alertas"""
+        if not self.tree_alertas.winfo_exists():
+            return
+        lista, total = resultado
+        self.tree_alertas.delete(*self.tree_alertas.get_children())
+        for alerta in lista:
+            self.tree_alertas.insert("", tk.END, iid=str(alerta.produto_id), values=(
+                alerta.produto_id, alerta.nome, alerta.quantidade, alerta.quantidade_minima, alerta.falta
+            ))
+
+        if total == 0:
+            texto = "Nenhum produto abaixo do estoque mínimo"
+        elif total > len(lista):
+            texto = f"{total} produtos abaixo do mínimo (exibindo os {len(lista)} mais críticos)"
+        else:
+            texto = f"{total} produto(s) abaixo do mínimo"
+        self.lbl_total_alertas.config(text=texto)
+
+    def _editar_produto_alerta(self, event):
+        """Abre o formulário de edição do produto selecionado nos alertas"""
+        selecao = self.tree_alertas.selection()
+        if selecao:
+            self._mostrar_formulario_produto("edicao", int(selecao[0]))
+
+    # ===== RELATÓRIOS DE CONSUMO =====
+    @medir_tela("relatorios")
+    def _mostrar_relatorios(self):
+        """Exibe o consumo (saídas - entradas) por produto e período (tabelas de totais)"""
+        self._limpar_conteudo()
+
+        frame = ttk.Frame(self.frame_conteudo)
+        frame.pack(expand=True, fill=tk.BOTH)
+
+        ttk.Label(frame, text="Relatórios de Consumo", font=('Arial', 14)).pack(pady=10)
+
+        frame_filtros = ttk.Frame(frame)
+        frame_filtros.pack(fill=tk.X, padx=10)
+
+        ttk.Label(frame_filtros, text="Período:").pack(side=tk.LEFT)
+        self.cb_rel_periodo = ttk.Combobox(frame_filtros, values=list(PERIODOS_RELATORIO),
+                                           state="readonly", width=15)
+        self.cb_rel_periodo.current(0)
+        self.cb_rel_periodo.pack(side=tk.LEFT, padx=(2, 8))
+
+        hoje = datetime.now().date()
+        ttk.Label(frame_filtros, text="De:").pack(side=tk.LEFT)
+        self.entry_rel_de = ttk.Entry(frame_filtros, width=11)
+        self.entry_rel_de.insert(0, (hoje - timedelta(days=DIAS_RELATORIO_PADRAO)).isoformat())
+        self.entry_rel_de.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(frame_filtros, text="Até:").pack(side=tk.LEFT)
+        self.entry_rel_ate = ttk.Entry(frame_filtros, width=11)
+        self.entry_rel_ate.insert(0, hoje.isoformat())
+        self.entry_rel_ate.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(frame_filtros, text="Produto:").pack(side=tk.LEFT)
+        self.cb_rel_produto = ttk.Combobox(frame_filtros, width=30)
+        self.cb_rel_produto['values'] = ["Todos"]
+        self.cb_rel_produto.current(0)
+        self._configurar_busca_produto(self.cb_rel_produto, extras=("Todos",),
+                                       ao_selecionar=self._gerar_relatorio)
+        self.cb_rel_produto.pack(side=tk.LEFT, padx=(2, 8))
+
+        self.btn_gerar_relatorio = ttk.Button(frame_filtros, text="Gerar", command=self._gerar_relatorio)
+        self.btn_gerar_relatorio.pack(side=tk.LEFT, padx=5)
+        self.cb_rel_periodo.bind("<<ComboboxSelected>>", lambda e: self._gerar_relatorio())
+
+        self.lbl_relatorio = ttk.Label(frame, text="")
+        self.lbl_relatorio.pack(anchor='w', padx=10)
+
+        # Cria a tabela
+        colunas = ("Período", "ID", "Produto", "Entradas", "Saídas", "Consumo")
+        self.tree_relatorio = ttk.Treeview(frame, columns=colunas, show="headings", height=20)
+        for col in colunas:
+            self.tree_relatorio.heading(col, text=col)
+            self.tree_relatorio.column(col, width=90, anchor='center')
+        self.tree_relatorio.column("Período", width=170)
+        self.tree_relatorio.column("ID", width=50)
+        self.tree_relatorio.column("Produto", width=220, anchor='w')
+        self.tree_relatorio.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+
+        scroll = ttk.Scrollbar(self.tree_relatorio, orient="vertical", command=self.tree_relatorio.yview)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_relatorio.configure(yscrollcommand=scroll.set)
+
+        self._gerar_relatorio()
+
+    def _gerar_relatorio(self):
+        """Lê os filtros e consulta o relatório em segundo plano"""
+        if not self.tree_relatorio.winfo_exists():
+            return
+
+        produto_id = None
+        if self.cb_rel_produto.get().strip() not in ("", "Todos"):
+            produto_id = self._produto_do_combo(self.cb_rel_produto)
+            if produto_id is None:
+                self.lbl_relatorio.config(text="Escolha o produto na lista", style="Red.TLabel")
+                return
+
+        de = self.entry_rel_de.get().strip()
+        ate = self.entry_rel_ate.get().strip()
+        periodo = PERIODOS_RELATORIO[self.cb_rel_periodo.get()]
         try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, nome, quantidade, quantidade_minima FROM produtos ORDER BY nome")
-            
-            for produto in cursor.fetchall():
-                id_, nome, qtd, min_qtd = produto
-                # Define o status com base no estoque
-                status = "OK" if qtd >= min_qtd else f"ESTOQUE BAIXO (mín: {min_qtd})"
-                
-                # Aplica estilo diferente para estoque baixo
-                tags = ('alerta',) if qtd < min_qtd else ()
-                self.tree_produtos.insert("", tk.END, values=(id_, nome, qtd, min_qtd, status), tags=tags)
-        finally:
-            conn.close()
+            for data in (de, ate):
+                if data:
+                    relatorios.validar_data(data)
+        except ValueError:
+            self.lbl_relatorio.config(text="Data inválida (use AAAA-MM-DD)", style="Red.TLabel")
+            return
+        if periodo is None and not (de and ate):
+            self.lbl_relatorio.config(text="Informe as datas inicial e final", style="Red.TLabel")
+            return
+
+        if periodo is None:
+            funcao, argumentos = relatorios.consumo_total, (self.banco, de, ate, produto_id)
+        else:
+            funcao, argumentos = relatorios.consultar_consumo, (self.banco, periodo, de, ate, produto_id)
+
+        def falhar(e):
+            if isinstance(e, ValueError) and self.lbl_relatorio.winfo_exists():
+                self.lbl_relatorio.config(text=str(e), style="Red.TLabel")
+            else:
+                self._mostrar_erro_tarefa(e)
+
+        self.lbl_relatorio.config(text="Consultando...", style="TLabel")
+        self.tarefas.cancelar("tela")
+        self.tarefas.submeter(funcao, *argumentos, ao_concluir=self._exibir_relatorio, ao_falhar=falhar,
+                              grupo="tela", nome="relatorio_consumo")
+
+    def _exibir_relatorio(self, linhas):
+        """Preenche a tabela do relatório"""
+        if not self.tree_relatorio.winfo_exists():
+            return
+        self.tree_relatorio.delete(*self.tree_relatorio.get_children())
+        for linha in linhas:
+            self.tree_relatorio.insert("", tk.END, values=(
+                linha.periodo, linha.produto_id, linha.produto or "(excluído)",
+                linha.entradas, linha.saidas, linha.consumo
+            ))
+
+        texto = f"{len(linhas)} linha(s)"
+        if len(linhas) == relatorios.LIMITE_LINHAS:
+            texto += f" (limitado às {relatorios.LIMITE_LINHAS} mais recentes; restrinja o período)"
+        consumo = sum(linha.consumo for linha in linhas)
+        self.lbl_relatorio.config(text=f"{texto} - consumo total: {consumo}", style="TLabel")
 
     # ===== MOVIMENTAÇÃO DE ESTOQUE =====
+    @medir_tela("movimentacao")
     def _mostrar_movimentacao(self):
         """Exibe a interface para registrar movimentações de estoque"""
         # Limpa a área de conteúdo
-        for widget in self.frame_conteudo.winfo_children():
-            widget.destroy()
+        self._limpar_conteudo()
 
         frame = ttk.Frame(self.frame_conteudo, padding=20)
         frame.pack(expand=True, fill=tk.BOTH)
@@ -435,148 +1125,282 @@ class ControleEstoqueApp:
 
         # Seletor de produtos
         ttk.Label(frame, text="Selecione o Produto:").grid(row=1, column=0, sticky='e', pady=5)
-        self.cb_produto = ttk.Combobox(frame, state="readonly")
+        self.cb_produto = ttk.Combobox(frame)
         self.cb_produto.grid(row=1, column=1, pady=5, padx=5, sticky='ew')
         
-        # Carrega os produtos no combobox
-        conn = connect_db()
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, nome FROM produtos ORDER BY nome")
-            produtos = [f"{p[0]} - {p[1]}" for p in cursor.fetchall()]
-            self.cb_produto['values'] = produtos
-            if produtos:
-                self.cb_produto.current(0)  # Seleciona o primeiro item por padrão
-        finally:
-            conn.close()
+        # Busca pelo nome: as sugestões vêm do índice em memória
+        self._configurar_busca_produto(self.cb_produto, ao_selecionar=self._atualizar_info_produto_movimentacao)
+        self.cb_produto.focus_set()
+
+        # Local da movimentação (origem, nas transferências)
+        ttk.Label(frame, text="Local:").grid(row=2, column=0, sticky='e', pady=5)
+        self.cb_local_mov = ttk.Combobox(frame, state="readonly")
+        self.cb_local_mov.grid(row=2, column=1, pady=5, padx=5, sticky='ew')
 
         # Seleção do tipo de movimentação
-        ttk.Label(frame, text="Tipo:").grid(row=2, column=0, sticky='e', pady=5)
+        ttk.Label(frame, text="Tipo:").grid(row=3, column=0, sticky='e', pady=5)
         self.tipo_mov = tk.StringVar(value="saida")
-        ttk.Radiobutton(frame, text="Saída", variable=self.tipo_mov, value="saida").grid(row=2, column=1, sticky='w')
-        ttk.Radiobutton(frame, text="Entrada", variable=self.tipo_mov, value="entrada").grid(row=3, column=1, sticky='w')
+        for linha, (texto, valor) in enumerate((("Saída", "saida"), ("Entrada", "entrada"),
+                                                ("Transferência", "transferencia")), start=3):
+            ttk.Radiobutton(frame, text=texto, variable=self.tipo_mov, value=valor,
+                            command=self._alternar_destino_movimentacao).grid(row=linha, column=1, sticky='w')
+
+        # Destino (apenas nas transferências)
+        ttk.Label(frame, text="Destino:").grid(row=6, column=0, sticky='e', pady=5)
+        self.cb_destino_mov = ttk.Combobox(frame, state="disabled")
+        self.cb_destino_mov.grid(row=6, column=1, pady=5, padx=5, sticky='ew')
+        self._carregar_locais(self.cb_local_mov, self.cb_destino_mov)
 
         # Campo para quantidade
-        ttk.Label(frame, text="Quantidade:").grid(row=4, column=0, sticky='e', pady=5)
+        ttk.Label(frame, text="Quantidade:").grid(row=7, column=0, sticky='e', pady=5)
         self.entry_qtd = ttk.Entry(frame, validate="key", 
                                  validatecommand=(frame.register(lambda p: p.isdigit() or p == ""), '%P'))
-        self.entry_qtd.grid(row=4, column=1, pady=5, padx=5, sticky='ew')
+        self.entry_qtd.grid(row=7, column=1, pady=5, padx=5, sticky='ew')
 
         # Botão para confirmar a movimentação
-        ttk.Button(frame, text="Confirmar", command=self._processar_movimentacao).grid(row=5, columnspan=2, pady=20)
+        self.btn_confirmar_mov = ttk.Button(frame, text="Confirmar", command=self._processar_movimentacao)
+        self.btn_confirmar_mov.grid(row=8, columnspan=2, pady=20)
 
         # Área para exibir informações do produto selecionado
         self.frame_info_produto = ttk.Frame(frame)
-        self.frame_info_produto.grid(row=6, columnspan=2, sticky='ew', pady=10)
-        
-        # Atualiza as informações quando um produto é selecionado
-        self.cb_produto.bind("<<ComboboxSelected>>", lambda e: self._atualizar_info_produto_movimentacao())
+        self.frame_info_produto.grid(row=9, columnspan=2, sticky='ew', pady=10)
+
+    def _alternar_destino_movimentacao(self):
+        """Habilita o destino apenas quando o tipo é transferência"""
+        transferencia = self.tipo_mov.get() == "transferencia"
+        self.cb_destino_mov.configure(state="readonly" if transferencia else "disabled")
+
 
     def _atualizar_info_produto_movimentacao(self):
         """Atualiza as informações do produto selecionado na área de movimentação"""
+        produto_id = self._produto_do_combo(self.cb_produto)
+        if produto_id is None:
+            return
+        
+        def consultar():
+            return self.cache_produtos.obter(produto_id), self.servico.estoque_por_local(produto_id)
+
+        # Apenas o produto selecionado por último é exibido
+        self.tarefas.cancelar("info_produto")
+        self.tarefas.submeter(
+            consultar, ao_concluir=self._exibir_info_produto_movimentacao, grupo="info_produto", nome="info_produto"
+        )
+
+    def _exibir_info_produto_movimentacao(self, resultado):
+        """Exibe os dados do produto (RegistroProduto) e o estoque por local na área de movimentação"""
+        if not self.frame_info_produto.winfo_exists():
+            return
         # Limpa as informações anteriores
         for widget in self.frame_info_produto.winfo_children():
             widget.destroy()
 
-        produto = self.cb_produto.get()
-        if not produto:
-            return
-
-        # Extrai o ID do produto do texto do combobox
-        produto_id = int(produto.split(" - ")[0])
-        
-        conn = connect_db()
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT nome, quantidade, quantidade_minima FROM produtos WHERE id=?", (produto_id,))
-            resultado = cursor.fetchone()
+        registro, estoque_locais = resultado
+        if registro:
+            nome, qtd, qtd_min = registro.nome, registro.quantidade, registro.quantidade_minima
             
-            if resultado:
-                nome, qtd, qtd_min = resultado
-                
-                # Exibe as informações do produto
-                ttk.Label(self.frame_info_produto, text=f"Produto: {nome}").pack(anchor='w')
-                ttk.Label(self.frame_info_produto, text=f"Estoque atual: {qtd}").pack(anchor='w')
-                
-                # Alerta se o estoque estiver abaixo do mínimo
-                if qtd < qtd_min:
-                    ttk.Label(self.frame_info_produto, 
-                             text=f"ALERTA: Estoque abaixo do mínimo ({qtd_min})", 
-                             style="Red.TLabel").pack(anchor='w')
-                else:
-                    ttk.Label(self.frame_info_produto, 
-                             text=f"Estoque mínimo: {qtd_min}").pack(anchor='w')
-        finally:
-            conn.close()
+            # Exibe as informações do produto
+            ttk.Label(self.frame_info_produto, text=f"Produto: {nome}").pack(anchor='w')
+            ttk.Label(self.frame_info_produto, text=f"Estoque atual (todos os locais): {qtd}").pack(anchor='w')
+            for item in estoque_locais:
+                ttk.Label(self.frame_info_produto, text=f"    {item.local}: {item.quantidade}").pack(anchor='w')
+            
+            # Alerta se o estoque estiver abaixo do mínimo
+            if qtd < qtd_min:
+                ttk.Label(self.frame_info_produto, 
+                         text=f"ALERTA: Estoque abaixo do mínimo ({qtd_min})", 
+                         style="Red.TLabel").pack(anchor='w')
+            else:
+                ttk.Label(self.frame_info_produto, 
+                         text=f"Estoque mínimo: {qtd_min}").pack(anchor='w')
 
     def _processar_movimentacao(self):
         """Processa a movimentação de estoque (entrada ou saída)"""
-        produto = self.cb_produto.get()
+        produto_id = self._produto_do_combo(self.cb_produto)
         qtd_text = self.entry_qtd.get()
         tipo = self.tipo_mov.get()
 
         # Validações básicas
-        if not produto or not qtd_text:
+        if produto_id is None or not qtd_text:
             messagebox.showerror("Erro", "Selecione um produto e informe a quantidade!")
             return
 
-        try:
-            produto_id = int(produto.split(" - ")[0])
-            quantidade = int(qtd_text)
-            
-            # Valida a quantidade
-            if quantidade <= 0:
-                raise ValueError("A quantidade deve ser maior que zero!")
+        quantidade = int(qtd_text)
+        local_id = self._local_do_combo(self.cb_local_mov)
+        if local_id is None:
+            messagebox.showerror("Erro", "Selecione o local!")
+            return
 
-            conn = connect_db()
-            cursor = conn.cursor()
-            
-            # Obtém o estoque atual
-            cursor.execute("SELECT quantidade FROM produtos WHERE id=?", (produto_id,))
-            estoque_atual = cursor.fetchone()[0]
-            
-            # Validação especial para saída
-            if tipo == "saida" and quantidade > estoque_atual:
-                raise ValueError(f"Estoque insuficiente! Disponível: {estoque_atual}")
-            
-            # Calcula a nova quantidade
-            nova_quantidade = estoque_atual + quantidade if tipo == "entrada" else estoque_atual - quantidade
-            
-            # Atualiza o produto
-            cursor.execute(
-                "UPDATE produtos SET quantidade=? WHERE id=?", 
-                (nova_quantidade, produto_id)
-            )
+        def concluir(_):
+            if tipo == "transferencia":
+                messagebox.showinfo("Sucesso", f"Transferência registrada: {quantidade} unidades "
+                                               f"de {origem} para {destino}")
+            else:
+                messagebox.showinfo("Sucesso", f"Movimentação registrada: {tipo} de {quantidade} unidades")
             
-            # Registra a movimentação no histórico
-            cursor.execute(
-                "INSERT INTO movimentacoes (produto_id, tipo, quantidade, data, usuario) VALUES (?, ?, ?, ?, ?)",
-                (produto_id, tipo, quantidade, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
-                 self.current_user['username'])
+            # Limpa e atualiza a interface (se a tela ainda estiver aberta)
+            if self.entry_qtd.winfo_exists():
+                self.entry_qtd.delete(0, tk.END)
+                self._atualizar_info_produto_movimentacao()
+
+        if tipo == "transferencia":
+            origem, destino = self.cb_local_mov.get(), self.cb_destino_mov.get()
+            destino_id = self._local_do_combo(self.cb_destino_mov)
+            if destino_id is None:
+                messagebox.showerror("Erro", "Selecione o local de destino!")
+                return
+            # Saída na origem e entrada no destino na mesma transação
+            self._submeter_com_botao(
+                self.btn_confirmar_mov, self.servico.transferir,
+                produto_id, local_id, destino_id, quantidade, self.current_user['username'],
+                ao_concluir=concluir, nome="transferir"
             )
-            
-            conn.commit()
-            messagebox.showinfo("Sucesso", f"Movimentação registrada: {tipo} de {quantidade} unidades")
-            
-            # Limpa e atualiza a interface
-            self.entry_qtd.delete(0, tk.END)
-            self._atualizar_info_produto_movimentacao()
-            
-        except ValueError as e:
-            messagebox.showerror("Erro", str(e))
-        except sqlite3.Error as e:
-            messagebox.showerror("Erro no Banco de Dados", f"Erro: {str(e)}")
-            if conn:
-                conn.rollback()
-        finally:
-            if 'conn' in locals():
-                conn.close()
+            return
+
+        # Aplica a movimentação de forma atômica (valida quantidade e saldo do local)
+        self._submeter_com_botao(
+            self.btn_confirmar_mov, self.servico.registrar_movimentacao,
+            produto_id, tipo, quantidade, self.current_user['username'], local_id,
+            ao_concluir=concluir, nome="registrar_movimentacao"
+        )
+
+    # ===== MOVIMENTAÇÃO EM LOTE =====
+    @medir_tela("movimentacao_lote")
+    def _mostrar_movimentacao_lote(self):
+        """Exibe a grade para registrar várias movimentações em uma única transação"""
+        self._limpar_conteudo()
+
+        frame = ttk.Frame(self.frame_conteudo, padding=10)
+        frame.pack(expand=True, fill=tk.BOTH)
+
+        ttk.Label(frame, text="Movimentação em Lote", font=('Arial', 14)).pack(pady=10)
+
+        # Linha de entrada: produto, tipo e quantidade
+        frame_entrada = ttk.Frame(frame)
+        frame_entrada.pack(fill=tk.X, pady=5)
+
+        ttk.Label(frame_entrada, text="Produto:").pack(side=tk.LEFT)
+        self.cb_produto_lote = ttk.Combobox(frame_entrada, width=40)
+        self.cb_produto_lote.pack(side=tk.LEFT, padx=5)
+        self._configurar_busca_produto(self.cb_produto_lote, ao_selecionar=lambda: self.entry_qtd_lote.focus_set())
+
+        ttk.Label(frame_entrada, text="Tipo:").pack(side=tk.LEFT)
+        self.cb_tipo_lote = ttk.Combobox(frame_entrada, values=["Entrada", "Saída"], state="readonly", width=10)
+        self.cb_tipo_lote.pack(side=tk.LEFT, padx=5)
+        self.cb_tipo_lote.current(0)
+
+        ttk.Label(frame_entrada, text="Quantidade:").pack(side=tk.LEFT)
+        self.entry_qtd_lote = ttk.Entry(frame_entrada, width=10, validate="key",
+                                        validatecommand=(frame.register(lambda p: p.isdigit() or p == ""), '%P'))
+        self.entry_qtd_lote.pack(side=tk.LEFT, padx=5)
+        self.entry_qtd_lote.bind("<Return>", lambda e: self._adicionar_linha_lote())
+
+        ttk.Button(frame_entrada, text="➕ Adicionar", command=self._adicionar_linha_lote).pack(side=tk.LEFT, padx=5)
+
+        # Grade com as linhas do lote
+        colunas = ("Linha", "Produto", "Tipo", "Quantidade", "Resultado")
+        self.tree_lote = ttk.Treeview(frame, columns=colunas, show="headings", selectmode="extended")
+        for col in colunas:
+            self.tree_lote.heading(col, text=col)
+            self.tree_lote.column(col, width=100, anchor='center')
+        self.tree_lote.column("Linha", width=50)
+        self.tree_lote.column("Produto", width=250, anchor='w')
+        self.tree_lote.column("Resultado", width=250, anchor='w')
+        self.tree_lote.pack(expand=True, fill=tk.BOTH, pady=10)
+
+        scroll = ttk.Scrollbar(self.tree_lote, orient="vertical", command=self.tree_lote.yview)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_lote.configure(yscrollcommand=scroll.set)
+        self.tree_lote.tag_configure('alerta', background='#ffeeee')
+
+        # Movimentações de cada linha da grade: iid -> (produto_id, tipo, quantidade)
+        self.itens_lote = {}
+
+        # Botões de ação
+        frame_botoes = ttk.Frame(frame)
+        frame_botoes.pack(fill=tk.X)
+        ttk.Button(frame_botoes, text="Remover Selecionadas", command=self._remover_linhas_lote).pack(side=tk.LEFT)
+        ttk.Button(frame_botoes, text="Limpar", command=self._limpar_lote).pack(side=tk.LEFT, padx=5)
+        self.btn_confirmar_lote = ttk.Button(frame_botoes, text="Confirmar Lote", command=self._processar_lote)
+        self.btn_confirmar_lote.pack(side=tk.RIGHT)
+
+        # Local de todas as linhas do lote
+        self.cb_local_lote = ttk.Combobox(frame_botoes, state="readonly", width=20)
+        self.cb_local_lote.pack(side=tk.RIGHT, padx=5)
+        ttk.Label(frame_botoes, text="Local:").pack(side=tk.RIGHT)
+        self._carregar_locais(self.cb_local_lote)
+
+    def _adicionar_linha_lote(self):
+        """Adiciona a linha digitada à grade do lote"""
+        produto_id = self._produto_do_combo(self.cb_produto_lote)
+        qtd_text = self.entry_qtd_lote.get()
+        if produto_id is None or not qtd_text or int(qtd_text) <= 0:
+            messagebox.showerror("Erro", "Selecione um produto e informe a quantidade!")
+            return
+
+        tipo_texto = self.cb_tipo_lote.get()
+        tipo = "entrada" if tipo_texto == "Entrada" else "saida"
+        linha = len(self.itens_lote) + 1
+        iid = self.tree_lote.insert("", tk.END, values=(linha, self.cb_produto_lote.get(), tipo_texto, int(qtd_text), ""))
+        self.itens_lote[iid] = (produto_id, tipo, int(qtd_text))
+
+        self.entry_qtd_lote.delete(0, tk.END)
+        self.entry_qtd_lote.focus_set()
+        self.tree_lote.see(iid)
+
+    def _remover_linhas_lote(self):
+        """Remove as linhas selecionadas e renumera a grade"""
+        for iid in self.tree_lote.selection():
+            self.tree_lote.delete(iid)
+            del self.itens_lote[iid]
+        for linha, iid in enumerate(self.tree_lote.get_children(), start=1):
+            self.tree_lote.set(iid, "Linha", linha)
+
+    def _limpar_lote(self):
+        """Remove todas as linhas da grade"""
+        self.tree_lote.delete(*self.tree_lote.get_children())
+        self.itens_lote.clear()
+
+    def _processar_lote(self):
+        """Grava todas as linhas da grade em uma única transação (tudo ou nada)"""
+        iids = self.tree_lote.get_children()
+        if not iids:
+            messagebox.showerror("Erro", "Adicione ao menos uma linha ao lote!")
+            return
+
+        itens = [self.itens_lote[iid] for iid in iids]
+        local_id = self._local_do_combo(self.cb_local_lote)
+        if local_id is None:
+            messagebox.showerror("Erro", "Selecione o local do lote!")
+            return
+
+        def concluir(resultados):
+            messagebox.showinfo("Sucesso", f"Lote registrado: {len(resultados)} movimentações")
+            if self.tree_lote.winfo_exists():
+                self._limpar_lote()
+
+        def falhar(e):
+            if isinstance(e, LoteInvalidoError):
+                # Mostra o resultado de cada linha; nada foi gravado
+                if self.tree_lote.winfo_exists():
+                    for iid, resultado in zip(iids, e.resultados):
+                        if self.tree_lote.exists(iid):
+                            self.tree_lote.set(iid, "Resultado", resultado.mensagem)
+                            self.tree_lote.item(iid, tags=() if resultado.ok else ('alerta',))
+                    if self.tree_lote.exists(iids[e.falhas[0].linha - 1]):
+                        self.tree_lote.see(iids[e.falhas[0].linha - 1])
+                messagebox.showerror("Erro", str(e))
+            else:
+                self._mostrar_erro_tarefa(e)
+
+        self._submeter_com_botao(self.btn_confirmar_lote, self.servico.registrar_lote,
+                                itens, self.current_user['username'], local_id,
+                                ao_concluir=concluir, ao_falhar=falhar, nome="registrar_lote")
 
     # ===== CADASTRO DE USUÁRIOS =====
+    @medir_tela("cadastro_usuario")
     def _mostrar_cadastro_usuario(self):
         """Exibe o formulário para cadastrar novos usuários (apenas para administradores)"""
-        for widget in self.frame_conteudo.winfo_children():
-            widget.destroy()
+        self._limpar_conteudo()
 
         frame = ttk.Frame(self.frame_conteudo, padding=20)
         frame.pack(expand=True)
@@ -598,11 +1422,13 @@ class ControleEstoqueApp:
         combo_perfil.current(1)  # Define "Comum" como padrão
 
         # Botão de cadastro
-        ttk.Button(frame, text="Cadastrar", command=lambda: self._cadastrar_usuario(
+        self.btn_cadastrar_usuario = ttk.Button(frame, text="Cadastrar", command=lambda: self._cadastrar_usuario(
             entry_user.get(),
             entry_pass.get(),
             combo_perfil.get()
-        )).grid(row=4, columnspan=2, pady=20)
+        ))
+        self.btn_cadastrar_usuario.grid(row=4, columnspan=2, pady=20)
+        self.campos_usuario = (entry_user, entry_pass)
 
     def _cadastrar_usuario(self, username, password, perfil):
         """Cadastra um novo usuário no sistema"""
@@ -610,44 +1436,193 @@ class ControleEstoqueApp:
             messagebox.showerror("Erro", "Preencha todos os campos!")
             return
 
-        conn = connect_db()
-        try:
-            # Criptografa a senha antes de armazenar
-            senha_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-            
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO usuarios (username, password, perfil) VALUES (?, ?, ?)",
-                (username, senha_hash, perfil)
-            )
-            conn.commit()
-            
+        def concluir(_):
             messagebox.showinfo("Sucesso", "Usuário cadastrado com sucesso!")
             # Limpa os campos
-            for widget in self.frame_conteudo.winfo_children():
-                if isinstance(widget, ttk.Entry):
-                    widget.delete(0, tk.END)
-            
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Erro", "Nome de usuário já existe!")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao cadastrar: {str(e)}")
-        finally:
-            conn.close()
+            for entry in self.campos_usuario:
+                if entry.winfo_exists():
+                    entry.delete(0, tk.END)
+
+        def falhar(e):
+            if isinstance(e, ValueError):
+                messagebox.showerror("Erro", str(e))  # usuário duplicado, perfil inválido...
+            else:
+                messagebox.showerror("Erro", f"Falha ao cadastrar: {str(e)}")
+
+        # A senha é criptografada (bcrypt) pelo serviço, em segundo plano
+        self._submeter_com_botao(self.btn_cadastrar_usuario, self.servico.cadastrar_usuario,
+                                username, password, perfil,
+                                ao_concluir=concluir, ao_falhar=falhar, nome="cadastrar_usuario")
+
+    # ===== LOCAIS (DEPÓSITOS) =====
+    @medir_tela("locais")
+    def _mostrar_locais(self):
+        """Exibe os locais com os totais e o estoque do local selecionado"""
+        self._limpar_conteudo()
+
+        frame = ttk.Frame(self.frame_conteudo)
+        frame.pack(expand=True, fill=tk.BOTH)
+
+        ttk.Label(frame, text="Locais de Estoque", font=('Arial', 14)).pack(pady=10)
+
+        # Cadastro de locais (apenas administradores)
+        if self.current_user['perfil'] == "Administrador":
+            frame_cadastro = ttk.Frame(frame)
+            frame_cadastro.pack(fill=tk.X, padx=10)
+            ttk.Label(frame_cadastro, text="Novo local:").pack(side=tk.LEFT)
+            self.entry_novo_local = ttk.Entry(frame_cadastro, width=30)
+            self.entry_novo_local.pack(side=tk.LEFT, padx=5)
+            self.btn_criar_local = ttk.Button(frame_cadastro, text="➕ Cadastrar", command=self._criar_local)
+            self.btn_criar_local.pack(side=tk.LEFT)
+
+        # Locais (em cima) e estoque do local selecionado (embaixo)
+        colunas = ("ID", "Local", "Produtos", "Unidades")
+        self.tree_locais = ttk.Treeview(frame, columns=colunas, show="headings", selectmode="browse", height=6)
+        for col in colunas:
+            self.tree_locais.heading(col, text=col)
+            self.tree_locais.column(col, width=100, anchor='center')
+        self.tree_locais.column("ID", width=50)
+        self.tree_locais.column("Local", width=250, anchor='w')
+        self.tree_locais.pack(fill=tk.X, padx=10, pady=10)
+        self.tree_locais.bind("<<TreeviewSelect>>", lambda e: self._carregar_estoque_local())
+
+        self.lbl_estoque_local = ttk.Label(frame, text="Selecione um local para ver o estoque")
+        self.lbl_estoque_local.pack(anchor='w', padx=10)
+
+        colunas = ("ID", "Produto", "Quantidade")
+        self.tree_estoque_local = ttk.Treeview(frame, columns=colunas, show="headings")
+        for col in colunas:
+            self.tree_estoque_local.heading(col, text=col)
+            self.tree_estoque_local.column(col, width=100, anchor='center')
+        self.tree_estoque_local.column("ID", width=50)
+        self.tree_estoque_local.column("Produto", width=300, anchor='w')
+        self.tree_estoque_local.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+
+        scroll = ttk.Scrollbar(self.tree_estoque_local, orient="vertical", command=self.tree_estoque_local.yview)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_estoque_local.configure(yscrollcommand=scroll.set)
+
+        self._carregar_resumo_locais()
+
+    def _carregar_resumo_locais(self):
+        """Consulta os locais com o total de produtos e unidades em segundo plano"""
+        def exibir(lista):
+            if not self.tree_locais.winfo_exists():
+                return
+            self.tree_locais.delete(*self.tree_locais.get_children())
+            for resumo in lista:
+                self.tree_locais.insert("", tk.END, iid=str(resumo.local_id), values=(
+                    resumo.local_id, resumo.nome, resumo.produtos, resumo.quantidade
+                ))
+
+        self.tarefas.submeter(locais.resumo_locais, self.banco, ao_concluir=exibir, grupo="tela",
+                              nome="resumo_locais")
+
+    def _carregar_estoque_local(self):
+        """Consulta o estoque do local selecionado (índice por local, só quantidades > 0)"""
+        selecao = self.tree_locais.selection()
+        if not selecao:
+            return
+        local_id = int(selecao[0])
+        nome = self.tree_locais.set(selecao[0], "Local")
+
+        def exibir(itens):
+            if not self.tree_estoque_local.winfo_exists():
+                return
+            self.tree_estoque_local.delete(*self.tree_estoque_local.get_children())
+            for item in itens:
+                self.tree_estoque_local.insert("", tk.END, values=(item.produto_id, item.nome, item.quantidade))
+            self.lbl_estoque_local.config(text=f"{nome}: {len(itens)} produto(s) com estoque")
+
+        # Apenas o local selecionado por último é exibido
+        self.tarefas.cancelar("info_produto")
+        self.tarefas.submeter(self.servico.estoque_do_local, local_id, ao_concluir=exibir,
+                              grupo="info_produto", nome="estoque_local")
+
+    def _criar_local(self):
+        """Cadastra o local digitado e atualiza a lista"""
+        nome = self.entry_novo_local.get().strip()
+        if not nome:
+            messagebox.showerror("Erro", "Informe o nome do local!")
+            return
+
+        def concluir(_):
+            if self.entry_novo_local.winfo_exists():
+                self.entry_novo_local.delete(0, tk.END)
+                self._carregar_resumo_locais()
+
+        self._submeter_com_botao(self.btn_criar_local, self.servico.criar_local, nome,
+                                 ao_concluir=concluir, nome="criar_local")
 
     # ===== HISTÓRICO DE MOVIMENTAÇÕES =====
+    @medir_tela("historico")
     def _mostrar_historico(self):
-        """Exibe o histórico completo de movimentações"""
-        for widget in self.frame_conteudo.winfo_children():
-            widget.destroy()
+        """
+        Exibe o histórico de movimentações de forma paginada
+        As páginas são carregadas conforme a rolagem e a tabela mantém no
+        máximo JANELA_HISTORICO linhas (as mais distantes são descartadas).
+        """
+        self._limpar_conteudo()
 
         frame = ttk.Frame(self.frame_conteudo)
         frame.pack(expand=True, fill=tk.BOTH)
 
         ttk.Label(frame, text="Histórico de Movimentações", font=('Arial', 14)).pack(pady=10)
 
+        # Filtros (aplicados no banco; a digitação só consulta após uma pausa)
+        frame_filtros = ttk.Frame(frame)
+        frame_filtros.pack(fill=tk.X, padx=10)
+
+        ttk.Label(frame_filtros, text="De:").pack(side=tk.LEFT)
+        self.entry_hist_de = ttk.Entry(frame_filtros, width=11)
+        self.entry_hist_de.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(frame_filtros, text="Até:").pack(side=tk.LEFT)
+        self.entry_hist_ate = ttk.Entry(frame_filtros, width=11)
+        self.entry_hist_ate.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(frame_filtros, text="Produto:").pack(side=tk.LEFT)
+        self.cb_hist_produto = ttk.Combobox(frame_filtros, width=30)
+        self.cb_hist_produto['values'] = ["Todos"]
+        self.cb_hist_produto.current(0)
+        self._configurar_busca_produto(self.cb_hist_produto, extras=("Todos",),
+                                       ao_selecionar=self._aplicar_filtro_historico)
+        self.cb_hist_produto.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(frame_filtros, text="Tipo:").pack(side=tk.LEFT)
+        self.cb_hist_tipo = ttk.Combobox(frame_filtros, values=["Todos", "Entrada", "Saída"],
+                                         state="readonly", width=8)
+        self.cb_hist_tipo.current(0)
+        self.cb_hist_tipo.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(frame_filtros, text="Usuário:").pack(side=tk.LEFT)
+        self.cb_hist_usuario = ttk.Combobox(frame_filtros, width=15)
+        self.tarefas.submeter(
+            self.servico.listar_usuarios,
+            ao_concluir=lambda linhas: self.cb_hist_usuario.configure(values=[u[0] for u in linhas]),
+            grupo="tela", nome="listar_usuarios"
+        )
+        self.cb_hist_usuario.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(frame_filtros, text="Local:").pack(side=tk.LEFT)
+        self.cb_hist_local = ttk.Combobox(frame_filtros, state="readonly", width=15)
+        self.cb_hist_local.pack(side=tk.LEFT, padx=(2, 8))
+        self._carregar_locais(self.cb_hist_local, extras=("Todos",))
+
+        self.lbl_erro_filtro = ttk.Label(frame_filtros, text="", style="Red.TLabel")
+        self.lbl_erro_filtro.pack(side=tk.LEFT)
+
+        for entry in (self.entry_hist_de, self.entry_hist_ate, self.cb_hist_usuario):
+            entry.bind("<KeyRelease>", lambda e: self._agendar_filtro_historico())
+        for combo in (self.cb_hist_tipo, self.cb_hist_usuario, self.cb_hist_local):
+            combo.bind("<<ComboboxSelected>>", lambda e: self._aplicar_filtro_historico())
+
+        # Total de movimentações e linhas exibidas
+        self.lbl_total_historico = ttk.Label(frame, text="")
+        self.lbl_total_historico.pack(anchor='w', padx=10)
+
         # Cria a tabela
-        colunas = ("ID", "Data", "Produto", "Tipo", "Quantidade", "Usuário")
+        colunas = ("ID", "Data", "Produto", "Tipo", "Quantidade", "Usuário", "Local")
         tree = ttk.Treeview(frame, columns=colunas, show="headings", height=20)
         
         # Configura as colunas
@@ -662,27 +1637,296 @@ class ControleEstoqueApp:
         
         tree.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
         
-        # Barra de rolagem
+        # Barra de rolagem (também dispara o carregamento das páginas)
         scroll = ttk.Scrollbar(tree, orient="vertical", command=tree.yview)
         scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        tree.configure(yscrollcommand=scroll.set)
+        tree.configure(yscrollcommand=lambda primeiro, ultimo: self._rolagem_historico(scroll, primeiro, ultimo))
+        
+        # Estado da paginação
+        self.tree_historico = tree
+        self.filtro_historico = historico.FiltroHistorico()
+        self.filtro_agendado = None  # after() pendente da digitação nos filtros
+        self.historico_verificacao_pendente = False
+        self.historico_carregando = False  # página sendo consultada em segundo plano
+        self.total_historico = None
         
-        # Carrega os dados
-        conn = connect_db()
+        # Carrega a primeira página
+        self._recarregar_historico()
+
+    def _agendar_filtro_historico(self):
+        """Reaplica os filtros após uma pausa na digitação (debounce)"""
+        if self.filtro_agendado:
+            self.root.after_cancel(self.filtro_agendado)
+        self.filtro_agendado = self.root.after(ATRASO_FILTRO_MS, self._aplicar_filtro_historico)
+
+    def _aplicar_filtro_historico(self):
+        """Lê os campos de filtro e recarrega o histórico"""
+        if self.filtro_agendado:
+            self.root.after_cancel(self.filtro_agendado)
+            self.filtro_agendado = None
+        if not self.tree_historico.winfo_exists():
+            return
+
+        # Produto: vazio/'Todos' ou uma opção da busca
+        produto_id = None
+        if self.cb_hist_produto.get().strip() not in ("", "Todos"):
+            produto_id = self._produto_do_combo(self.cb_hist_produto)
+            if produto_id is None:
+                self.lbl_erro_filtro.config(text="Escolha o produto na lista")
+                return
+
+        tipo = {"Entrada": "entrada", "Saída": "saida"}.get(self.cb_hist_tipo.get())
         try:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT m.id, m.data, p.nome, m.tipo, m.quantidade, m.usuario
-                FROM movimentacoes m
-                JOIN produtos p ON m.produto_id = p.id
-                ORDER BY m.data DESC
-            ''')
-            
-            for mov in cursor.fetchall():
-                tipo = "ENTRADA" if mov[3] == "entrada" else "SAÍDA"
-                tree.insert("", tk.END, values=(mov[0], mov[1], mov[2], tipo, mov[4], mov[5]))
-        finally:
-            conn.close()
+            filtro = historico.FiltroHistorico.por_datas(
+                self.entry_hist_de.get(),
+                self.entry_hist_ate.get(),
+                produto_id=produto_id,
+                tipo=tipo,
+                usuario=self.cb_hist_usuario.get().strip(),
+                local_id=self._local_do_combo(self.cb_hist_local)
+            )
+        except ValueError:
+            # Data incompleta ou inválida: mantém o resultado atual
+            self.lbl_erro_filtro.config(text="Data inválida (use AAAA-MM-DD)")
+            return
+
+        self.lbl_erro_filtro.config(text="")
+        self.filtro_historico = filtro
+        self._recarregar_historico()
+
+    def _recarregar_historico(self):
+        """Limpa a tabela e carrega a primeira página e o total com o filtro atual"""
+        # Descarta as páginas ainda pendentes do filtro anterior
+        self.tarefas.cancelar("historico")
+        self.tree_historico.delete(*self.tree_historico.get_children())
+        self.chaves_historico = {}  # iid -> chave (data, id)
+        self.historico_mais_antigos = True  # ainda há linhas abaixo da última exibida
+        self.historico_mais_novos = False  # linhas acima da primeira foram descartadas
+        self.historico_carregando = True
+        self.total_historico = None
+        self.historico_arquivado_ate = None  # sem data inicial, os arquivos não entram
+
+        def primeira_pagina(linhas):
+            self.historico_carregando = False
+            self.historico_mais_antigos = len(linhas) == historico.TAMANHO_PAGINA
+            self._inserir_pagina_historico(linhas, no_fim=True)
+            self.tree_historico.yview_moveto(0)
+            self._atualizar_total_historico()
+
+        def total(quantidade):
+            self.total_historico = quantidade
+            self._atualizar_total_historico()
+
+        self.tarefas.submeter(historico.consultar_pagina, self.banco, self.filtro_historico,
+                              ao_concluir=primeira_pagina, ao_falhar=self._falha_pagina_historico,
+                              grupo="historico", nome="historico_pagina")
+        self.tarefas.submeter(historico.contar_movimentacoes, self.banco, self.filtro_historico,
+                              ao_concluir=total, grupo="historico", nome="historico_total")
+        if self.filtro_historico.inicio is None:
+            def arquivado(marca):
+                self.historico_arquivado_ate = marca or None
+                self._atualizar_total_historico()
+
+            self.tarefas.submeter(arquivamento.arquivado_ate, self.banco, ao_concluir=arquivado,
+                                  grupo="historico", nome="historico_arquivado")
+        self._atualizar_total_historico()
+
+    def _atualizar_total_historico(self):
+        """Atualiza o rótulo com o total de movimentações (contado uma vez por filtro)"""
+        total = "..." if self.total_historico is None else self.total_historico
+        texto = f"Total: {total} movimentações (exibindo {len(self.chaves_historico)})"
+        if self.historico_arquivado_ate:
+            data = datetime.fromtimestamp(self.historico_arquivado_ate).strftime("%d/%m/%Y")
+            texto += f" - anteriores a {data} estão arquivadas: informe a data inicial para incluí-las"
+        self.lbl_total_historico.config(text=texto)
+
+    def _inserir_pagina_historico(self, linhas, no_fim):
+        """Insere uma página de linhas no fim (mais antigas) ou no início (mais recentes) da tabela"""
+        posicao = tk.END if no_fim else 0
+        # No início, as linhas são inseridas de baixo para cima para manter a ordem
+        for mov in (linhas if no_fim else reversed(linhas)):
+            tipo = "ENTRADA" if mov[3] == "entrada" else "SAÍDA"
+            iid = self.tree_historico.insert("", posicao,
+                                             values=(mov[0], epoch_para_texto(mov[1]), mov[2], tipo, mov[4], mov[5],
+                                                     mov[6] or ""))
+            self.chaves_historico[iid] = historico.chave(mov)
+
+    def _rolagem_historico(self, scroll, primeiro, ultimo):
+        """Atualiza a barra de rolagem e agenda a verificação de novas páginas"""
+        scroll.set(primeiro, ultimo)
+        if not self.historico_verificacao_pendente:
+            self.historico_verificacao_pendente = True
+            self.root.after_idle(self._verificar_pagina_historico)
+
+    def _verificar_pagina_historico(self):
+        """Carrega a próxima página quando a rolagem se aproxima do início ou do fim da tabela"""
+        self.historico_verificacao_pendente = False
+        tree = self.tree_historico
+        if not tree.winfo_exists() or self.historico_carregando:
+            return
+        itens = tree.get_children()
+        if not itens:
+            return
+
+        primeiro, ultimo = tree.yview()
+        if ultimo >= 0.9 and self.historico_mais_antigos:
+            no_fim = True
+            parametros = {"antes": self.chaves_historico[itens[-1]]}
+        elif primeiro <= 0.1 and self.historico_mais_novos:
+            no_fim = False
+            parametros = {"depois": self.chaves_historico[itens[0]]}
+        else:
+            return
+
+        self.historico_carregando = True
+        self.tarefas.submeter(historico.consultar_pagina, self.banco, self.filtro_historico, **parametros,
+                              ao_concluir=lambda linhas: self._receber_pagina_historico(linhas, no_fim),
+                              ao_falhar=self._falha_pagina_historico, grupo="historico", nome="historico_pagina")
+
+    def _falha_pagina_historico(self, erro):
+        """Libera a consulta da próxima página (a rolagem tenta de novo) e informa o erro"""
+        self.historico_carregando = False
+        self._mostrar_erro_tarefa(erro)
+
+    def _receber_pagina_historico(self, linhas, no_fim):
+        """Insere a página consultada e descarta as linhas que saíram da janela"""
+        self.historico_carregando = False
+        completa = len(linhas) == historico.TAMANHO_PAGINA
+        if no_fim:
+            self.historico_mais_antigos = completa
+        else:
+            self.historico_mais_novos = completa
+        if linhas:
+            ancora = self.tree_historico.identify_row(1)
+            self._inserir_pagina_historico(linhas, no_fim=no_fim)
+            if no_fim:
+                self.historico_mais_novos |= self._descartar_historico(no_inicio=True)
+            else:
+                self.historico_mais_antigos |= self._descartar_historico(no_inicio=False)
+            self._manter_ancora_historico(ancora)
+        self._atualizar_total_historico()
+
+    def _descartar_historico(self, no_inicio):
+        """Remove as linhas excedentes da janela; retorna True se alguma foi removida"""
+        itens = self.tree_historico.get_children()
+        excesso = len(itens) - JANELA_HISTORICO
+        if excesso <= 0:
+            return False
+        removidos = itens[:excesso] if no_inicio else itens[-excesso:]
+        self.tree_historico.delete(*removidos)
+        for iid in removidos:
+            del self.chaves_historico[iid]
+        return True
+
+    def _manter_ancora_historico(self, ancora):
+        """Mantém a linha que estava visível no topo na mesma posição após inserir/remover linhas"""
+        if ancora and self.tree_historico.exists(ancora):
+            total = len(self.tree_historico.get_children())
+            self.tree_historico.yview_moveto(self.tree_historico.index(ancora) / total)
+
+    # ===== DIAGNÓSTICO (ADMINISTRADORES) =====
+    def _mostrar_diagnostico(self):
+        """
+        Tempos de consultas, telas e tarefas, mais os contadores do cache e da
+        autenticação (aberta pelo atalho ATALHO_DIAGNOSTICO)
+        """
+        if self.current_user is None or self.current_user['perfil'] != "Administrador":
+            return
+        self._limpar_conteudo()
+
+        frame = ttk.Frame(self.frame_conteudo)
+        frame.pack(expand=True, fill=tk.BOTH)
+
+        ttk.Label(frame, text="Diagnóstico", font=('Arial', 14)).pack(pady=10)
+
+        frame_toolbar = ttk.Frame(frame)
+        frame_toolbar.pack(fill=tk.X, padx=10)
+
+        ttk.Label(frame_toolbar, text="Categoria:").pack(side=tk.LEFT)
+        self.cb_diag_categoria = ttk.Combobox(frame_toolbar, values=["Todas", "sql", "tela", "tarefa"],
+                                              state="readonly", width=10)
+        self.cb_diag_categoria.current(0)
+        self.cb_diag_categoria.pack(side=tk.LEFT, padx=(2, 8))
+        self.cb_diag_categoria.bind("<<ComboboxSelected>>", lambda e: self._atualizar_diagnostico())
+
+        ttk.Button(frame_toolbar, text="🔄 Atualizar", command=self._atualizar_diagnostico).pack(side=tk.LEFT)
+        ttk.Button(frame_toolbar, text="Zerar", command=self._zerar_diagnostico).pack(side=tk.LEFT, padx=5)
+        ttk.Button(frame_toolbar, text="💾 Salvar...", command=self._salvar_diagnostico).pack(side=tk.LEFT)
+
+        self.lbl_diagnostico = ttk.Label(frame, text="", justify=tk.LEFT)
+        self.lbl_diagnostico.pack(anchor='w', padx=10, pady=5)
+
+        # Cria a tabela (maior tempo total primeiro)
+        colunas = ("Categoria", "Nome", "Contagem", "Total (ms)", "p50", "p95", "p99", "Máx")
+        self.tree_diagnostico = ttk.Treeview(frame, columns=colunas, show="headings", height=20)
+        for col in colunas:
+            self.tree_diagnostico.heading(col, text=col)
+            self.tree_diagnostico.column(col, width=80, anchor='center')
+        self.tree_diagnostico.column("Nome", width=420, anchor='w')
+        self.tree_diagnostico.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+
+        scroll = ttk.Scrollbar(self.tree_diagnostico, orient="vertical", command=self.tree_diagnostico.yview)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_diagnostico.configure(yscrollcommand=scroll.set)
+
+        self._atualizar_diagnostico()
+
+    def _estatisticas_diagnostico(self):
+        """Contadores dos componentes (incluídos no arquivo de métricas)"""
+        return {
+            "cache_produtos": self.cache_produtos.estatisticas(),
+            "autenticacao": self.servico.autenticador.estatisticas(),
+            "tarefas": self.tarefas.estatisticas(),
+            "consultas_lentas": self.banco.lentas.registradas if self.banco.lentas else None,
+        }
+
+    def _atualizar_diagnostico(self):
+        """Preenche a tabela com as métricas atuais (leitura em memória, sem consultas)"""
+        if not self.tree_diagnostico.winfo_exists():
+            return
+        categoria = self.cb_diag_categoria.get()
+        self.tree_diagnostico.delete(*self.tree_diagnostico.get_children())
+        for linha in self.metricas.resumo(None if categoria == "Todas" else categoria):
+            self.tree_diagnostico.insert("", tk.END, values=(
+                linha['categoria'], linha['nome'], linha['contagem'], f"{linha['total_ms']:.1f}",
+                f"{linha['p50_ms']:.2f}", f"{linha['p95_ms']:.2f}", f"{linha['p99_ms']:.2f}",
+                f"{linha['max_ms']:.2f}"
+            ))
+
+        extras = self._estatisticas_diagnostico()
+        cache = extras['cache_produtos']
+        autenticacao = extras['autenticacao']
+        desde = datetime.fromtimestamp(self.metricas.desde).strftime("%d/%m/%Y %H:%M:%S")
+        texto = (f"Desde {desde}\n"
+                 f"Cache de produtos: {cache['tamanho']}/{cache['capacidade']} registros, "
+                 f"acertos {cache['taxa_acerto']:.0%}, descartes {cache['descartes']}\n"
+                 f"Autenticação: {autenticacao['verificacoes_bcrypt']} bcrypt, "
+                 f"{autenticacao['acertos_cache']} acertos do cache, {autenticacao['sessoes']} sessões\n"
+                 f"Tarefas pendentes: {'sim' if self.tarefas.ocupado else 'não'}")
+        if self.banco.lentas:
+            texto += (f"\nConsultas lentas (≥ {self.banco.lentas.limite_ms} ms): {extras['consultas_lentas']} "
+                      f"em {self.banco.lentas.caminho}")
+        self.lbl_diagnostico.config(text=texto)
+
+    def _zerar_diagnostico(self):
+        if messagebox.askyesno("Confirmar", "Zerar as métricas coletadas?"):
+            self.metricas.zerar()
+            self._atualizar_diagnostico()
+
+    def _salvar_diagnostico(self):
+        """Grava as métricas e os contadores em um arquivo JSON"""
+        from tkinter import filedialog
+
+        caminho = filedialog.asksaveasfilename(title="Salvar métricas", defaultextension=".json",
+                                               filetypes=[("JSON", "*.json"), ("Todos", "*.*")])
+        if not caminho:
+            return
+        try:
+            quantidade = self.metricas.exportar(caminho, self._estatisticas_diagnostico())
+        except OSError as e:
+            messagebox.showerror("Erro", f"Não foi possível gravar o arquivo: {e}")
+            return
+        messagebox.showinfo("Sucesso", f"{quantidade} métricas gravadas em {caminho}")
 
     # ===== FUNÇÕES AUXILIARES =====
     def _cadastrar_produto(self, nome, quantidade, quantidade_minima):
@@ -691,40 +1935,56 @@ class ControleEstoqueApp:
             messagebox.showerror("Erro", "Preencha todos os campos!")
             return
 
-        try:
-            conn = connect_db()
-            cursor = conn.cursor()
-            
-            # Insere o novo produto
-            cursor.execute(
-                "INSERT INTO produtos (nome, quantidade, quantidade_minima) VALUES (?, ?, ?)",
-                (nome, int(quantidade), int(quantidade_minima))
-            )
-            
-            # Registra a entrada inicial
-            produto_id = cursor.lastrowid
-            cursor.execute(
-                "INSERT INTO movimentacoes (produto_id, tipo, quantidade, data, usuario) VALUES (?, ?, ?, ?, ?)",
-                (produto_id, "entrada", int(quantidade), datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
-                 self.current_user['username'])
-            )
-            
-            conn.commit()
+        def concluir(_):
             messagebox.showinfo("Sucesso", "Produto cadastrado com sucesso!")
-            self._mostrar_lista_produtos()
-            
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Erro", "Já existe um produto com este nome!")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao cadastrar: {str(e)}")
-        finally:
-            if 'conn' in locals():
-                conn.close()
+            if self.btn_cadastrar_produto.winfo_exists():
+                self._mostrar_lista_produtos()
+
+        def falhar(e):
+            if isinstance(e, ValueError):
+                messagebox.showerror("Erro", str(e))  # nome duplicado, campos inválidos...
+            else:
+                messagebox.showerror("Erro", f"Falha ao cadastrar: {str(e)}")
+
+        # O produto e a entrada inicial no histórico são gravados na mesma transação
+        self._submeter_com_botao(self.btn_cadastrar_produto, self.servico.cadastrar_produto,
+                                nome, quantidade, quantidade_minima, self.current_user['username'],
+                                ao_concluir=concluir, ao_falhar=falhar, nome="cadastrar_produto")
 
 # ==============================================
 # INICIALIZAÇÃO DA APLICAÇÃO
 # ==============================================
 
-if __name__ == "__main__":
-    app = ControleEstoqueApp()
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Controle de Estoque")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    parser.add_argument("--medir-inicio", action="store_true",
+                        help="encerra assim que a janela e o banco estiverem prontos e "
+                             "imprime os tempos (ms) em JSON")
+    parser.add_argument("--metricas", metavar="ARQUIVO",
+                        help="grava as métricas (consultas, telas e tarefas) em JSON ao encerrar")
+    parser.add_argument("--custo-bcrypt", type=int, default=CUSTO_BCRYPT,
+                        help="custo do bcrypt para senhas novas (as de custo menor são regravadas no login)")
+    args = parser.parse_args(argv)
+
+    app = ControleEstoqueApp(args.banco, arquivo_metricas=args.metricas, custo_bcrypt=args.custo_bcrypt)
+
+    if args.medir_inicio:
+        def verificar():
+            if app.tempo_primeira_janela and app.tempo_banco_pronto is not None:
+                print(json.dumps({"janela_ms": app.tempo_primeira_janela * 1000,
+                                  "banco_ms": app.tempo_banco_pronto * 1000}))
+                app._encerrar()
+            else:
+                app.root.after(5, verificar)
+        app.root.after(5, verificar)
+
     app.root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
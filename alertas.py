@@ -0,0 +1,74 @@
+import argparse
+import sys
+from collections import namedtuple
+
+from banco import Banco, CAMINHO_PADRAO
+
+# ==============================================
+# ALERTAS DE ESTOQUE BAIXO
+# ==============================================
+#
+# Os produtos abaixo do mínimo ficam no índice parcial idx_produtos_estoque_baixo
+# (migrações 5 e 9), mantido pelo próprio SQLite a cada movimentação, edição do
+# mínimo, importação ou exclusão, inclusive por outros terminais. As consultas
+# abaixo percorrem apenas esse índice: o custo depende do número de alertas e
+# não do tamanho do catálogo.
+#
+# As condições e a ordenação precisam ser idênticas às do índice para que o
+# SQLite o utilize.
+
+CONDICAO_ALERTA = "quantidade < quantidade_minima AND excluido_em IS NULL"
+
+SQL_ALERTAS = f'''
+    SELECT id, nome, quantidade, quantidade_minima FROM produtos
+    WHERE {CONDICAO_ALERTA}
+    ORDER BY quantidade - quantidade_minima, nome
+'''
+
+SQL_CONTAR = f"SELECT COUNT(*) FROM produtos WHERE {CONDICAO_ALERTA}"
+
+# Candidato a reposição
+# - falta: quanto falta para chegar ao mínimo (sugestão de compra)
+Alerta = namedtuple("Alerta", "produto_id nome quantidade quantidade_minima falta")
+
+
+def consultar_alertas(banco, limite=None):
+    """
+    Retorna os produtos abaixo do estoque mínimo (lista de Alerta)
+    Parâmetros:
+    - limite: número máximo de alertas (None = todos)
+    Os produtos com maior falta em relação ao mínimo vêm primeiro.
+    """
+    sql, parametros = SQL_ALERTAS, ()
+    if limite is not None:
+        sql, parametros = sql + " LIMIT ?", (limite,)
+    return [Alerta(id_, nome, qtd, minimo, minimo - qtd)
+            for id_, nome, qtd, minimo in banco.consultar(sql, parametros)]
+
+
+def contar_alertas(banco):
+    """Número de produtos abaixo do estoque mínimo"""
+    return banco.consultar_um(SQL_CONTAR)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lista os produtos abaixo do estoque mínimo")
+    parser.add_argument("-n", "--limite", type=int, help="número máximo de produtos")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    args = parser.parse_args(argv)
+
+    banco = Banco(args.banco)
+    try:
+        banco.inicializar()
+        alertas = consultar_alertas(banco, args.limite)
+    finally:
+        banco.fechar()
+    for alerta in alertas:
+        print(f"{alerta.produto_id}\t{alerta.nome}\t{alerta.quantidade}\t"
+              f"mín {alerta.quantidade_minima}\tfalta {alerta.falta}")
+    print(f"{len(alertas)} produto(s) abaixo do mínimo", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
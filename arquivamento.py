@@ -0,0 +1,356 @@
+import argparse
+import os
+import sqlite3
+import sys
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from banco import Banco, CAMINHO_PADRAO, com_retentativa, epoch_para_texto
+
+# ==============================================
+# ARQUIVAMENTO DO HISTÓRICO
+# ==============================================
+#
+# As movimentações mais antigas que o horizonte (HORIZONTE_DIAS) saem da
+# tabela movimentacoes e vão para um banco de arquivo por ano, na pasta do
+# banco principal (estoque.db -> estoque_2024.db, estoque_2025.db...). O banco
+# principal fica pequeno e as consultas do dia a dia não passam pelos anos
+# antigos.
+#
+# - O arquivamento anda em blocos, em ordem de data. Cada bloco é copiado para
+#   o arquivo (INSERT OR IGNORE: repetir é seguro) e só depois removido daqui,
+#   em outra transação: uma interrupção no meio nunca perde movimentações, e
+#   o próximo arquivamento termina o bloco.
+# - saldos_abertura acumula entradas - saídas do que foi arquivado, então
+#   saldo de abertura + movimentações restantes = produtos.quantidade
+#   ('python arquivamento.py conferir'). produtos.quantidade, os retratos
+#   (snapshots) e os totais de consumo não mudam: não há gatilhos de exclusão
+#   em movimentacoes.
+# - movimentacoes.id é AUTOINCREMENT (migração 11): os ids que foram para os
+#   arquivos nunca voltam a ser usados no banco principal, mesmo depois que a
+#   movimentação de maior id for arquivada ou apagada.
+# - arquivado_ate marca até onde os arquivos valem; as consultas só leem nos
+#   arquivos as linhas anteriores a ela, de modo que um bloco copiado mas
+#   ainda não removido daqui não aparece duas vezes.
+# - O histórico, as exportações e o estoque em datas passadas incluem os
+#   arquivos (UNION ALL) apenas quando a data inicial do filtro é anterior a
+#   arquivado_ate. Sem data inicial, valem só as movimentações do banco principal.
+#
+# Os arquivos são anexados (ATTACH) sob demanda na conexão de cada thread.
+# Arquivos criados antes do estoque por local ganham as colunas local_id e
+# transferencia_id ao serem anexados (as linhas antigas ficam no local 1).
+
+# Movimentações mais antigas que isso (em dias) são arquivadas
+HORIZONTE_DIAS = 365
+
+# Movimentações movidas por bloco (cada bloco: duas transações curtas)
+TAMANHO_BLOCO = 20000
+
+# Máximo de arquivos anexados ao mesmo tempo em uma conexão (o SQLite aceita 10)
+LIMITE_ANEXADOS = 8
+
+# Arquivo de um ano: caminho completo e movimentações movidas para ele
+Arquivo = namedtuple("Arquivo", "ano caminho movimentacoes")
+
+SQL_SALDO = "CASE m.tipo WHEN 'entrada' THEN m.quantidade ELSE -m.quantidade END"
+
+# Colunas acrescentadas em movimentacoes depois da criação dos primeiros arquivos
+COLUNAS_NOVAS = (
+    ("local_id", "INTEGER NOT NULL DEFAULT 1"),
+    ("transferencia_id", "INTEGER"),
+)
+
+
+def inicio_ano(ano):
+    """Primeiro instante (epoch, hora local) do ano"""
+    return int(datetime(ano, 1, 1).timestamp())
+
+
+def limite_horizonte(dias=HORIZONTE_DIAS):
+    """Início do dia (hora local) de 'dias' dias atrás: o que for anterior é arquivado"""
+    return int(datetime.combine(date.today() - timedelta(days=dias), time()).timestamp())
+
+
+def esquema(ano):
+    """Nome com que o arquivo do ano é anexado ('arquivo_2025')"""
+    return f"arquivo_{int(ano)}"
+
+
+def _pasta(banco):
+    if not banco.caminho or banco.caminho == ":memory:":
+        raise ValueError("O arquivamento exige um banco gravado em arquivo")
+    return os.path.dirname(os.path.abspath(banco.caminho))
+
+
+def arquivado_ate(banco):
+    """Instante (epoch) até o qual as movimentações estão nos arquivos (0 = nada arquivado)"""
+    return banco.consultar_um("SELECT arquivado_ate FROM controle_arquivamento WHERE id = 1")[0]
+
+
+def listar_arquivos(banco):
+    """Retorna [Arquivo] em ordem de ano"""
+    if banco.caminho == ":memory:":
+        return []
+    pasta = _pasta(banco)
+    return [Arquivo(ano, os.path.join(pasta, nome), movimentacoes) for ano, nome, movimentacoes in
+            banco.consultar("SELECT ano, arquivo, movimentacoes FROM arquivos_historico ORDER BY ano")]
+
+
+def anexar(banco, arquivos, criar=False):
+    """
+    Anexa os arquivos na conexão da thread atual (os que já estão anexados
+    são mantidos); desanexa os que não estão em uso se passar de LIMITE_ANEXADOS
+    Precisa ser chamada fora de transação (o SQLite não anexa dentro de uma).
+    - criar: cria o arquivo se ele não existir (senão lança ValueError)
+    """
+    conn = banco.conexao()
+    anexados = [linha[1] for linha in conn.execute("PRAGMA database_list").fetchall()]
+    necessarios = {esquema(arquivo.ano) for arquivo in arquivos}
+    faltando = [arquivo for arquivo in arquivos if esquema(arquivo.ano) not in anexados]
+    if not faltando:
+        return
+    if len(necessarios) > LIMITE_ANEXADOS:
+        raise ValueError(f"O período alcança mais de {LIMITE_ANEXADOS} anos arquivados; reduza o intervalo")
+    if conn.in_transaction:
+        raise RuntimeError("Os arquivos do histórico devem ser anexados fora de uma transação")
+
+    outros = [nome for nome in anexados if nome.startswith("arquivo_") and nome not in necessarios]
+    for nome in outros[:max(0, len(outros) + len(necessarios) - LIMITE_ANEXADOS)]:
+        try:
+            conn.execute(f"DETACH DATABASE {nome}")
+        except sqlite3.OperationalError:
+            pass  # ainda em uso por um cursor aberto
+    for arquivo in faltando:
+        if not criar and not os.path.exists(arquivo.caminho):
+            raise ValueError(f"Arquivo do histórico não encontrado: {arquivo.caminho}")
+        conn.execute(f"ATTACH DATABASE ? AS {esquema(arquivo.ano)}", (arquivo.caminho,))
+        _atualizar_arquivo(conn, esquema(arquivo.ano))
+
+
+def _atualizar_arquivo(conn, nome):
+    """Acrescenta ao arquivo anexado as colunas de movimentacoes que ele ainda não tem"""
+    colunas = {linha[1] for linha in conn.execute(f"PRAGMA {nome}.table_info(movimentacoes)").fetchall()}
+    if not colunas:
+        return  # arquivo novo: _preparar_arquivo cria a tabela completa
+    for coluna, definicao in COLUNAS_NOVAS:
+        if coluna not in colunas:
+            try:
+                conn.execute(f"ALTER TABLE {nome}.movimentacoes ADD COLUMN {coluna} {definicao}")
+            except sqlite3.OperationalError as e:
+                # "duplicate column": outro terminal acrescentou a coluna primeiro
+                if "duplicate column" not in str(e):
+                    raise
+    if "local_id" not in colunas:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {nome}.idx_movimentacoes_local_data ON movimentacoes (local_id, data)")
+
+
+def fontes_movimentacoes(banco, inicio=None, fim=None, todos=False):
+    """
+    Tabelas de movimentações que o período [inicio, fim) alcança
+    Retorna [(tabela, condições extras [(sql, parâmetros)])], sempre começando
+    pela tabela do banco principal; as condições usam o alias 'm'.
+    Os arquivos entram se 'inicio' for anterior a arquivado_ate (ou, com
+    todos=True, também sem data inicial) e ficam anexados na conexão da
+    thread atual: chame antes de abrir a transação da consulta.
+    """
+    fontes = [("movimentacoes", [])]
+    if inicio is None and not todos:
+        return fontes
+    marca = arquivado_ate(banco)
+    if marca == 0 or (inicio is not None and inicio >= marca):
+        return fontes
+
+    arquivos = [arquivo for arquivo in listar_arquivos(banco)
+                if (inicio is None or inicio < inicio_ano(arquivo.ano + 1))
+                and (fim is None or inicio_ano(arquivo.ano) < fim)
+                and inicio_ano(arquivo.ano) < marca]
+    anexar(banco, arquivos)
+    for arquivo in arquivos:
+        fontes.append((f"{esquema(arquivo.ano)}.movimentacoes", [("m.data < ?", [marca])]))
+    return fontes
+
+
+# ----- Arquivamento -----
+def _preparar_arquivo(banco, ano):
+    """Registra o arquivo do ano, cria-o se necessário e o anexa; retorna o Arquivo"""
+    nome = f"{os.path.splitext(os.path.basename(banco.caminho))[0]}_{ano}.db"
+    banco.executar("INSERT OR IGNORE INTO arquivos_historico (ano, arquivo) VALUES (?, ?)", (ano, nome))
+    arquivo = next(arquivo for arquivo in listar_arquivos(banco) if arquivo.ano == ano)
+    anexar(banco, [arquivo], criar=True)
+
+    nome = esquema(ano)
+    banco.executar(f'''
+        CREATE TABLE IF NOT EXISTS {nome}.movimentacoes (
+            id INTEGER PRIMARY KEY,
+            produto_id INTEGER,
+            tipo TEXT,
+            quantidade INTEGER,
+            data INTEGER,
+            usuario TEXT,
+            local_id INTEGER NOT NULL DEFAULT 1,
+            transferencia_id INTEGER
+        )
+    ''')
+    # Os mesmos índices do banco principal: as consultas são as mesmas
+    banco.executar(f"CREATE INDEX IF NOT EXISTS {nome}.idx_movimentacoes_produto_data "
+                   "ON movimentacoes (produto_id, data)")
+    banco.executar(f"CREATE INDEX IF NOT EXISTS {nome}.idx_movimentacoes_data ON movimentacoes (data)")
+    banco.executar(f"CREATE INDEX IF NOT EXISTS {nome}.idx_movimentacoes_usuario_data "
+                   "ON movimentacoes (usuario, data)")
+    banco.executar(f"CREATE INDEX IF NOT EXISTS {nome}.idx_movimentacoes_local_data "
+                   "ON movimentacoes (local_id, data)")
+    return arquivo
+
+
+def _corte(banco, inicio, fim, tamanho_bloco):
+    """Fim do próximo bloco: data da linha de número 'tamanho_bloco' (o bloco termina em um segundo inteiro)"""
+    linha = banco.consultar_um(
+        "SELECT data FROM movimentacoes WHERE data >= ? AND data < ? ORDER BY data LIMIT 1 OFFSET ?",
+        (inicio, fim, tamanho_bloco)
+    )
+    if linha is None:
+        return fim
+    # Mais de um bloco no mesmo segundo: o bloco leva o segundo inteiro
+    return max(linha[0], inicio + 1)
+
+
+def _mover_bloco(banco, arquivo, inicio, fim):
+    """Move as movimentações com inicio <= data < fim para o arquivo; retorna quantas foram movidas"""
+    tabela = f"{esquema(arquivo.ano)}.movimentacoes"
+
+    def copiar(cursor):
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {tabela} (id, produto_id, tipo, quantidade, data, usuario, local_id,
+                                            transferencia_id)
+            SELECT id, produto_id, tipo, quantidade, data, usuario, local_id, transferencia_id FROM main.movimentacoes
+            WHERE data >= ? AND data < ?
+        ''', (inicio, fim))
+
+    def remover(cursor):
+        # Apenas o que está no arquivo (movimentações retroativas gravadas
+        # entre as duas transações ficam para o próximo arquivamento)
+        copiadas = f"SELECT id FROM {tabela} WHERE data >= ? AND data < ?"
+        cursor.execute(f'''
+            INSERT INTO saldos_abertura (produto_id, quantidade)
+            SELECT m.produto_id, SUM({SQL_SALDO}) FROM main.movimentacoes m
+            WHERE m.data >= ? AND m.data < ? AND m.id IN ({copiadas}) AND m.produto_id IS NOT NULL
+            GROUP BY m.produto_id
+            ON CONFLICT (produto_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+        ''', (inicio, fim, inicio, fim))
+        cursor.execute(f"DELETE FROM main.movimentacoes WHERE data >= ? AND data < ? AND id IN ({copiadas})",
+                       (inicio, fim, inicio, fim))
+        movidas = cursor.rowcount
+        cursor.execute("UPDATE arquivos_historico SET movimentacoes = movimentacoes + ? WHERE ano = ?",
+                       (movidas, arquivo.ano))
+        cursor.execute("UPDATE controle_arquivamento SET arquivado_ate = MAX(arquivado_ate, ?) WHERE id = 1",
+                       (fim,))
+        return movidas
+
+    def copiar_em_transacao():
+        # BEGIN simples: só o arquivo é gravado, o banco principal é apenas lido
+        with banco.transacao(imediata=False) as cursor:
+            copiar(cursor)
+
+    # Primeiro a cópia, depois a remoção
+    com_retentativa(copiar_em_transacao)
+    return banco.executar_transacao(remover)
+
+
+def arquivar(banco, dias=HORIZONTE_DIAS, tamanho_bloco=TAMANHO_BLOCO, progresso=None):
+    """
+    Move as movimentações anteriores ao horizonte para os arquivos anuais
+    Parâmetros:
+    - dias: horizonte; as movimentações com mais de 'dias' dias são arquivadas
+    - tamanho_bloco: movimentações por bloco (transações curtas: os outros
+      terminais gravam entre um bloco e outro)
+    - progresso: função opcional progresso(ano, movidas no bloco)
+    Retorna o número de movimentações arquivadas.
+    """
+    if dias < 1:
+        raise ValueError("O horizonte deve ser de pelo menos 1 dia")
+    _pasta(banco)
+    limite = limite_horizonte(dias)
+
+    total = 0
+    proxima = banco.consultar_um("SELECT MIN(data) FROM movimentacoes WHERE data < ?", (limite,))[0]
+    while proxima is not None:
+        # Um ano por vez; anos sem movimentações não ganham arquivo
+        ano = datetime.fromtimestamp(proxima).year
+        inicio, fim = proxima, min(inicio_ano(ano + 1), limite)
+        arquivo = _preparar_arquivo(banco, ano)
+        while inicio < fim:
+            corte = _corte(banco, inicio, fim, tamanho_bloco)
+            movidas = _mover_bloco(banco, arquivo, inicio, corte)
+            total += movidas
+            if progresso:
+                progresso(ano, movidas)
+            inicio = corte
+        proxima = banco.consultar_um("SELECT MIN(data) FROM movimentacoes WHERE data >= ? AND data < ?",
+                                     (fim, limite))[0]
+    return total
+
+
+def conferir_saldos(banco):
+    """
+    Produtos cuja quantidade difere de saldo de abertura + movimentações do banco principal
+    Retorna [(id, nome, quantidade, calculado)].
+    """
+    return banco.consultar(f'''
+        SELECT p.id, p.nome, p.quantidade, COALESCE(s.quantidade, 0) + COALESCE(t.saldo, 0)
+        FROM produtos p
+        LEFT JOIN saldos_abertura s ON s.produto_id = p.id
+        LEFT JOIN (SELECT m.produto_id, SUM({SQL_SALDO}) AS saldo FROM movimentacoes m
+                   GROUP BY m.produto_id) t ON t.produto_id = p.id
+        WHERE p.excluido_em IS NULL AND p.quantidade <> COALESCE(s.quantidade, 0) + COALESCE(t.saldo, 0)
+        ORDER BY p.id
+    ''')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arquivamento do histórico de movimentações")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    arquivar_ = subcomandos.add_parser("arquivar", help="move as movimentações antigas para os arquivos anuais")
+    arquivar_.add_argument("--dias", type=int, default=HORIZONTE_DIAS,
+                           help="arquiva as movimentações com mais de DIAS dias")
+    arquivar_.add_argument("--bloco", type=int, default=TAMANHO_BLOCO)
+    arquivar_.add_argument("--compactar", action="store_true",
+                           help="executa VACUUM no final (bloqueia os outros terminais enquanto roda)")
+    subcomandos.add_parser("listar", help="lista os arquivos e o período arquivado")
+    conferir = subcomandos.add_parser("conferir", help="compara o estoque com saldo de abertura + movimentações")
+    conferir.add_argument("-n", "--limite", type=int, default=50, help="número máximo de produtos listados")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    args = parser.parse_args(argv)
+
+    banco = Banco(args.banco)
+    try:
+        banco.inicializar()
+        if args.comando == "arquivar":
+            def progresso(ano, movidas):
+                print(f"{ano}: {movidas} movimentações", file=sys.stderr)
+
+            try:
+                total = arquivar(banco, args.dias, args.bloco, progresso)
+            except ValueError as e:
+                parser.error(str(e))
+            print(f"{total} movimentações arquivadas", file=sys.stderr)
+            if args.compactar and total:
+                banco.executar("VACUUM")
+        elif args.comando == "listar":
+            marca = arquivado_ate(banco)
+            print(f"Arquivado até: {epoch_para_texto(marca) if marca else '(nada arquivado)'}", file=sys.stderr)
+            for arquivo in listar_arquivos(banco):
+                tamanho = os.path.getsize(arquivo.caminho) if os.path.exists(arquivo.caminho) else None
+                print(f"{arquivo.ano}\t{arquivo.caminho}\t{arquivo.movimentacoes} movimentações\t"
+                      f"{f'{tamanho / 1024 / 1024:.1f} MB' if tamanho is not None else 'arquivo ausente'}")
+        else:
+            divergentes = conferir_saldos(banco)
+            for produto_id, nome, quantidade, calculado in divergentes[:args.limite]:
+                print(f"{produto_id}\t{nome}\t{quantidade}\t{calculado}")
+            print(f"{len(divergentes)} produto(s) com diferença", file=sys.stderr)
+    finally:
+        banco.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from banco import Banco, CAMINHO_PADRAO
+
+# ==============================================
+# AUTENTICAÇÃO E SESSÕES
+# ==============================================
+#
+# - Custo do bcrypt configurável (CUSTO_BCRYPT ou Autenticador(custo=...)).
+#   Senhas gravadas com custo menor são regravadas no próximo login correto;
+#   as de custo maior são mantidas, de modo que processos com custos
+#   diferentes no mesmo banco (aplicação e servidor) não regravam a senha um
+#   do outro a cada login (o que também invalidaria o cache de credenciais).
+# - Os cálculos de bcrypt rodam em um pool limitado ao número de CPUs: muitos
+#   logins simultâneos (troca de turno) esperam na fila em vez de disputar a CPU.
+# - Credenciais verificadas ficam em cache por alguns minutos (HMAC da senha
+#   com uma chave aleatória do processo, nunca a senha). O cache vale apenas
+#   enquanto o hash gravado no banco não muda.
+# - Após o login é emitido um token de sessão de curta duração; ações que
+#   pedem nova confirmação validam o token (consulta em memória, sem bcrypt).
+
+# Fator de trabalho do bcrypt (2^custo iterações; 12 é o padrão da biblioteca)
+CUSTO_BCRYPT = 12
+
+# Validade do token de sessão (segundos desde o login)
+VALIDADE_SESSAO_S = 15 * 60
+
+# Tempo que uma senha verificada dispensa um novo bcrypt
+VALIDADE_CACHE_S = 5 * 60
+LIMITE_CACHE_CREDENCIAIS = 1000
+
+TRABALHADORES_HASH = os.cpu_count() or 2
+
+
+class CredenciaisInvalidasError(ValueError):
+    """Usuário inexistente ou senha incorreta"""
+
+    def __init__(self):
+        super().__init__("Credenciais inválidas!")
+
+
+class SessaoExpiradaError(ValueError):
+    """Token de sessão inexistente, encerrado ou vencido"""
+
+    def __init__(self):
+        super().__init__("Sessão expirada. Informe a senha novamente.")
+
+
+def custo_do_hash(senha_hash):
+    """Custo gravado em um hash bcrypt ('$2b$12$...' -> 12); None se não for reconhecido"""
+    partes = senha_hash.split("$")
+    try:
+        return int(partes[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class Sessao:
+    """Sessão aberta por um login: token, usuário ({'username', 'perfil'}) e vencimento (epoch)"""
+
+    def __init__(self, token, usuario, expira_em):
+        self.token = token
+        self.usuario = usuario
+        self.expira_em = expira_em
+
+
+class Autenticador:
+    """
+    Verificação de senhas, cache de credenciais e sessões
+    Parâmetros:
+    - banco: instância de Banco (tabela usuarios)
+    - custo: fator de trabalho do bcrypt para senhas novas e custo mínimo das gravadas
+    - validade_sessao: segundos de validade de cada token
+    - validade_cache: segundos que uma senha verificada dispensa o bcrypt (0 = sem cache)
+    Pode ser usado por várias threads.
+    """
+
+    def __init__(self, banco, custo=CUSTO_BCRYPT, validade_sessao=VALIDADE_SESSAO_S,
+                 validade_cache=VALIDADE_CACHE_S, trabalhadores=TRABALHADORES_HASH):
+        if not 4 <= custo <= 31:
+            raise ValueError("O custo do bcrypt deve estar entre 4 e 31")
+        self.banco = banco
+        self.custo = custo
+        self.validade_sessao = validade_sessao
+        self.validade_cache = validade_cache
+        self.trabalhadores = trabalhadores
+        self._pool = None
+        self._chave = secrets.token_bytes(32)
+        self._lock = threading.Lock()
+        self._sessoes = {}  # token -> Sessao
+        self._credenciais = OrderedDict()  # username -> (hmac da senha, hash gravado, vencimento)
+        self.verificacoes_bcrypt = 0
+        self.acertos_cache = 0
+        self.senhas_regravadas = 0
+
+    # ----- bcrypt (no pool) -----
+    def _executar_hash(self, funcao, *args):
+        """Executa um cálculo de bcrypt no pool e aguarda o resultado"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.trabalhadores, thread_name_prefix="bcrypt")
+            pool = self._pool
+        return pool.submit(funcao, *args).result()
+
+    def gerar_hash(self, senha):
+        """Hash bcrypt da senha com o custo configurado"""
+        import bcrypt  # carregado apenas quando necessário
+
+        def gerar():
+            return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt(self.custo)).decode('utf-8')
+        return self._executar_hash(gerar)
+
+    def _conferir(self, senha, senha_hash):
+        import bcrypt
+
+        def conferir():
+            return bcrypt.checkpw(senha.encode('utf-8'), senha_hash.encode('utf-8'))
+        with self._lock:
+            self.verificacoes_bcrypt += 1
+        return self._executar_hash(conferir)
+
+    def encerrar(self):
+        """Finaliza o pool de bcrypt"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    # ----- Senhas -----
+    def _assinatura(self, username, senha):
+        return hmac.new(self._chave, f"{username}\0{senha}".encode('utf-8'), hashlib.sha256).digest()
+
+    def verificar_senha(self, username, senha):
+        """
+        Confere usuário e senha e retorna {'username', 'perfil'}
+        Lança CredenciaisInvalidasError. Usa o cache quando possível e regrava
+        o hash se ele tiver sido gerado com custo menor que o configurado.
+        """
+        resultado = self.banco.consultar_um("SELECT password, perfil FROM usuarios WHERE username=?", (username,))
+        if resultado is None or not senha:
+            raise CredenciaisInvalidasError()
+        senha_hash, perfil = resultado
+        assinatura = self._assinatura(username, senha)
+
+        with self._lock:
+            em_cache = self._credenciais.get(username)
+            acerto = (em_cache is not None and em_cache[1] == senha_hash and em_cache[2] > time.monotonic()
+                      and hmac.compare_digest(em_cache[0], assinatura))
+            if acerto:
+                self.acertos_cache += 1
+        if acerto:
+            return {'username': username, 'perfil': perfil}
+
+        if not self._conferir(senha, senha_hash):
+            raise CredenciaisInvalidasError()
+
+        custo = custo_do_hash(senha_hash)
+        if custo is None or custo < self.custo:
+            senha_hash = self._regravar_hash(username, senha, senha_hash)
+
+        if self.validade_cache > 0:
+            with self._lock:
+                self._credenciais[username] = (assinatura, senha_hash, time.monotonic() + self.validade_cache)
+                self._credenciais.move_to_end(username)
+                while len(self._credenciais) > LIMITE_CACHE_CREDENCIAIS:
+                    self._credenciais.popitem(last=False)
+        return {'username': username, 'perfil': perfil}
+
+    def _regravar_hash(self, username, senha, senha_hash):
+        """Regrava a senha com o custo configurado (se ninguém a alterou nesse meio tempo); retorna o hash vigente"""
+        novo_hash = self.gerar_hash(senha)
+        cursor = self.banco.executar(
+            "UPDATE usuarios SET password=? WHERE username=? AND password=?", (novo_hash, username, senha_hash)
+        )
+        if cursor.rowcount == 0:
+            return senha_hash
+        with self._lock:
+            self.senhas_regravadas += 1
+        return novo_hash
+
+    def esquecer(self, username):
+        """Remove um usuário do cache de credenciais (ex.: após trocar a senha)"""
+        with self._lock:
+            self._credenciais.pop(username, None)
+
+    # ----- Sessões -----
+    def criar_sessao(self, usuario):
+        """Abre uma sessão para o usuário já autenticado e retorna a Sessao"""
+        agora = time.time()
+        sessao = Sessao(secrets.token_urlsafe(32), usuario, agora + self.validade_sessao)
+        with self._lock:
+            # Remove as sessões vencidas a cada login
+            for token in [t for t, s in self._sessoes.items() if s.expira_em <= agora]:
+                del self._sessoes[token]
+            self._sessoes[sessao.token] = sessao
+        return sessao
+
+    def validar_sessao(self, token):
+        """Retorna o usuário da sessão ou lança SessaoExpiradaError (sem bcrypt)"""
+        with self._lock:
+            sessao = self._sessoes.get(token) if token else None
+            if sessao is not None and sessao.expira_em <= time.time():
+                del self._sessoes[token]
+                sessao = None
+        if sessao is None:
+            raise SessaoExpiradaError()
+        return sessao.usuario
+
+    def encerrar_sessao(self, token):
+        with self._lock:
+            self._sessoes.pop(token, None)
+
+    def estatisticas(self):
+        """Contadores de uso (para diagnóstico)"""
+        with self._lock:
+            return {
+                "custo": self.custo,
+                "verificacoes_bcrypt": self.verificacoes_bcrypt,
+                "acertos_cache": self.acertos_cache,
+                "senhas_regravadas": self.senhas_regravadas,
+                "sessoes": len(self._sessoes),
+                "credenciais_em_cache": len(self._credenciais),
+            }
+
+
+def medir_custo(custo, repeticoes=3):
+    """Tempo médio (ms) de uma verificação bcrypt com o custo informado"""
+    import bcrypt
+    senha_hash = bcrypt.hashpw(b"medicao", bcrypt.gensalt(custo))
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        bcrypt.checkpw(b"medicao", senha_hash)
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Custo do bcrypt e senhas dos usuários")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    medir = subcomandos.add_parser("medir", help="tempo de um login para cada custo")
+    medir.add_argument("--de", type=int, default=10)
+    medir.add_argument("--ate", type=int, default=14)
+    subcomandos.add_parser("custos", help="quantidade de senhas gravadas com cada custo")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    args = parser.parse_args(argv)
+
+    if args.comando == "medir":
+        for custo in range(args.de, args.ate + 1):
+            print(f"custo {custo}\t{medir_custo(custo):.0f} ms")
+        return 0
+
+    banco = Banco(args.banco)
+    try:
+        banco.inicializar()
+        contagem = {}
+        for (senha_hash,) in banco.consultar("SELECT password FROM usuarios"):
+            custo = custo_do_hash(senha_hash)
+            contagem[custo] = contagem.get(custo, 0) + 1
+    finally:
+        banco.fechar()
+    for custo in sorted(contagem, key=lambda c: (c is None, c)):
+        print(f"custo {custo if custo is not None else '?'}\t{contagem[custo]} usuários")
+    print(f"Custo configurado: {CUSTO_BCRYPT} (senhas com custo menor são regravadas no login)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from instrumentacao import (ConexaoInstrumentada, RegistroLentas, METRICAS, LIMITE_LENTA_MS,
+                            caminho_log_lentas)
+from migracoes import aplicar_migracoes
+
+# ==============================================
+# CAMADA DE ACESSO AO BANCO DE DADOS
+# ==============================================
+
+CAMINHO_PADRAO = 'estoque.db'
+
+# Quantidade de comandos SQL preparados mantidos em cache por conexão
+CACHE_COMANDOS = 256
+
+# Perfil de armazenamento aplicado (via PRAGMA) a cada conexão aberta
+# - journal_mode=WAL: leitores nunca bloqueiam e não são bloqueados pelo escritor
+# - synchronous=NORMAL: seguro com WAL, evita um fsync a cada commit
+# - busy_timeout: tempo (ms) que o SQLite aguarda um bloqueio antes de falhar
+# - mmap_size: bytes do arquivo lidos via memória mapeada
+# - cache_size: negativo = tamanho do cache de páginas em KiB
+# - temp_store: tabelas/índices temporários em memória
+PERFIL_PADRAO = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,
+    'temp_store': 'MEMORY',
+}
+
+# Novas tentativas quando o banco continua ocupado após o busy_timeout
+TENTATIVAS_OCUPADO = 8
+ESPERA_INICIAL = 0.05  # segundos, dobra a cada tentativa
+ESPERA_MAXIMA = 2.0
+
+# Códigos de erro do SQLite para banco ocupado/bloqueado
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+def banco_ocupado(erro):
+    """Indica se o erro corresponde a SQLITE_BUSY/SQLITE_LOCKED"""
+    if not isinstance(erro, sqlite3.OperationalError):
+        return False
+    codigo = getattr(erro, 'sqlite_errorcode', None)
+    if codigo is not None:
+        return codigo & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    mensagem = str(erro).lower()
+    return "locked" in mensagem or "busy" in mensagem
+
+
+def com_retentativa(funcao, *args, tentativas=TENTATIVAS_OCUPADO, **kwargs):
+    """
+    Executa funcao(*args, **kwargs) repetindo enquanto o banco estiver ocupado
+    A espera cresce exponencialmente (com variação aleatória para que vários
+    terminais não tentem de novo ao mesmo tempo). Outros erros são repassados.
+    """
+    espera = ESPERA_INICIAL
+    for tentativa in range(tentativas):
+        try:
+            return funcao(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if not banco_ocupado(e) or tentativa == tentativas - 1:
+                raise
+            time.sleep(espera * random.uniform(0.5, 1.5))
+            espera = min(espera * 2, ESPERA_MAXIMA)
+
+# ==============================================
+# DATAS
+# ==============================================
+# As datas das movimentações são gravadas como inteiros (segundos desde
+# 1970, UTC) e convertidas para a hora local apenas na exibição.
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+
+def agora_epoch():
+    """Retorna o instante atual em segundos desde 1970 (UTC)"""
+    return int(time.time())
+
+
+def epoch_para_texto(epoch):
+    """Converte um instante gravado no banco para texto na hora local"""
+    if epoch is None:
+        return ""
+    return datetime.fromtimestamp(epoch).strftime(FORMATO_DATA)
+
+
+def texto_para_epoch(texto):
+    """Converte 'AAAA-MM-DD' ou 'AAAA-MM-DD HH:MM:SS' (hora local) para epoch"""
+    formato = FORMATO_DATA if len(texto.strip()) > 10 else "%Y-%m-%d"
+    return int(datetime.strptime(texto.strip(), formato).timestamp())
+
+
+class Banco:
+    """
+    Gerencia as conexões com o banco de dados SQLite
+    - Cada thread reutiliza sempre a mesma conexão (aberta sob demanda)
+    - Os comandos SQL preparados ficam em cache em cada conexão
+    - A estrutura das tabelas é criada/migrada uma única vez, em inicializar()
+    - Transações são explícitas, através do gerenciador transacao()
+    - Cada conexão recebe o perfil de armazenamento (WAL, cache, mmap...)
+    - Cada comando é medido (ver instrumentacao.py)
+    Parâmetros:
+    - caminho: arquivo do banco de dados
+    - perfil: PRAGMAs que substituem os valores de PERFIL_PADRAO
+    - metricas: Metricas que recebem os tempos dos comandos (None = sem medição)
+    - limite_lenta_ms: comandos mais lentos vão para o arquivo de consultas
+      lentas ao lado do banco (None = sem arquivo)
+    """
+
+    def __init__(self, caminho=CAMINHO_PADRAO, perfil=None, metricas=METRICAS, limite_lenta_ms=LIMITE_LENTA_MS):
+        self.caminho = caminho
+        self.perfil = dict(PERFIL_PADRAO, **(perfil or {}))
+        self.metricas = metricas
+        arquivo_lentas = caminho_log_lentas(caminho) if limite_lenta_ms is not None else None
+        self.lentas = RegistroLentas(arquivo_lentas, limite_lenta_ms) if arquivo_lentas else None
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._conexoes = []
+        self._inicializado = False
+
+    def inicializar(self):
+        """Cria as tabelas e aplica as migrações pendentes (apenas na primeira chamada)"""
+        with self._lock:
+            if self._inicializado:
+                return
+            conn = getattr(self._local, 'conn', None) or self._abrir_conexao()
+            com_retentativa(aplicar_migracoes, conn)
+            self._inicializado = True
+
+    def _abrir_conexao(self):
+        """Abre uma nova conexão em modo autocommit (transações via BEGIN explícito)"""
+        conn = sqlite3.connect(
+            self.caminho,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=CACHE_COMANDOS,
+            timeout=self.perfil['busy_timeout'] / 1000,
+            factory=ConexaoInstrumentada if self.metricas is not None else sqlite3.Connection
+        )
+        if self.metricas is not None:
+            conn.metricas = self.metricas
+            conn.lentas = self.lentas
+        self._aplicar_perfil(conn)
+        self._local.conn = conn
+        with self._lock:
+            self._conexoes.append(conn)
+        return conn
+
+    def _aplicar_perfil(self, conn):
+        """Aplica os PRAGMAs do perfil de armazenamento na conexão"""
+        # busy_timeout primeiro: os demais podem precisar aguardar bloqueios
+        conn.execute(f"PRAGMA busy_timeout = {int(self.perfil['busy_timeout'])}")
+        for pragma in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store'):
+            valor = self.perfil.get(pragma)
+            if valor is not None:
+                com_retentativa(lambda: conn.execute(f"PRAGMA {pragma} = {valor}").fetchall())
+
+    def conexao(self):
+        """Retorna a conexão da thread atual, abrindo-a se necessário"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if not self._inicializado:
+                self.inicializar()
+            conn = getattr(self._local, 'conn', None) or self._abrir_conexao()
+        return conn
+
+    def _repetivel(self, operacao):
+        """Executa operacao(conn), repetindo se o banco estiver ocupado (fora de transação)"""
+        conn = self.conexao()
+        if conn.in_transaction:
+            # Dentro de uma transação quem repete é o chamador (executar_transacao)
+            return operacao(conn)
+        return com_retentativa(operacao, conn)
+
+    def executar(self, sql, parametros=()):
+        """Executa um comando e retorna o cursor (fora de transação, cada comando é atômico)"""
+        return self._repetivel(lambda conn: conn.execute(sql, parametros))
+
+    def consultar(self, sql, parametros=()):
+        """Executa uma consulta e retorna todas as linhas"""
+        return self._repetivel(lambda conn: conn.execute(sql, parametros).fetchall())
+
+    def consultar_um(self, sql, parametros=()):
+        """Executa uma consulta e retorna apenas a primeira linha (ou None)"""
+        return self._repetivel(lambda conn: conn.execute(sql, parametros).fetchone())
+
+    @contextmanager
+    def transacao(self, imediata=True):
+        """
+        Abre uma transação e retorna o cursor para uso no bloco 'with'
+        - COMMIT ao final do bloco
+        - ROLLBACK se ocorrer qualquer exceção
+        Transações aninhadas participam da transação mais externa.
+        Parâmetros:
+        - imediata: reserva a escrita já no início (BEGIN IMMEDIATE), de modo
+          que um escritor ocupado aguarda na fila em vez de falhar no meio
+        """
+        conn = self.conexao()
+        if conn.in_transaction:
+            yield conn.cursor()
+            return
+
+        com_retentativa(conn.execute, "BEGIN IMMEDIATE" if imediata else "BEGIN")
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    def executar_transacao(self, funcao, *args, **kwargs):
+        """
+        Executa funcao(cursor, *args, **kwargs) dentro de uma transação
+        Se o banco estiver ocupado, a transação inteira é repetida.
+        """
+        def _executar():
+            with self.transacao() as cursor:
+                return funcao(cursor, *args, **kwargs)
+        return com_retentativa(_executar)
+
+    def fechar(self):
+        """Fecha todas as conexões abertas (chamado ao encerrar a aplicação)"""
+        with self._lock:
+            for conn in self._conexoes:
+                conn.close()
+            self._conexoes.clear()
+            self._local = threading.local()
@@ -0,0 +1,400 @@
+import argparse
+import asyncio
+import base64
+import http.client
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Permite executar a partir de qualquer diretório: python benchmarks/cenarios.py
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from autenticacao import Autenticador  # noqa: E402
+from banco import Banco  # noqa: E402
+from cache import CacheProdutos  # noqa: E402
+from comum import commit_atual, gravar_resultado, ler_limites, resumir, verificar_limites  # noqa: E402
+from gerar_dados import (PRODUTOS_PADRAO, MOVIMENTACOES_PADRAO, USUARIOS_PADRAO, SEMENTE_PADRAO,  # noqa: E402
+                         SENHA_USUARIOS, gerar_banco)
+from servico import ServicoEstoque  # noqa: E402
+import busca  # noqa: E402
+import exportacao  # noqa: E402
+import historico  # noqa: E402
+
+# ==============================================
+# BENCHMARK DO MOTOR DE ESTOQUE
+# ==============================================
+#
+# Mede as operações por trás das telas (em ms por execução) em um banco com
+# dados sintéticos (gerar_dados.py) ou em uma cópia de um banco existente.
+# O banco medido é sempre temporário: os cenários de gravação não alteram
+# nenhum arquivo do usuário.
+#
+# Cenários:
+# - carregar_lista / atualizar_lista: lista de produtos completa e incremental
+# - indice_busca / buscar: montagem do índice de busca e uma busca por prefixo
+# - historico_pagina / historico_rolagem / historico_produto / historico_contagem:
+#   primeira página, 10 páginas seguidas, filtro por produto e total do histórico
+# - movimentacao / lote: uma entrada e um lote de TAMANHO_LOTE movimentações
+# - login / login_cache: verificação bcrypt e verificação já em cache
+# - exportar_produtos / exportar_movimentacoes: CSV completo / últimos 30 dias
+# - servidor_movimentacoes / servidor_leituras: CLIENTES_SERVIDOR conexões
+#   simultâneas no servidor HTTP (linhas_por_s = requisições por segundo)
+#
+# O JSON inclui o commit, os dados usados e, por cenário, p50/p95/p99 e
+# linhas_por_s. --comparar ANTERIOR.json mostra a variação das medianas.
+
+TAMANHO_LOTE = 100
+CLIENTES_SERVIDOR = 8
+
+CENARIOS = ("carregar_lista", "atualizar_lista", "indice_busca", "buscar", "historico_pagina",
+            "historico_rolagem", "historico_produto", "historico_contagem", "movimentacao", "lote",
+            "login", "login_cache", "exportar_produtos", "exportar_movimentacoes",
+            "servidor_movimentacoes", "servidor_leituras")
+
+
+def medir(funcao, repeticoes, aquecimento=1):
+    """Executa a função (aquecimento + repeticoes) e retorna (tempos em ms, último resultado)"""
+    resultado = None
+    for _ in range(aquecimento):
+        resultado = funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos, resultado
+
+
+class Contexto:
+    """Banco, serviço e amostras de ids usados pelos cenários"""
+
+    def __init__(self, banco, diretorio, semente, usuario, senha):
+        self.banco = banco
+        self.usuario = usuario
+        self.senha = senha
+        self.diretorio = diretorio
+        self.aleatorio = random.Random(semente)
+        self.servico = ServicoEstoque(banco, cache=CacheProdutos(banco))
+        self.produto_ids = [linha[0] for linha in banco.consultar("SELECT id FROM produtos ORDER BY id")]
+        # O produto com mais movimentações (o pior caso do filtro por produto)
+        self.produto_movimentado = banco.consultar_um('''
+            SELECT produto_id FROM consumo_mensal GROUP BY produto_id
+            ORDER BY SUM(entradas + saidas) DESC LIMIT 1
+        ''')
+        self.produto_movimentado = self.produto_movimentado[0] if self.produto_movimentado else self.produto_ids[0]
+
+    def produto(self):
+        return self.aleatorio.choice(self.produto_ids)
+
+
+# ===== CENÁRIOS =====
+def carregar_lista(ctx, repeticoes):
+    tempos, resultado = medir(lambda: ctx.servico.alteracoes_produtos(None), repeticoes)
+    return tempos, len(resultado[1])
+
+
+def atualizar_lista(ctx, repeticoes):
+    versao = ctx.servico.alteracoes_produtos(None)[0]
+
+    def atualizar():
+        # Uma alteração desde a última consulta (caso comum ao voltar para a lista)
+        nonlocal versao
+        ctx.servico.registrar_movimentacao(ctx.produto(), "entrada", 1, "benchmark")
+        inicio = time.perf_counter()
+        versao, alterados, _, _ = ctx.servico.alteracoes_produtos(versao)
+        return (time.perf_counter() - inicio) * 1000, len(alterados)
+
+    tempos = [atualizar()[0] for _ in range(repeticoes)]
+    return tempos, 1
+
+
+def indice_busca(ctx, repeticoes):
+    tempos, resultado = medir(lambda: busca.consultar_alteracoes_indice(ctx.banco, None), repeticoes)
+    ctx.indice = resultado[1]
+    return tempos, len(ctx.indice)
+
+
+def buscar(ctx, repeticoes):
+    if getattr(ctx, "indice", None) is None:
+        ctx.indice = busca.consultar_alteracoes_indice(ctx.banco, None)[1]
+    termos = ("cab", "mou", "lamp", "inox", "ca", "p")
+    tempos, _ = medir(lambda: [ctx.indice.buscar(termo) for termo in termos], repeticoes)
+    return tempos, len(termos)
+
+
+def historico_pagina(ctx, repeticoes):
+    tempos, linhas = medir(lambda: ctx.servico.consultar_historico(), repeticoes)
+    return tempos, len(linhas)
+
+
+def historico_rolagem(ctx, repeticoes):
+    def rolar():
+        total = 0
+        antes = None
+        for _ in range(10):
+            linhas = ctx.servico.consultar_historico(antes=antes)
+            if not linhas:
+                break
+            total += len(linhas)
+            antes = historico.chave(linhas[-1])
+        return total
+
+    return medir(rolar, repeticoes)
+
+
+def historico_produto(ctx, repeticoes):
+    filtro = historico.FiltroHistorico(produto_id=ctx.produto_movimentado)
+    tempos, linhas = medir(lambda: ctx.servico.consultar_historico(filtro), repeticoes)
+    return tempos, len(linhas)
+
+
+def historico_contagem(ctx, repeticoes):
+    return medir(lambda: ctx.servico.contar_historico(), repeticoes)
+
+
+def movimentacao(ctx, repeticoes):
+    tempos, _ = medir(lambda: ctx.servico.registrar_movimentacao(ctx.produto(), "entrada", 1, "benchmark"),
+                      repeticoes)
+    return tempos, 1
+
+
+def lote(ctx, repeticoes):
+    def registrar():
+        itens = [(ctx.produto(), "entrada", 1) for _ in range(TAMANHO_LOTE)]
+        return ctx.servico.registrar_lote(itens, "benchmark")
+
+    tempos, _ = medir(registrar, repeticoes)
+    return tempos, TAMANHO_LOTE
+
+
+def login(ctx, repeticoes):
+    # O bcrypt domina este cenário: poucas repetições bastam
+    autenticador = Autenticador(ctx.banco, validade_cache=0)
+    try:
+        tempos, _ = medir(lambda: autenticador.verificar_senha(ctx.usuario, ctx.senha),
+                          min(repeticoes, 5))
+    finally:
+        autenticador.encerrar()
+    return tempos, 1
+
+
+def login_cache(ctx, repeticoes):
+    tempos, _ = medir(lambda: ctx.servico.autenticar(ctx.usuario, ctx.senha), repeticoes)
+    return tempos, 1
+
+
+def exportar_produtos(ctx, repeticoes):
+    destino = os.path.join(ctx.diretorio, "produtos.csv")
+    return medir(lambda: exportacao.exportar(ctx.banco, "produtos", destino), repeticoes)
+
+
+def exportar_movimentacoes(ctx, repeticoes):
+    destino = os.path.join(ctx.diretorio, "movimentacoes.csv")
+    de = time.strftime("%Y-%m-%d", time.localtime(time.time() - 30 * 24 * 60 * 60))
+    return medir(lambda: exportacao.exportar(ctx.banco, "movimentacoes", destino, de=de),
+                 min(repeticoes, 5))
+
+
+# ===== SERVIDOR HTTP =====
+def _iniciar_servidor(servico):
+    """Inicia o servidor em uma porta livre, em outra thread; retorna (porta, parar)"""
+    from servidor import ServidorEstoque
+
+    loop = asyncio.new_event_loop()
+    servidor = ServidorEstoque(servico)
+    asyncio_server = loop.run_until_complete(servidor.iniciar("127.0.0.1", 0))
+    porta = asyncio_server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, name="servidor", daemon=True)
+    thread.start()
+
+    def parar():
+        async def fechar():
+            asyncio_server.close()
+            await asyncio_server.wait_closed()
+            await servidor.encerrar()
+
+        asyncio.run_coroutine_threadsafe(fechar(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    return porta, parar
+
+
+def _carga_servidor(ctx, requisicoes, montar):
+    """
+    CLIENTES_SERVIDOR conexões keep-alive enviando requisições ao mesmo tempo
+    - montar(aleatorio) -> (método, caminho, corpo JSON ou None)
+    Retorna (tempos em ms de cada requisição, requisições por segundo)
+    """
+    porta, parar = _iniciar_servidor(ctx.servico)
+    try:
+        credenciais = base64.b64encode(f"{ctx.usuario}:{ctx.senha}".encode()).decode()
+        conexao = http.client.HTTPConnection("127.0.0.1", porta)
+        conexao.request("POST", "/sessoes", headers={"Authorization": f"Basic {credenciais}"})
+        token = json.loads(conexao.getresponse().read())["token"]
+        conexao.close()
+
+        tempos = []
+        erros = []
+        por_cliente = max(1, requisicoes // CLIENTES_SERVIDOR)
+
+        def cliente(semente):
+            aleatorio = random.Random(semente)
+            conexao = http.client.HTTPConnection("127.0.0.1", porta)
+            cabecalhos = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+            locais = []
+            try:
+                for _ in range(por_cliente):
+                    metodo, caminho, corpo = montar(aleatorio)
+                    inicio = time.perf_counter()
+                    conexao.request(metodo, caminho, body=json.dumps(corpo) if corpo is not None else None,
+                                    headers=cabecalhos)
+                    resposta = conexao.getresponse()
+                    resposta.read()
+                    locais.append((time.perf_counter() - inicio) * 1000)
+                    if resposta.status >= 400:
+                        erros.append(resposta.status)
+            finally:
+                conexao.close()
+                tempos.extend(locais)
+
+        clientes = [threading.Thread(target=cliente, args=(i,)) for i in range(CLIENTES_SERVIDOR)]
+        inicio = time.perf_counter()
+        for thread in clientes:
+            thread.start()
+        for thread in clientes:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+    finally:
+        parar()
+    if erros:
+        raise RuntimeError(f"{len(erros)} requisições com erro (ex.: HTTP {erros[0]})")
+    return tempos, len(tempos) / duracao
+
+
+def servidor_movimentacoes(ctx, repeticoes):
+    ids = ctx.produto_ids
+    return _carga_servidor(ctx, repeticoes * CLIENTES_SERVIDOR * 10, lambda a: (
+        "POST", "/movimentacoes", {"produto_id": a.choice(ids), "tipo": "entrada", "quantidade": 1}))
+
+
+def servidor_leituras(ctx, repeticoes):
+    ids = ctx.produto_ids
+    return _carga_servidor(ctx, repeticoes * CLIENTES_SERVIDOR * 10,
+                           lambda a: ("GET", f"/produtos/{a.choice(ids)}", None))
+
+
+# Cenários cujo segundo valor já é a vazão (e não linhas por execução)
+CENARIOS_VAZAO = ("servidor_movimentacoes", "servidor_leituras")
+
+
+def executar_cenarios(banco, diretorio, nomes, repeticoes, usuario, senha, semente=SEMENTE_PADRAO,
+                      progresso=None):
+    """
+    Executa os cenários pedidos e retorna {nome: resumo}
+    - usuario/senha: credenciais usadas nos cenários de login e do servidor
+    """
+    ctx = Contexto(banco, diretorio, semente, usuario, senha)
+    resultados = {}
+    try:
+        for nome in nomes:
+            if progresso:
+                progresso(nome)
+            tempos, valor = globals()[nome](ctx, repeticoes)
+            if nome in CENARIOS_VAZAO:
+                resumo = resumir(tempos)
+                resumo["linhas_por_s"] = round(valor, 1)
+            else:
+                resumo = resumir(tempos, valor)
+            resultados[nome] = resumo
+    finally:
+        ctx.servico.encerrar()
+    return resultados
+
+
+def comparar(atual, anterior):
+    """Linhas de texto com a variação da mediana de cada cenário em relação ao resultado anterior"""
+    linhas = []
+    for nome, resumo in atual["cenarios"].items():
+        antes = anterior.get("cenarios", {}).get(nome)
+        if not antes or not antes["p50_ms"]:
+            continue
+        variacao = (resumo["p50_ms"] - antes["p50_ms"]) / antes["p50_ms"] * 100
+        linhas.append(f"{nome}\t{antes['p50_ms']:.2f} -> {resumo['p50_ms']:.2f} ms\t{variacao:+.1f}%")
+    return linhas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede as operações do estoque com dados sintéticos")
+    parser.add_argument("--banco", help="banco existente usado como base (é copiado, nunca alterado); "
+                                        "sem ele, um banco sintético é gerado")
+    parser.add_argument("--produtos", type=int, default=PRODUTOS_PADRAO)
+    parser.add_argument("--movimentacoes", type=int, default=MOVIMENTACOES_PADRAO)
+    parser.add_argument("--usuarios", type=int, default=USUARIOS_PADRAO)
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    parser.add_argument("--usuario", help="usuário dos cenários de login (padrão: operador0001 nos dados "
+                                          "sintéticos, admin com --banco)")
+    parser.add_argument("--senha", help="senha do usuário")
+    parser.add_argument("--cenario", action="append", choices=CENARIOS,
+                        help="executa apenas este cenário (pode repetir)")
+    parser.add_argument("-n", "--repeticoes", type=int, default=20)
+    parser.add_argument("-o", "--saida", default="-", help="arquivo JSON de resultados (padrão: saída padrão)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--limite", action="append", default=[], metavar="CENARIO=MS",
+                        help="falha se a mediana do cenário passar do limite (pode repetir)")
+    args = parser.parse_args(argv)
+    limites = ler_limites(args.limite)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, "benchmark.db")
+        if args.banco:
+            shutil.copyfile(args.banco, caminho)
+            dados = {"banco": os.path.basename(args.banco)}
+            usuario, senha = args.usuario or "admin", args.senha or "admin123"
+        else:
+            print("Gerando dados...", file=sys.stderr)
+            try:
+                dados = gerar_banco(caminho, args.produtos, args.movimentacoes, args.usuarios,
+                                    semente=args.semente)
+            except ValueError as e:
+                parser.error(str(e))
+            usuario, senha = args.usuario or "operador0001", args.senha or SENHA_USUARIOS
+
+        banco = Banco(caminho)
+        try:
+            banco.inicializar()
+            if args.banco:
+                dados["produtos"] = banco.consultar_um("SELECT COUNT(*) FROM produtos")[0]
+                dados["movimentacoes"] = banco.consultar_um("SELECT COUNT(*) FROM movimentacoes")[0]
+            cenarios = executar_cenarios(banco, diretorio, args.cenario or CENARIOS, args.repeticoes,
+                                         usuario, senha, args.semente, lambda nome: print(nome, file=sys.stderr))
+        finally:
+            banco.fechar()
+
+    resultado = {
+        "commit": commit_atual(RAIZ),
+        "python": sys.version.split()[0],
+        "plataforma": sys.platform,
+        "dados": dados,
+        "cenarios": cenarios,
+    }
+    gravar_resultado(resultado, args.saida)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            for linha in comparar(resultado, json.load(arquivo)):
+                print(linha, file=sys.stderr)
+
+    # Verificação de regressão
+    return verificar_limites(cenarios, limites)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
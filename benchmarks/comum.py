@@ -0,0 +1,84 @@
+import json
+import statistics
+import subprocess
+import sys
+
+# ==============================================
+# FUNÇÕES COMUNS DOS BENCHMARKS
+# ==============================================
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) por interpolação linear"""
+    ordenados = sorted(valores)
+    if len(ordenados) == 1:
+        return ordenados[0]
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def resumir(tempos, linhas=None):
+    """
+    Resume uma lista de tempos (ms)
+    - linhas: linhas processadas em cada execução (opcional); inclui linhas_por_s
+    """
+    resumo = {
+        "execucoes": len(tempos),
+        "p50_ms": round(percentil(tempos, 50), 2),
+        "p95_ms": round(percentil(tempos, 95), 2),
+        "p99_ms": round(percentil(tempos, 99), 2),
+        "min_ms": round(min(tempos), 2),
+        "media_ms": round(statistics.fmean(tempos), 2),
+    }
+    if linhas is not None:
+        total_s = sum(tempos) / 1000
+        resumo["linhas_por_s"] = round(linhas * len(tempos) / total_s, 1) if total_s > 0 else None
+    return resumo
+
+
+def commit_atual(diretorio):
+    """Hash curto do commit do projeto (None fora de um repositório git)"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=diretorio, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def gravar_resultado(resultado, destino):
+    """Grava o JSON de resultados em um arquivo ou na saída padrão ('-')"""
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if destino == "-":
+        print(texto)
+    else:
+        with open(destino, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto + "\n")
+
+
+def ler_limites(itens):
+    """Converte ['CENARIO=MS', ...] em {cenario: ms}"""
+    limites = {}
+    for item in itens:
+        cenario, _, valor = item.partition("=")
+        limites[cenario] = float(valor)
+    return limites
+
+
+def verificar_limites(cenarios, limites):
+    """
+    Compara a mediana de cada cenário com o limite e informa as falhas
+    Retorna 1 se algum limite foi ultrapassado (código de saída), senão 0.
+    """
+    falhas = []
+    for cenario, limite in limites.items():
+        if cenario not in cenarios:
+            print(f"Cenário não medido: {cenario}", file=sys.stderr)
+            continue
+        mediana = cenarios[cenario]["p50_ms"]
+        if mediana > limite:
+            falhas.append(f"{cenario}: {mediana:.1f} ms > limite de {limite:.1f} ms")
+    for falha in falhas:
+        print(falha, file=sys.stderr)
+    return 1 if falhas else 0
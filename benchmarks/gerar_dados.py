@@ -0,0 +1,227 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# Permite executar a partir de qualquer diretório: python benchmarks/gerar_dados.py
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from autenticacao import CUSTO_BCRYPT  # noqa: E402
+from banco import Banco, agora_epoch  # noqa: E402
+from movimentacao import LOCAL_PADRAO  # noqa: E402
+from relatorios import reconstruir_totais  # noqa: E402
+from servico import criar_usuario_padrao  # noqa: E402
+
+# ==============================================
+# GERADOR DE DADOS SINTÉTICOS
+# ==============================================
+#
+# Cria um banco novo com produtos, usuários e movimentações aleatórios, mas
+# reproduzíveis: a mesma semente e as mesmas quantidades geram o mesmo
+# conteúdo (as datas são relativas ao momento da geração).
+#
+# - Movimentações distribuídas igualmente pelos dias do histórico, em ordem
+#   de data (como seriam gravadas), 80% delas em 20% dos produtos
+# - Saídas maiores que o saldo viram entradas: o estoque nunca fica negativo
+# - produtos.quantidade = soma das movimentações, tudo no local padrão; cerca
+#   de 10% dos produtos ficam abaixo do mínimo
+# - Todos os usuários gerados têm a senha SENHA_USUARIOS
+# - Carga em massa: o gatilho dos totais de consumo é desligado durante a
+#   gravação das movimentações e os totais são recalculados no final
+
+PRODUTOS_PADRAO = 10000
+MOVIMENTACOES_PADRAO = 1000000
+USUARIOS_PADRAO = 20
+DIAS_PADRAO = 730
+SEMENTE_PADRAO = 42
+
+LIMITE_PRODUTOS = 1000000
+LIMITE_MOVIMENTACOES = 10000000
+
+SENHA_USUARIOS = "senha123"
+
+# Linhas gravadas por transação
+TAMANHO_BLOCO = 100000
+
+PALAVRAS = ("Parafuso", "Porca", "Arruela", "Cabo", "Conector", "Mouse", "Teclado", "Monitor",
+            "Cadeira", "Caneta", "Papel", "Fita", "Lâmpada", "Tomada", "Interruptor", "Câmera",
+            "Módulo", "Bateria", "Carregador", "Óleo")
+COMPLEMENTOS = ("Inox", "Preto", "Branco", "Azul", "Sem Fio", "USB", "Pequeno", "Médio", "Grande",
+                "Ação", "Pró", "Econômico")
+
+GATILHO_CONSUMO = "trg_movimentacoes_consumo"
+
+
+def _em_blocos(linhas, tamanho=TAMANHO_BLOCO):
+    """Agrupa um gerador de linhas em listas de até 'tamanho' linhas"""
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) == tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+def _gerar_usuarios(banco, aleatorio, quantidade, custo):
+    import bcrypt
+
+    # Um único hash para todos: o bcrypt de cada usuário dominaria a geração
+    senha_hash = bcrypt.hashpw(SENHA_USUARIOS.encode('utf-8'), bcrypt.gensalt(custo)).decode('utf-8')
+    nomes = [f"operador{i:04d}" for i in range(1, quantidade + 1)]
+    with banco.transacao() as cursor:
+        cursor.executemany(
+            "INSERT INTO usuarios (username, password, perfil) VALUES (?, ?, ?)",
+            [(nome, senha_hash, "Administrador" if aleatorio.random() < 0.1 else "Comum") for nome in nomes]
+        )
+    return nomes
+
+
+def _gerar_produtos(banco, aleatorio, quantidade, progresso):
+    def linhas():
+        for i in range(1, quantidade + 1):
+            nome = f"{aleatorio.choice(PALAVRAS)} {aleatorio.choice(COMPLEMENTOS)} {i:07d}"
+            yield nome, 0, 0
+
+    for bloco in _em_blocos(linhas()):
+        with banco.transacao() as cursor:
+            cursor.executemany("INSERT INTO produtos (nome, quantidade, quantidade_minima) VALUES (?, ?, ?)",
+                               bloco)
+        if progresso:
+            progresso("produtos", len(bloco))
+    return [linha[0] for linha in banco.consultar("SELECT id FROM produtos ORDER BY id")]
+
+
+def _gerar_movimentacoes(banco, aleatorio, quantidade, produto_ids, usuarios, dias, progresso):
+    fim = agora_epoch()
+    inicio = fim - dias * 24 * 60 * 60
+    populares = produto_ids[:max(1, len(produto_ids) // 5)]
+    saldos = dict.fromkeys(produto_ids, 0)
+
+    def linhas():
+        for dia in range(dias):
+            # Distribui o resto da divisão pelos primeiros dias
+            total_dia = quantidade // dias + (1 if dia < quantidade % dias else 0)
+            base = inicio + dia * 24 * 60 * 60
+            segundos = sorted(aleatorio.randrange(24 * 60 * 60) for _ in range(total_dia))
+            for segundo in segundos:
+                produto_id = aleatorio.choice(populares if aleatorio.random() < 0.8 else produto_ids)
+                if aleatorio.random() < 0.3:
+                    tipo, quantidade_mov = "entrada", aleatorio.randint(1, 60)
+                else:
+                    tipo, quantidade_mov = "saida", aleatorio.randint(1, 10)
+                    if quantidade_mov > saldos[produto_id]:
+                        tipo, quantidade_mov = "entrada", aleatorio.randint(quantidade_mov, 60)
+                saldos[produto_id] += quantidade_mov if tipo == "entrada" else -quantidade_mov
+                yield (produto_id, tipo, quantidade_mov, base + segundo, aleatorio.choice(usuarios))
+
+    sql_gatilho = banco.consultar_um("SELECT sql FROM sqlite_master WHERE type='trigger' AND name=?",
+                                     (GATILHO_CONSUMO,))[0]
+    banco.executar(f"DROP TRIGGER {GATILHO_CONSUMO}")
+    try:
+        for bloco in _em_blocos(linhas()):
+            with banco.transacao() as cursor:
+                cursor.executemany(
+                    "INSERT INTO movimentacoes (produto_id, tipo, quantidade, data, usuario) VALUES (?, ?, ?, ?, ?)",
+                    bloco
+                )
+            if progresso:
+                progresso("movimentacoes", len(bloco))
+    finally:
+        banco.executar(sql_gatilho)
+    reconstruir_totais(banco)
+    return saldos
+
+
+def _gravar_saldos(banco, aleatorio, saldos):
+    """Grava o saldo final de cada produto e o mínimo (cerca de 10% abaixo do mínimo)"""
+    linhas = []
+    for produto_id, saldo in saldos.items():
+        if aleatorio.random() < 0.1:
+            minimo = saldo + aleatorio.randint(1, 20)
+        else:
+            minimo = aleatorio.randint(0, saldo)
+        linhas.append((produto_id, saldo, minimo))
+    for bloco in _em_blocos(linhas):
+        with banco.transacao() as cursor:
+            # produtos.quantidade acompanha pelos gatilhos de estoque_local
+            cursor.executemany("INSERT INTO estoque_local (produto_id, local_id, quantidade) VALUES (?, ?, ?)",
+                               [(produto_id, LOCAL_PADRAO, saldo) for produto_id, saldo, _ in bloco if saldo])
+            cursor.executemany("UPDATE produtos SET quantidade_minima = ? WHERE id = ?",
+                               [(minimo, produto_id) for produto_id, _, minimo in bloco])
+
+
+def gerar_banco(caminho, produtos=PRODUTOS_PADRAO, movimentacoes=MOVIMENTACOES_PADRAO,
+                usuarios=USUARIOS_PADRAO, dias=DIAS_PADRAO, semente=SEMENTE_PADRAO,
+                custo_bcrypt=CUSTO_BCRYPT, progresso=None):
+    """
+    Cria um banco com dados sintéticos
+    Parâmetros:
+    - caminho: arquivo a criar (não pode existir)
+    - produtos/movimentacoes/usuarios: quantidades geradas
+    - dias: período do histórico, terminando agora
+    - semente: semente do gerador aleatório
+    - progresso: função opcional progresso(tabela, linhas gravadas no bloco)
+    Retorna um dicionário com as quantidades e o tempo de geração.
+    """
+    if os.path.exists(caminho):
+        raise ValueError(f"O arquivo já existe: {caminho}")
+    if not 1 <= produtos <= LIMITE_PRODUTOS:
+        raise ValueError(f"Quantidade de produtos deve estar entre 1 e {LIMITE_PRODUTOS}")
+    if not 0 <= movimentacoes <= LIMITE_MOVIMENTACOES:
+        raise ValueError(f"Quantidade de movimentações deve estar entre 0 e {LIMITE_MOVIMENTACOES}")
+    if usuarios < 1 or dias < 1:
+        raise ValueError("Informe ao menos um usuário e um dia de histórico")
+
+    inicio = time.perf_counter()
+    aleatorio = random.Random(semente)
+    banco = Banco(caminho)
+    try:
+        banco.inicializar()
+        criar_usuario_padrao(banco, custo_bcrypt)
+        nomes = _gerar_usuarios(banco, aleatorio, usuarios, custo_bcrypt)
+        produto_ids = _gerar_produtos(banco, aleatorio, produtos, progresso)
+        saldos = _gerar_movimentacoes(banco, aleatorio, movimentacoes, produto_ids, nomes, dias, progresso)
+        _gravar_saldos(banco, aleatorio, saldos)
+    finally:
+        banco.fechar()
+    return {
+        "produtos": produtos,
+        "movimentacoes": movimentacoes,
+        "usuarios": usuarios,
+        "dias": dias,
+        "semente": semente,
+        "geracao_s": round(time.perf_counter() - inicio, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera um banco de estoque com dados sintéticos")
+    parser.add_argument("banco", help="arquivo a criar")
+    parser.add_argument("--produtos", type=int, default=PRODUTOS_PADRAO)
+    parser.add_argument("--movimentacoes", type=int, default=MOVIMENTACOES_PADRAO)
+    parser.add_argument("--usuarios", type=int, default=USUARIOS_PADRAO)
+    parser.add_argument("--dias", type=int, default=DIAS_PADRAO, help="dias de histórico")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    args = parser.parse_args(argv)
+
+    gravadas = {}
+
+    def progresso(tabela, linhas):
+        gravadas[tabela] = gravadas.get(tabela, 0) + linhas
+        print(f"{tabela}: {gravadas[tabela]}", file=sys.stderr)
+
+    try:
+        resumo = gerar_banco(args.banco, args.produtos, args.movimentacoes, args.usuarios, args.dias,
+                             args.semente, progresso=progresso)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Banco gerado em {resumo['geracao_s']} s: {args.banco}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Permite executar a partir de qualquer diretório: python benchmarks/inicializacao.py
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from banco import Banco, CAMINHO_PADRAO  # noqa: E402
+from comum import commit_atual, gravar_resultado, ler_limites, resumir, verificar_limites  # noqa: E402
+
+# ==============================================
+# BENCHMARK DE INICIALIZAÇÃO
+# ==============================================
+#
+# Cenários (tempos em ms):
+# - interpretador: 'python -c pass' (referência para os demais subprocessos)
+# - importar_estoque: 'python -c "import Estoque"' (imports do módulo da interface)
+# - preparar_banco_existente: migrações + usuário padrão em um banco já criado
+# - preparar_banco_novo: o mesmo em um banco vazio (inclui o bcrypt do admin)
+# - primeira_janela / banco_pronto: 'Estoque.py --medir-inicio' (apenas com display)
+#
+# --limite CENARIO=MS falha (código de saída 1) se a mediana passar do limite,
+# para detectar regressões em scripts de integração.
+
+
+def medir_subprocesso(argumentos, repeticoes):
+    """Tempo total (ms) de um subprocesso Python executado no diretório do projeto"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, *argumentos], cwd=RAIZ, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def medir_preparo(caminho_origem, repeticoes, diretorio):
+    """Tempo (ms) de Banco.inicializar() + criar_usuario_padrao() em uma cópia do banco"""
+    from servico import criar_usuario_padrao
+
+    tempos = []
+    for i in range(repeticoes):
+        if caminho_origem:
+            caminho = os.path.join(diretorio, f"existente_{i}.db")
+            shutil.copyfile(caminho_origem, caminho)
+        else:
+            caminho = os.path.join(diretorio, f"novo_{i}.db")
+        inicio = time.perf_counter()
+        banco = Banco(caminho)
+        banco.inicializar()
+        criar_usuario_padrao(banco)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        banco.fechar()
+    return tempos
+
+
+def display_disponivel():
+    """Verifica se é possível abrir uma janela Tk"""
+    try:
+        import tkinter
+        tkinter.Tk().destroy()
+        return True
+    except Exception:
+        return False
+
+
+def medir_janela(caminho_banco, repeticoes):
+    """Executa 'Estoque.py --medir-inicio' e retorna os tempos de janela e de banco (ms)"""
+    janela, banco = [], []
+    for _ in range(repeticoes):
+        saida = subprocess.run(
+            [sys.executable, "Estoque.py", "--medir-inicio", "--banco", caminho_banco],
+            cwd=RAIZ, check=True, capture_output=True, text=True
+        ).stdout
+        tempos = json.loads(saida.strip().splitlines()[-1])
+        janela.append(tempos["janela_ms"])
+        banco.append(tempos["banco_ms"])
+    return janela, banco
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o tempo de inicialização da aplicação")
+    parser.add_argument("--banco", default=os.path.join(RAIZ, CAMINHO_PADRAO),
+                        help="banco usado como base (é copiado, nunca alterado)")
+    parser.add_argument("-n", "--repeticoes", type=int, default=10)
+    parser.add_argument("-o", "--saida", default="-", help="arquivo JSON de resultados (padrão: saída padrão)")
+    parser.add_argument("--limite", action="append", default=[], metavar="CENARIO=MS",
+                        help="falha se a mediana do cenário passar do limite (pode repetir)")
+    args = parser.parse_args(argv)
+
+    limites = ler_limites(args.limite)
+
+    cenarios = {}
+    with tempfile.TemporaryDirectory() as diretorio:
+        cenarios["interpretador"] = medir_subprocesso(["-c", "pass"], args.repeticoes)
+        cenarios["importar_estoque"] = medir_subprocesso(["-c", "import Estoque"], args.repeticoes)
+        cenarios["preparar_banco_existente"] = medir_preparo(args.banco, args.repeticoes, diretorio)
+        # O bcrypt domina este cenário: poucas repetições bastam
+        cenarios["preparar_banco_novo"] = medir_preparo(None, min(args.repeticoes, 3), diretorio)
+
+        if display_disponivel():
+            copia = os.path.join(diretorio, "janela.db")
+            shutil.copyfile(args.banco, copia)
+            cenarios["primeira_janela"], cenarios["banco_pronto"] = medir_janela(copia, args.repeticoes)
+
+    resultado = {
+        "commit": commit_atual(RAIZ),
+        "python": sys.version.split()[0],
+        "plataforma": sys.platform,
+        "cenarios": {nome: resumir(tempos) for nome, tempos in cenarios.items()},
+    }
+
+    gravar_resultado(resultado, args.saida)
+
+    # Verificação de regressão
+    return verificar_limites(resultado["cenarios"], limites)
+
+if __name__ == "__main__":
+    sys.exit(main())
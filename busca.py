@@ -0,0 +1,191 @@
+import bisect
+import re
+import unicodedata
+
+import produtos
+
+# ==============================================
+# BUSCA INCREMENTAL DE PRODUTOS
+# ==============================================
+#
+# Índice em memória, ordenado, dos nomes dos produtos normalizados (sem
+# acentos e sem diferença entre maiúsculas e minúsculas). A busca por prefixo
+# é feita com bisect, então o custo depende do número de resultados e não do
+# tamanho do catálogo.
+#
+# Cada produto entra no índice pelo nome completo e por cada palavra seguinte,
+# de modo que "para" encontra tanto "Parafuso 3mm" quanto "Caixa de parafusos".
+# O índice é atualizado a partir do contador de alterações dos produtos
+# (produtos.consultar_alteracoes), inclusive com alterações de outros terminais.
+
+LIMITE_SUGESTOES = 20
+
+_PALAVRA = re.compile(r"\w+")
+_SEPARADORES = re.compile(r"[\W_]+")
+
+
+def normalizar(texto):
+    """
+    Remove acentos, converte para minúsculas e troca pontuação por espaço
+    ('Pão Francês' -> 'pao frances', 'USB-C' -> 'usb c')
+    """
+    decomposto = unicodedata.normalize("NFKD", texto)
+    if not decomposto.isascii():
+        decomposto = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return _SEPARADORES.sub(" ", decomposto.casefold()).strip()
+
+
+def _chaves(nome):
+    """Retorna (chave do nome completo, [chaves a partir de cada palavra seguinte])"""
+    chave = normalizar(nome)
+    inicios = [m.start() for m in _PALAVRA.finditer(chave) if m.start() > 0]
+    return chave, [chave[i:] for i in inicios]
+
+
+class IndiceProdutos:
+    """
+    Índice ordenado dos nomes dos produtos para busca por prefixo
+    - versao: versão do contador de alterações já aplicada (None = vazio)
+    """
+
+    def __init__(self):
+        self.versao = None
+        self._nomes = {}  # produto_id -> nome
+        self._chaves = {}  # produto_id -> (chave do nome, [chaves das palavras])
+        self._por_nome = []  # [(chave, produto_id)] ordenado
+        self._por_palavra = []  # [(chave a partir da palavra, produto_id)] ordenado
+
+    def __len__(self):
+        return len(self._nomes)
+
+    def __contains__(self, produto_id):
+        return produto_id in self._nomes
+
+    # ----- Manutenção -----
+    def carregar(self, produtos):
+        """Recria o índice a partir de [(id, nome, ...)]"""
+        self._nomes = {}
+        self._chaves = {}
+        por_nome = []
+        por_palavra = []
+        for produto in produtos:
+            produto_id, nome = produto[0], produto[1]
+            chave, palavras = _chaves(nome)
+            self._nomes[produto_id] = nome
+            self._chaves[produto_id] = (chave, palavras)
+            por_nome.append((chave, produto_id))
+            por_palavra.extend((p, produto_id) for p in palavras)
+        por_nome.sort()
+        por_palavra.sort()
+        self._por_nome = por_nome
+        self._por_palavra = por_palavra
+
+    def atualizar(self, produto_id, nome):
+        """Inclui um produto ou atualiza o nome de um produto existente"""
+        if self._nomes.get(produto_id) == nome:
+            return
+        self.remover(produto_id)
+        chave, palavras = _chaves(nome)
+        self._nomes[produto_id] = nome
+        self._chaves[produto_id] = (chave, palavras)
+        bisect.insort(self._por_nome, (chave, produto_id))
+        for palavra in palavras:
+            bisect.insort(self._por_palavra, (palavra, produto_id))
+
+    def remover(self, produto_id):
+        """Remove um produto do índice (se existir)"""
+        if produto_id not in self._nomes:
+            return
+        del self._nomes[produto_id]
+        chave, palavras = self._chaves.pop(produto_id)
+        _remover_ordenado(self._por_nome, (chave, produto_id))
+        for palavra in palavras:
+            _remover_ordenado(self._por_palavra, (palavra, produto_id))
+
+    def substituir(self, outro):
+        """Passa a usar as estruturas de outro índice (montado em segundo plano)"""
+        self.__dict__.update(outro.__dict__)
+
+    def aplicar(self, alteracoes):
+        """Aplica o resultado de produtos.consultar_alteracoes()"""
+        versao, alterados, removidos, completo = alteracoes
+        if completo:
+            self.carregar(alterados)
+        else:
+            for produto_id in removidos:
+                self.remover(produto_id)
+            for produto in alterados:
+                self.atualizar(produto[0], produto[1])
+        self.versao = versao
+
+    # ----- Consulta -----
+    def nome(self, produto_id):
+        return self._nomes.get(produto_id)
+
+    def rotulo(self, produto_id):
+        """Texto exibido nas listas de seleção: 'id - nome'"""
+        return f"{produto_id} - {self._nomes[produto_id]}"
+
+    def produto_do_rotulo(self, texto):
+        """Retorna o id do produto de um texto 'id - nome' válido (ou None)"""
+        codigo, _, _ = texto.partition(" - ")
+        if not codigo.strip().isdigit():
+            return None
+        produto_id = int(codigo)
+        if produto_id in self._nomes and self.rotulo(produto_id) == texto.strip():
+            return produto_id
+        return None
+
+    def buscar(self, termo, limite=LIMITE_SUGESTOES):
+        """
+        Retorna até 'limite' ids de produtos cujo nome (ou uma de suas palavras)
+        começa pelo termo, ignorando acentos e maiúsculas
+        Os nomes que começam pelo termo vêm primeiro; cada grupo em ordem alfabética.
+        Sem termo, retorna os primeiros produtos em ordem alfabética.
+        """
+        termo = normalizar(termo)
+        resultado = _prefixo(self._por_nome, termo, limite)
+        if len(resultado) < limite and termo:
+            encontrados = set(resultado)
+            por_palavra = []
+            # Um produto pode aparecer por mais de uma palavra: busca com folga
+            for produto_id in _prefixo(self._por_palavra, termo, limite * 2):
+                if produto_id not in encontrados:
+                    encontrados.add(produto_id)
+                    por_palavra.append(produto_id)
+            por_palavra.sort(key=lambda i: self._chaves[i][0])
+            resultado.extend(por_palavra[:limite - len(resultado)])
+        return resultado
+
+
+def consultar_alteracoes_indice(banco, versao):
+    """
+    Consulta as alterações desde a versão do índice (para rodar em segundo plano)
+    Retorna (alteracoes, novo_indice). Numa carga completa novo_indice já vem
+    montado, e a thread da interface só precisa chamar substituir(); nas
+    incrementais é None e as alterações são aplicadas com aplicar().
+    """
+    alteracoes = produtos.consultar_alteracoes(banco, versao)
+    if alteracoes[3]:
+        novo = IndiceProdutos()
+        novo.aplicar(alteracoes)
+        return alteracoes, novo
+    return alteracoes, None
+
+
+def _prefixo(lista, termo, limite):
+    """Ids das entradas de uma lista ordenada [(chave, id)] cuja chave começa pelo termo"""
+    ids = []
+    for i in range(bisect.bisect_left(lista, (termo,)), len(lista)):
+        chave, produto_id = lista[i]
+        if not chave.startswith(termo) or len(ids) >= limite:
+            break
+        ids.append(produto_id)
+    return ids
+
+
+def _remover_ordenado(lista, item):
+    """Remove um item de uma lista ordenada"""
+    posicao = bisect.bisect_left(lista, item)
+    if posicao < len(lista) and lista[posicao] == item:
+        del lista[posicao]
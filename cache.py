@@ -0,0 +1,182 @@
+import threading
+from collections import OrderedDict
+
+# ==============================================
+# CACHE DE PRODUTOS
+# ==============================================
+#
+# Registros compactos (id, nome, quantidade, quantidade_minima) mantidos em
+# memória com descarte LRU. As leituras passam pelo cache (read-through) e as
+# gravações desta aplicação o atualizam logo após o commit (write-through).
+# Alterações feitas por outros terminais chegam pelo contador de alterações
+# dos produtos (produtos.consultar_alteracoes) e são aplicadas com
+# aplicar_alteracoes().
+#
+# Corrida entre leitura e gravação: uma consulta iniciada antes de uma
+# gravação desta aplicação pode terminar depois dela. Cada gravação recebe uma
+# marca crescente; quem consulta o banco guarda marca_atual() antes da
+# consulta e os produtos gravados depois dessa marca não são sobrescritos.
+
+CAPACIDADE_PADRAO = 20000
+
+SQL_PRODUTO = "SELECT id, nome, quantidade, quantidade_minima FROM produtos WHERE id=? AND excluido_em IS NULL"
+
+
+class RegistroProduto:
+    """Dados de um produto em cache"""
+
+    __slots__ = ("id", "nome", "quantidade", "quantidade_minima")
+
+    def __init__(self, id, nome, quantidade, quantidade_minima):
+        self.id = id
+        self.nome = nome
+        self.quantidade = quantidade
+        self.quantidade_minima = quantidade_minima
+
+    @property
+    def estoque_baixo(self):
+        return self.quantidade < self.quantidade_minima
+
+    def __repr__(self):
+        return (f"RegistroProduto({self.id}, {self.nome!r}, "
+                f"{self.quantidade}, {self.quantidade_minima})")
+
+
+class CacheProdutos:
+    """
+    Cache LRU de produtos (seguro para uso por várias threads)
+    Parâmetros:
+    - banco: instância de Banco usada nas leituras que não estão em cache
+    - capacidade: máximo de produtos mantidos (os menos usados são descartados)
+    """
+
+    def __init__(self, banco, capacidade=CAPACIDADE_PADRAO):
+        self.banco = banco
+        self.capacidade = capacidade
+        self._registros = OrderedDict()  # produto_id -> RegistroProduto (mais recente no fim)
+        self._lock = threading.Lock()
+        self._marca = 0
+        self._escritas = {}  # produto_id -> marca da última gravação
+        self._marca_limpeza = 0  # consultas anteriores a esta marca são ignoradas
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+
+    # ----- Leitura -----
+    def obter(self, produto_id):
+        """Retorna o RegistroProduto (consultando o banco se necessário) ou None"""
+        with self._lock:
+            registro = self._registros.get(produto_id)
+            if registro is not None:
+                self._registros.move_to_end(produto_id)
+                self.acertos += 1
+                return registro
+            self.falhas += 1
+            marca = self._marca
+
+        linha = self.banco.consultar_um(SQL_PRODUTO, (produto_id,))
+        if linha is None:
+            return None
+        registro = RegistroProduto(*linha)
+        with self._lock:
+            if self._valido(produto_id, marca):
+                self._guardar(registro)
+        return registro
+
+    def em_cache(self, produto_id):
+        """Retorna o registro apenas se já estiver em cache (sem consultar o banco)"""
+        with self._lock:
+            return self._registros.get(produto_id)
+
+    def marca_atual(self):
+        """Marca a ser obtida antes de uma consulta cujo resultado irá para aplicar_alteracoes()"""
+        with self._lock:
+            return self._marca
+
+    # ----- Gravações desta aplicação (write-through) -----
+    def gravar(self, produto_id, nome, quantidade, quantidade_minima):
+        """Registra um produto incluído ou alterado"""
+        with self._lock:
+            self._registrar_escrita(produto_id)
+            self._guardar(RegistroProduto(produto_id, nome, quantidade, quantidade_minima))
+
+    def atualizar_quantidade(self, produto_id, quantidade):
+        """Registra o novo saldo de um produto após uma movimentação"""
+        with self._lock:
+            self._registrar_escrita(produto_id)
+            registro = self._registros.get(produto_id)
+            if registro is not None:
+                registro.quantidade = quantidade
+
+    def remover(self, produto_id):
+        """Registra a exclusão de um produto"""
+        with self._lock:
+            self._registrar_escrita(produto_id)
+            self._registros.pop(produto_id, None)
+
+    # ----- Alterações vindas do banco -----
+    def aplicar_alteracoes(self, alteracoes, marca):
+        """
+        Aplica o resultado de produtos.consultar_alteracoes()
+        - marca: valor de marca_atual() obtido antes da consulta
+        Numa carga completa o cache é preenchido (até a capacidade); nas
+        incrementais apenas os produtos já em cache são atualizados.
+        """
+        versao, alterados, removidos, completo = alteracoes
+        with self._lock:
+            if marca < self._marca_limpeza:
+                return
+            for produto_id in removidos:
+                if self._valido(produto_id, marca):
+                    self._registros.pop(produto_id, None)
+            for produto in alterados:
+                produto_id = produto[0]
+                if not self._valido(produto_id, marca):
+                    continue
+                if completo:
+                    if len(self._registros) >= self.capacidade and produto_id not in self._registros:
+                        continue
+                elif produto_id not in self._registros:
+                    continue
+                self._guardar(RegistroProduto(*produto[:4]))
+
+    def limpar(self):
+        """Esvazia o cache (os contadores são mantidos)"""
+        with self._lock:
+            self._registros.clear()
+            self._escritas.clear()
+            self._marca += 1
+            self._marca_limpeza = self._marca
+
+    def estatisticas(self):
+        """Contadores para ajuste da capacidade"""
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "tamanho": len(self._registros),
+                "capacidade": self.capacidade,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+                "descartes": self.descartes,
+            }
+
+    # ----- Interno (chamado com o lock) -----
+    def _guardar(self, registro):
+        self._registros[registro.id] = registro
+        self._registros.move_to_end(registro.id)
+        while len(self._registros) > self.capacidade:
+            self._registros.popitem(last=False)
+            self.descartes += 1
+
+    def _registrar_escrita(self, produto_id):
+        self._marca += 1
+        self._escritas[produto_id] = self._marca
+        if len(self._escritas) > self.capacidade:
+            # Evita crescimento ilimitado: consultas em andamento passam a ser ignoradas
+            self._escritas.clear()
+            self._marca_limpeza = self._marca
+
+    def _valido(self, produto_id, marca):
+        """True se o produto não foi gravado depois da marca da consulta"""
+        return marca >= self._marca_limpeza and self._escritas.get(produto_id, 0) <= marca
@@ -0,0 +1,192 @@
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+import arquivamento
+from banco import Banco, CAMINHO_PADRAO, agora_epoch, epoch_para_texto
+from movimentacao import ProdutoNaoEncontradoError
+
+# ==============================================
+# EXCLUSÃO DE PRODUTOS
+# ==============================================
+#
+# Excluir um produto com milhares de movimentações em uma única transação
+# segura a escrita do banco (e a tela) até o fim. A exclusão é feita em duas
+# etapas:
+#
+# - excluir_produto(): exclusão lógica, instantânea. Grava produtos.excluido_em
+#   e o produto some das listas, da busca, dos alertas, do histórico e das
+#   movimentações (que passam a recusá-lo como inexistente). O contador de
+#   alterações registra a remoção, então os outros terminais também o tiram
+#   da lista.
+# - purgar_produto(): remoção do histórico em segundo plano, em blocos de
+#   TAMANHO_BLOCO movimentações, cada bloco em uma transação curta e com uma
+#   pausa entre eles para que as gravações dos terminais passem na frente.
+#   Primeiro o banco principal, depois os arquivos anuais e, por último, a
+#   linha do produto (os gatilhos de exclusão limpam retratos, totais de
+#   consumo, saldo de abertura, estoque por local e transferências).
+#
+# A remoção pode ser interrompida a qualquer momento: o produto continua
+# excluído e purgar_pendentes() (chamada ao abrir a aplicação) termina o
+# trabalho. Até lá o nome continua reservado.
+
+# Movimentações removidas por transação
+TAMANHO_BLOCO = 2000
+
+# Pausa entre os blocos (s): libera a escrita para os outros terminais
+PAUSA_BLOCO = 0.02
+
+# Produto aguardando a remoção do histórico
+ProdutoExcluido = namedtuple("ProdutoExcluido", "produto_id nome excluido_em")
+
+
+def excluir_produto(banco, produto_id):
+    """
+    Exclusão lógica: o produto deixa de aparecer imediatamente
+    Lança ProdutoNaoEncontradoError se o produto não existe (ou já foi excluído).
+    O histórico continua no banco até purgar_produto().
+    """
+    cursor = banco.executar("UPDATE produtos SET excluido_em=? WHERE id=? AND excluido_em IS NULL",
+                            (agora_epoch(), produto_id))
+    if cursor.rowcount == 0:
+        raise ProdutoNaoEncontradoError(f"Produto {produto_id} não encontrado!")
+
+
+def produtos_pendentes(banco):
+    """Retorna [ProdutoExcluido] dos produtos excluídos cujo histórico ainda não foi removido"""
+    return [ProdutoExcluido(*linha) for linha in banco.consultar(
+        "SELECT id, nome, excluido_em FROM produtos WHERE excluido_em IS NOT NULL ORDER BY id"
+    )]
+
+
+def _remover_bloco(banco, tabela, produto_id, tamanho_bloco):
+    """Remove até 'tamanho_bloco' movimentações do produto em uma transação; retorna quantas"""
+    def remover(cursor):
+        cursor.execute(f'''
+            DELETE FROM {tabela} WHERE id IN (
+                SELECT id FROM {tabela} WHERE produto_id = ? LIMIT ?
+            )
+        ''', (produto_id, tamanho_bloco))
+        return cursor.rowcount
+    return banco.executar_transacao(remover)
+
+
+def purgar_produto(banco, produto_id, tamanho_bloco=TAMANHO_BLOCO, pausa=PAUSA_BLOCO, progresso=None,
+                   interromper=None):
+    """
+    Remove o histórico e a linha de um produto já excluído, em blocos
+    Parâmetros:
+    - tamanho_bloco: movimentações removidas por transação
+    - pausa: espera entre os blocos (s)
+    - progresso: função opcional progresso(removidas, total)
+    - interromper: threading.Event opcional; quando ligado, para entre dois
+      blocos e o produto continua pendente (ex.: ao fechar a aplicação)
+    Retorna o número de movimentações removidas. Lança ValueError se o
+    produto não foi excluído antes ou se um arquivo do histórico não existe.
+    """
+    if tamanho_bloco < 1:
+        raise ValueError("O tamanho do bloco deve ser maior que zero")
+    if not banco.consultar_um("SELECT 1 FROM produtos WHERE id=? AND excluido_em IS NOT NULL", (produto_id,)):
+        raise ProdutoNaoEncontradoError(f"Produto {produto_id} não está aguardando exclusão!")
+
+    # Banco principal primeiro: o arquivamento só leva para os arquivos o que ainda está aqui
+    fontes = [(None, "main.movimentacoes")]
+    fontes += [(arquivo, f"{arquivamento.esquema(arquivo.ano)}.movimentacoes")
+               for arquivo in arquivamento.listar_arquivos(banco)]
+
+    # Um arquivo anexado por vez (a contagem usa o índice por produto)
+    total = 0
+    for arquivo, tabela in fontes:
+        if arquivo is not None:
+            arquivamento.anexar(banco, [arquivo])
+        total += banco.consultar_um(f"SELECT COUNT(*) FROM {tabela} WHERE produto_id = ?", (produto_id,))[0]
+    removidas = 0
+    if progresso:
+        progresso(removidas, total)
+    for arquivo, tabela in fontes:
+        if arquivo is not None:
+            arquivamento.anexar(banco, [arquivo])
+        while True:
+            quantidade = _remover_bloco(banco, tabela, produto_id, tamanho_bloco)
+            if quantidade == 0:
+                break
+            removidas += quantidade
+            if progresso:
+                progresso(removidas, max(total, removidas))
+            if interromper is not None and interromper.is_set():
+                return removidas
+            time.sleep(pausa)
+
+    banco.executar("DELETE FROM produtos WHERE id=? AND excluido_em IS NOT NULL", (produto_id,))
+    return removidas
+
+
+def purgar_pendentes(banco, tamanho_bloco=TAMANHO_BLOCO, pausa=PAUSA_BLOCO, progresso=None,
+                     interromper=None):
+    """
+    Termina a remoção de todos os produtos excluídos
+    - progresso: função opcional progresso(produto, removidas, total), com o ProdutoExcluido
+    - interromper: como em purgar_produto()
+    Retorna o número de produtos processados.
+    """
+    processados = 0
+    for produto in produtos_pendentes(banco):
+        if interromper is not None and interromper.is_set():
+            break
+
+        def informar(removidas, total, produto=produto):
+            progresso(produto, removidas, total)
+
+        try:
+            purgar_produto(banco, produto.produto_id, tamanho_bloco, pausa,
+                           informar if progresso else None, interromper)
+        except ProdutoNaoEncontradoError:
+            continue  # removido por outro terminal enquanto isso
+        processados += 1
+    return processados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remoção do histórico dos produtos excluídos")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    subcomandos.add_parser("pendentes", help="lista os produtos excluídos que aguardam a remoção")
+    purgar = subcomandos.add_parser("purgar", help="remove o histórico dos produtos excluídos")
+    purgar.add_argument("--produto", type=int, help="id do produto (padrão: todos os pendentes)")
+    purgar.add_argument("--bloco", type=int, default=TAMANHO_BLOCO, help="movimentações por transação")
+    purgar.add_argument("--pausa", type=float, default=PAUSA_BLOCO, help="pausa entre os blocos (s)")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    args = parser.parse_args(argv)
+
+    banco = Banco(args.banco)
+    try:
+        banco.inicializar()
+        if args.comando == "pendentes":
+            pendentes = produtos_pendentes(banco)
+            for produto in pendentes:
+                print(f"{produto.produto_id}\t{produto.nome}\texcluído em {epoch_para_texto(produto.excluido_em)}")
+            print(f"{len(pendentes)} produto(s) aguardando a remoção", file=sys.stderr)
+        else:
+            def progresso(produto_id, removidas, total):
+                print(f"{produto_id}: {removidas}/{total} movimentações", file=sys.stderr)
+
+            try:
+                if args.produto is not None:
+                    purgar_produto(banco, args.produto, args.bloco, args.pausa,
+                                   lambda removidas, total: progresso(args.produto, removidas, total))
+                    removidos = 1
+                else:
+                    removidos = purgar_pendentes(
+                        banco, args.bloco, args.pausa,
+                        lambda produto, removidas, total: progresso(produto.produto_id, removidas, total)
+                    )
+            except ValueError as e:
+                parser.error(str(e))
+            print(f"{removidos} produto(s) removido(s)", file=sys.stderr)
+    finally:
+        banco.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import sys
+
+from banco import Banco, CAMINHO_PADRAO, epoch_para_texto
+from historico import FiltroHistorico, gerar_movimentacoes
+
+# ==============================================
+# EXPORTAÇÃO DE DADOS
+# ==============================================
+#
+# As consultas são lidas em blocos (fetchmany) e gravadas à medida que
+# chegam, então a memória usada não depende do tamanho das tabelas.
+# A senha dos usuários nunca é exportada.
+
+TAMANHO_BLOCO = 1000
+
+TABELAS = ("produtos", "movimentacoes", "usuarios")
+
+# Colunas exportadas de cada tabela
+COLUNAS = {
+    "produtos": ("id", "nome", "quantidade", "quantidade_minima"),
+    "movimentacoes": ("id", "produto_id", "produto", "tipo", "quantidade", "data", "usuario", "local_id"),
+    "usuarios": ("id", "username", "perfil"),
+}
+
+
+def consulta_exportacao(tabela, produto_id=None):
+    """Monta (sql, parametros) para exportar produtos ou usuarios"""
+    if tabela == "usuarios":
+        # A coluna password fica de fora de propósito
+        return "SELECT id, username, perfil FROM usuarios ORDER BY id", ()
+
+    if tabela == "produtos":
+        if produto_id is not None:
+            return ("SELECT id, nome, quantidade, quantidade_minima FROM produtos "
+                    "WHERE id=? AND excluido_em IS NULL",
+                    (produto_id,))
+        return ("SELECT id, nome, quantidade, quantidade_minima FROM produtos "
+                "WHERE excluido_em IS NULL ORDER BY id"), ()
+
+    raise ValueError(f"Tabela inválida: {tabela}")
+
+
+def gerar_linhas(banco, tabela, de=None, ate=None, produto_id=None, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Gera as linhas da tabela em blocos de tamanho_bloco (datas já convertidas para texto)
+    - de/ate e produto_id filtram movimentacoes pelo FiltroHistorico, que usa
+      os índices (produto_id, data) e (data)
+    - produto_id também filtra a tabela produtos
+    """
+    if tabela == "movimentacoes":
+        filtro = FiltroHistorico.por_datas(de, ate, produto_id=produto_id)
+        for linha in gerar_movimentacoes(banco, filtro, tamanho_bloco):
+            yield linha[:5] + (epoch_para_texto(linha[5]),) + linha[6:]
+        return
+
+    sql, parametros = consulta_exportacao(tabela, produto_id)
+    # Cursor próprio: a exportação pode rodar junto com outras consultas
+    cursor = banco.conexao().cursor()
+    try:
+        cursor.execute(sql, parametros)
+        while True:
+            bloco = cursor.fetchmany(tamanho_bloco)
+            if not bloco:
+                break
+            yield from bloco
+    finally:
+        cursor.close()
+
+
+def _abrir_saida(destino, compactar):
+    """Abre o arquivo de saída em modo texto ('-' = saída padrão)"""
+    if destino == "-":
+        if compactar:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb"),
+                                    encoding="utf-8", newline="")
+        return io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="", write_through=True)
+    if compactar:
+        return io.TextIOWrapper(gzip.open(destino, "wb"), encoding="utf-8", newline="")
+    return open(destino, "w", encoding="utf-8", newline="")
+
+
+def exportar(banco, tabela, destino, formato="csv", compactar=False,
+             de=None, ate=None, produto_id=None, progresso=None):
+    """
+    Exporta a tabela para CSV ou JSON-lines e retorna a quantidade de linhas
+    Parâmetros:
+    - destino: caminho do arquivo ('-' para a saída padrão)
+    - formato: 'csv' ou 'jsonl'
+    - compactar: grava com gzip
+    - de/ate: período ('AAAA-MM-DD', inclusivo) das movimentações
+    - produto_id: exporta apenas um produto
+    - progresso: função opcional progresso(linhas), chamada a cada bloco
+    """
+    if formato not in ("csv", "jsonl"):
+        raise ValueError(f"Formato inválido: {formato}")
+    colunas = COLUNAS[tabela]
+    total = 0
+
+    saida = _abrir_saida(destino, compactar)
+    try:
+        if formato == "csv":
+            escritor = csv.writer(saida)
+            escritor.writerow(colunas)
+            gravar = escritor.writerow
+        else:
+            def gravar(linha):
+                saida.write(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False))
+                saida.write("\n")
+
+        for linha in gerar_linhas(banco, tabela, de, ate, produto_id):
+            gravar(linha)
+            total += 1
+            if progresso and total % TAMANHO_BLOCO == 0:
+                progresso(total)
+    finally:
+        if destino == "-" and not compactar:
+            # Não fecha a saída padrão, apenas descarrega o buffer
+            saida.flush()
+            saida.detach()
+        else:
+            saida.close()
+    if progresso:
+        progresso(total)
+    return total
+
+
+# ==============================================
+# LINHA DE COMANDO
+# ==============================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta os dados do estoque (sem senhas)")
+    parser.add_argument("tabela", choices=TABELAS)
+    parser.add_argument("-o", "--saida", default="-",
+                        help="arquivo de saída (padrão: saída padrão; .gz compacta)")
+    parser.add_argument("--formato", choices=["csv", "jsonl"],
+                        help="formato de saída (padrão: pela extensão do arquivo, senão csv)")
+    parser.add_argument("--gzip", action="store_true", help="compacta a saída com gzip")
+    parser.add_argument("--de", help="data inicial das movimentações (AAAA-MM-DD)")
+    parser.add_argument("--ate", help="data final das movimentações (AAAA-MM-DD, inclusiva)")
+    parser.add_argument("--produto", type=int, help="id do produto")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    args = parser.parse_args(argv)
+
+    compactar = args.gzip or args.saida.endswith(".gz")
+    formato = args.formato
+    if formato is None:
+        nome = args.saida[:-3] if args.saida.endswith(".gz") else args.saida
+        formato = "jsonl" if nome.endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+    banco = Banco(args.banco)
+    try:
+        total = exportar(banco, args.tabela, args.saida, formato, compactar,
+                         args.de, args.ate, args.produto)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        banco.fechar()
+    print(f"{total} linhas exportadas", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+from datetime import datetime, timedelta
+
+import arquivamento
+
+# ==============================================
+# CONSULTA PAGINADA DO HISTÓRICO
+# ==============================================
+#
+# As páginas são buscadas por chave (keyset) sobre (data, id), e não por
+# OFFSET: cada página parte da última linha já exibida e usa os índices
+# por data, então o custo não cresce com a posição na lista.
+# A ordem natural do histórico é da movimentação mais recente para a mais antiga.
+#
+# Os filtros (período, produto, tipo, usuário, local) viram condições SQL:
+# - produto: índice (produto_id, data)
+# - usuário: índice (usuario, data)
+# - local: índice (local_id, data)
+# - período: índice (data)
+#
+# Movimentações arquivadas (arquivamento.py) entram por UNION ALL, com os
+# mesmos filtros em cada arquivo, apenas quando a data inicial do filtro
+# alcança o período arquivado.
+
+TAMANHO_PAGINA = 200
+
+SQL_BASE = '''
+    SELECT m.id, m.data, p.nome, m.tipo, m.quantidade, m.usuario, l.nome
+    FROM {tabela} m
+    JOIN produtos p ON m.produto_id = p.id AND p.excluido_em IS NULL
+    LEFT JOIN locais l ON l.id = m.local_id
+'''
+
+def intervalo_datas(de=None, ate=None):
+    """
+    Converte 'AAAA-MM-DD' (hora local) em limites epoch [inicio, fim)
+    A data final é inclusiva: o limite superior é o início do dia seguinte.
+    Lança ValueError se alguma data for inválida.
+    """
+    inicio = fim = None
+    if de:
+        inicio = int(datetime.strptime(de.strip(), "%Y-%m-%d").timestamp())
+    if ate:
+        fim = int((datetime.strptime(ate.strip(), "%Y-%m-%d") + timedelta(days=1)).timestamp())
+    return inicio, fim
+
+
+class FiltroHistorico:
+    """
+    Filtro das movimentações (todos os campos são opcionais)
+    - inicio/fim: limites epoch do período, [inicio, fim)
+    - produto_id: id do produto
+    - tipo: 'entrada' ou 'saida'
+    - usuario: nome do usuário
+    - local_id: id do local
+    """
+
+    def __init__(self, inicio=None, fim=None, produto_id=None, tipo=None, usuario=None, local_id=None):
+        self.inicio = inicio
+        self.fim = fim
+        self.produto_id = produto_id
+        self.tipo = tipo
+        self.usuario = usuario or None
+        self.local_id = local_id
+
+    @classmethod
+    def por_datas(cls, de=None, ate=None, **kwargs):
+        """Cria o filtro a partir de datas 'AAAA-MM-DD' (ambas inclusivas)"""
+        inicio, fim = intervalo_datas(de, ate)
+        return cls(inicio, fim, **kwargs)
+
+    def condicoes(self):
+        """Retorna (lista de condições SQL sobre o alias m, parâmetros)"""
+        condicoes = []
+        parametros = []
+        if self.produto_id is not None:
+            condicoes.append("m.produto_id = ?")
+            parametros.append(self.produto_id)
+        if self.tipo:
+            condicoes.append("m.tipo = ?")
+            parametros.append(self.tipo)
+        if self.usuario:
+            condicoes.append("m.usuario = ?")
+            parametros.append(self.usuario)
+        if self.local_id is not None:
+            condicoes.append("m.local_id = ?")
+            parametros.append(self.local_id)
+        if self.inicio is not None:
+            condicoes.append("m.data >= ?")
+            parametros.append(self.inicio)
+        if self.fim is not None:
+            condicoes.append("m.data < ?")
+            parametros.append(self.fim)
+        return condicoes, parametros
+
+    def where(self, extras=()):
+        """Retorna (cláusula WHERE, parâmetros), incluindo condições extras [(sql, params)]"""
+        condicoes, parametros = self.condicoes()
+        for sql, params in extras:
+            condicoes.append(sql)
+            parametros.extend(params)
+        if not condicoes:
+            return "", parametros
+        return "WHERE " + " AND ".join(condicoes) + " ", parametros
+
+
+def _consulta_fontes(banco, filtro, sql, extras=()):
+    """
+    Monta sql (com {tabela} e {where}) para a tabela atual e cada arquivo
+    que o filtro alcança, unidos por UNION ALL; retorna (sql, parâmetros)
+    """
+    partes = []
+    parametros = []
+    for tabela, condicoes in arquivamento.fontes_movimentacoes(banco, filtro.inicio, filtro.fim):
+        where, params = filtro.where(list(extras) + condicoes)
+        partes.append(sql.format(tabela=tabela, where=where))
+        parametros.extend(params)
+    return " UNION ALL ".join(partes), parametros
+
+
+def chave(linha):
+    """Retorna a chave de paginação (data, id) de uma linha do histórico"""
+    return (linha[1], linha[0])
+
+
+def consultar_pagina(banco, filtro=None, antes=None, depois=None, limite=TAMANHO_PAGINA):
+    """
+    Retorna uma página do histórico, sempre da mais recente para a mais antiga
+    Parâmetros:
+    - filtro: FiltroHistorico opcional
+    - antes: chave (data, id); retorna as linhas mais antigas que ela
+    - depois: chave (data, id); retorna as linhas mais recentes que ela
+    - limite: quantidade máxima de linhas
+    Sem chave, retorna a primeira página (movimentações mais recentes).
+    Linhas: (id, data, produto, tipo, quantidade, usuario, local)
+    """
+    filtro = filtro or FiltroHistorico()
+
+    # Ordenação pelas posições (data, id): vale também para a união com os arquivos
+    if depois is not None:
+        # Busca em ordem crescente a partir da chave e inverte o resultado
+        sql, parametros = _consulta_fontes(banco, filtro, SQL_BASE + "{where}",
+                                           [("(m.data, m.id) > (?, ?)", depois)])
+        linhas = banco.consultar(sql + "ORDER BY 2, 1 LIMIT ?", (*parametros, limite))
+        linhas.reverse()
+        return linhas
+
+    extras = [("(m.data, m.id) < (?, ?)", antes)] if antes is not None else []
+    sql, parametros = _consulta_fontes(banco, filtro, SQL_BASE + "{where}", extras)
+    return banco.consultar(sql + "ORDER BY 2 DESC, 1 DESC LIMIT ?", (*parametros, limite))
+
+
+def contar_movimentacoes(banco, filtro=None):
+    """Retorna o total de movimentações que atendem ao filtro (contado nos índices)"""
+    sql, parametros = _consulta_fontes(banco, filtro or FiltroHistorico(),
+                                       "SELECT COUNT(*) FROM {tabela} m {where}")
+    return sum(linha[0] for linha in banco.consultar(sql, parametros))
+
+
+def gerar_movimentacoes(banco, filtro=None, tamanho_bloco=1000):
+    """
+    Gera todas as movimentações do filtro, da mais antiga para a mais recente
+    Lê em blocos (fetchmany): indicado para relatórios e exportações grandes.
+    Linhas: (id, produto_id, produto, tipo, quantidade, data, usuario, local_id)
+    """
+    sql, parametros = _consulta_fontes(banco, filtro or FiltroHistorico(), '''
+        SELECT m.id, m.produto_id, p.nome, m.tipo, m.quantidade, m.data, m.usuario, m.local_id
+        FROM {tabela} m
+        LEFT JOIN produtos p ON p.id = m.produto_id
+        {where}
+    ''')
+    sql += "ORDER BY 6, 1"
+
+    # Cursor próprio: a leitura pode ser intercalada com outras consultas
+    cursor = banco.conexao().cursor()
+    try:
+        cursor.execute(sql, parametros)
+        while True:
+            bloco = cursor.fetchmany(tamanho_bloco)
+            if not bloco:
+                break
+            yield from bloco
+    finally:
+        cursor.close()
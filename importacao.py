@@ -0,0 +1,346 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import sys
+from collections import OrderedDict, namedtuple
+
+from banco import Banco, CAMINHO_PADRAO, agora_epoch, texto_para_epoch
+from movimentacao import LOCAL_PADRAO, ServicoMovimentacao, ajustar_estoque_local, validar_movimentacao
+
+# ==============================================
+# IMPORTAÇÃO DE PRODUTOS E MOVIMENTAÇÕES
+# ==============================================
+#
+# Os arquivos são lidos linha a linha (gerador), validados e gravados em
+# blocos de TAMANHO_LOTE registros por transação. A memória usada não
+# depende do tamanho do arquivo.
+#
+# Formatos aceitos (opcionalmente compactados com .gz):
+# - CSV com cabeçalho (separador ',' ou ';')
+# - JSON-lines: um objeto JSON por linha (.jsonl, .ndjson, .json)
+#
+# Campos de produtos:       nome, quantidade, quantidade_minima
+# Campos de movimentações:  produto (nome) ou produto_id, tipo, quantidade,
+#                           data (opcional), usuario (opcional), local_id (opcional)
+#
+# As quantidades de produtos são o total: a diferença para o estoque atual é
+# aplicada no local padrão.
+
+TAMANHO_LOTE = 5000
+
+# Quantidade máxima de nomes de produto -> id mantidos em memória
+CACHE_NOMES = 10000
+
+ResumoImportacao = namedtuple("ResumoImportacao", "lidas importadas rejeitadas")
+
+
+class RegistroInvalidoError(ValueError):
+    """A linha do arquivo não pôde ser importada"""
+
+
+# ===== LEITURA DOS ARQUIVOS =====
+def _abrir_texto(caminho):
+    """Abre o arquivo em modo texto (UTF-8), descompactando .gz se necessário"""
+    if caminho.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(caminho, "rb"), encoding="utf-8-sig", newline="")
+    return open(caminho, "r", encoding="utf-8-sig", newline="")
+
+
+def _formato(caminho):
+    """Identifica o formato pelo nome do arquivo: 'csv' ou 'jsonl'"""
+    nome = caminho[:-3] if caminho.endswith(".gz") else caminho
+    return "jsonl" if nome.endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def ler_registros(caminho):
+    """
+    Gera (numero_da_linha, registro) para cada linha do arquivo
+    Linhas JSON malformadas geram (numero_da_linha, RegistroInvalidoError).
+    """
+    with _abrir_texto(caminho) as arquivo:
+        if _formato(caminho) == "jsonl":
+            for numero, linha in enumerate(arquivo, start=1):
+                if not linha.strip():
+                    continue
+                try:
+                    registro = json.loads(linha)
+                    if not isinstance(registro, dict):
+                        raise ValueError("a linha não é um objeto JSON")
+                except ValueError as e:
+                    yield numero, RegistroInvalidoError(f"JSON inválido: {e}")
+                    continue
+                yield numero, registro
+        else:
+            amostra = arquivo.read(4096)
+            arquivo.seek(0)
+            separador = ";" if amostra.count(";") > amostra.count(",") else ","
+            # Linha 1 é o cabeçalho
+            for numero, registro in enumerate(csv.DictReader(arquivo, delimiter=separador), start=2):
+                yield numero, registro
+
+
+def detectar_tipo(caminho):
+    """Retorna 'movimentacoes' se o primeiro registro tiver o campo 'tipo', senão 'produtos'"""
+    for _, registro in ler_registros(caminho):
+        if isinstance(registro, dict):
+            return "movimentacoes" if "tipo" in registro else "produtos"
+    return "produtos"
+
+
+# ===== VALIDAÇÃO =====
+def _texto(registro, campo, obrigatorio=True):
+    valor = registro.get(campo)
+    valor = "" if valor is None else str(valor).strip()
+    if obrigatorio and not valor:
+        raise RegistroInvalidoError(f"Campo obrigatório ausente: {campo}")
+    return valor
+
+
+def _inteiro(registro, campo, obrigatorio=True, padrao=None):
+    valor = _texto(registro, campo, obrigatorio)
+    if not valor:
+        return padrao
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise RegistroInvalidoError(f"Valor inválido para {campo}: {valor}")
+    if numero < 0:
+        raise RegistroInvalidoError(f"{campo} não pode ser negativo")
+    return numero
+
+
+def validar_produto(registro):
+    """Retorna (nome, quantidade ou None, quantidade_minima ou None)"""
+    nome = _texto(registro, "nome")
+    quantidade = _inteiro(registro, "quantidade", obrigatorio=False)
+    quantidade_minima = _inteiro(registro, "quantidade_minima", obrigatorio=False)
+    return nome, quantidade, quantidade_minima
+
+
+def validar_movimentacao_importada(registro, usuario_padrao):
+    """Retorna (produto_id ou None, nome ou None, tipo, quantidade, data, usuario, local_id)"""
+    produto_id = _inteiro(registro, "produto_id", obrigatorio=False)
+    nome = _texto(registro, "produto", obrigatorio=False) or None
+    if produto_id is None and nome is None:
+        raise RegistroInvalidoError("Informe o campo produto (nome) ou produto_id")
+
+    tipo = _texto(registro, "tipo").lower().replace("í", "i")
+    quantidade = _inteiro(registro, "quantidade")
+    validar_movimentacao(tipo, quantidade)
+
+    data_texto = _texto(registro, "data", obrigatorio=False)
+    if not data_texto:
+        data = agora_epoch()
+    elif data_texto.isdigit():
+        data = int(data_texto)
+    else:
+        try:
+            data = texto_para_epoch(data_texto)
+        except ValueError:
+            raise RegistroInvalidoError(f"Data inválida: {data_texto}")
+
+    usuario = _texto(registro, "usuario", obrigatorio=False) or usuario_padrao
+    local_id = _inteiro(registro, "local_id", obrigatorio=False)
+    return produto_id, nome, tipo, quantidade, data, usuario, LOCAL_PADRAO if local_id is None else local_id
+
+
+# ===== GRAVAÇÃO =====
+class Importador:
+    """
+    Importa arquivos de produtos ou movimentações para o banco
+    Parâmetros:
+    - banco: instância de Banco
+    - usuario: usuário gravado nas movimentações sem o campo 'usuario'
+    - tamanho_lote: registros por transação
+    - progresso: função opcional progresso(lidas, importadas, rejeitadas),
+      chamada após cada bloco gravado
+    """
+
+    def __init__(self, banco, usuario, tamanho_lote=TAMANHO_LOTE, progresso=None):
+        self.banco = banco
+        self.usuario = usuario
+        self.tamanho_lote = tamanho_lote
+        self.progresso = progresso
+        self.movimentacoes = ServicoMovimentacao(banco)
+        self._ids_por_nome = OrderedDict()
+
+    def importar(self, caminho, tipo=None, caminho_rejeitados=None):
+        """
+        Importa o arquivo e retorna um ResumoImportacao
+        Parâmetros:
+        - tipo: 'produtos' ou 'movimentacoes' (detectado pelos campos se omitido)
+        - caminho_rejeitados: CSV onde as linhas recusadas são gravadas com o motivo
+        """
+        tipo = tipo or detectar_tipo(caminho)
+        if tipo not in ("produtos", "movimentacoes"):
+            raise ValueError(f"Tipo de importação inválido: {tipo}")
+        gravar_bloco = self._gravar_produtos if tipo == "produtos" else self._gravar_movimentacoes
+
+        arquivo_rejeitados = None
+        escritor = None
+        if caminho_rejeitados:
+            arquivo_rejeitados = open(caminho_rejeitados, "w", encoding="utf-8", newline="")
+            escritor = csv.writer(arquivo_rejeitados)
+            escritor.writerow(["linha", "motivo", "registro"])
+
+        lidas = importadas = rejeitadas = 0
+        try:
+            bloco = []
+            for numero, registro in ler_registros(caminho):
+                lidas += 1
+                bloco.append((numero, registro))
+                if len(bloco) >= self.tamanho_lote:
+                    ok, recusadas = self._gravar(gravar_bloco, bloco, escritor)
+                    importadas += ok
+                    rejeitadas += recusadas
+                    bloco = []
+                    self._informar(lidas, importadas, rejeitadas)
+            if bloco:
+                ok, recusadas = self._gravar(gravar_bloco, bloco, escritor)
+                importadas += ok
+                rejeitadas += recusadas
+            self._informar(lidas, importadas, rejeitadas)
+        finally:
+            if arquivo_rejeitados:
+                arquivo_rejeitados.close()
+
+        return ResumoImportacao(lidas, importadas, rejeitadas)
+
+    def _informar(self, lidas, importadas, rejeitadas):
+        if self.progresso:
+            self.progresso(lidas, importadas, rejeitadas)
+
+    def _gravar(self, gravar_bloco, bloco, escritor):
+        """Grava um bloco em uma transação e registra as linhas recusadas"""
+        # Recusas e novos nomes só são registrados após o COMMIT
+        # (se o banco estiver ocupado, a transação inteira pode ser repetida)
+        ok, recusas, nomes = self.banco.executar_transacao(gravar_bloco, bloco)
+        for nome, produto_id in nomes.items():
+            self._lembrar_nome(nome, produto_id)
+        if escritor:
+            for numero, motivo, registro in recusas:
+                texto = registro if isinstance(registro, str) else json.dumps(registro, ensure_ascii=False)
+                escritor.writerow([numero, motivo, texto])
+        return ok, len(recusas)
+
+    def _gravar_produtos(self, cursor, bloco):
+        """Insere ou atualiza produtos pelo nome; diferenças de quantidade viram movimentações"""
+        data = agora_epoch()
+        ok = 0
+        recusas = []
+        nomes = {}
+        for numero, registro in bloco:
+            try:
+                if isinstance(registro, Exception):
+                    raise registro
+                nome, quantidade, quantidade_minima = validar_produto(registro)
+                cursor.execute("SELECT id, quantidade, excluido_em FROM produtos WHERE nome=?", (nome,))
+                existente = cursor.fetchone()
+                # O nome só fica livre depois que o histórico do produto excluído é removido
+                if existente is not None and existente[2] is not None:
+                    raise RegistroInvalidoError(f"Produto em exclusão: {nome}")
+                if existente is not None:
+                    produto_id, atual, _ = existente
+                    diferenca = 0 if quantidade is None else quantidade - atual
+                    # Primeira gravação da linha: se o local padrão não tiver o suficiente, nada foi gravado
+                    ajustar_estoque_local(cursor, produto_id, LOCAL_PADRAO, diferenca)
+            except ValueError as e:
+                recusas.append((numero, str(e), registro if isinstance(registro, dict) else ""))
+                continue
+
+            if existente is None:
+                # A quantidade chega em produtos pelo gatilho de estoque_local
+                cursor.execute(
+                    "INSERT INTO produtos (nome, quantidade, quantidade_minima) VALUES (?, 0, ?)",
+                    (nome, quantidade_minima or 0)
+                )
+                produto_id, diferenca = cursor.lastrowid, quantidade or 0
+                ajustar_estoque_local(cursor, produto_id, LOCAL_PADRAO, diferenca)
+            elif quantidade_minima is not None:
+                cursor.execute("UPDATE produtos SET quantidade_minima=? WHERE id=?",
+                               (quantidade_minima, produto_id))
+
+            # Mantém o histórico coerente com o estoque
+            if diferenca:
+                cursor.execute(
+                    ServicoMovimentacao.SQL_HISTORICO,
+                    (produto_id, "entrada" if diferenca > 0 else "saida", abs(diferenca), data, self.usuario,
+                     LOCAL_PADRAO, None)
+                )
+            nomes[nome] = produto_id
+            ok += 1
+        return ok, recusas, nomes
+
+    def _gravar_movimentacoes(self, cursor, bloco):
+        """Aplica as movimentações do bloco (saídas sem saldo são recusadas)"""
+        ok = 0
+        recusas = []
+        nomes = {}
+        for numero, registro in bloco:
+            try:
+                if isinstance(registro, Exception):
+                    raise registro
+                produto_id, nome, tipo, quantidade, data, usuario, local_id = \
+                    validar_movimentacao_importada(registro, self.usuario)
+                if produto_id is None:
+                    produto_id = nomes[nome] = self._buscar_id(cursor, nome)
+                self.movimentacoes._aplicar(cursor, produto_id, tipo, quantidade, usuario, data, local_id)
+            except ValueError as e:
+                recusas.append((numero, str(e), registro if isinstance(registro, dict) else ""))
+                continue
+            ok += 1
+        return ok, recusas, nomes
+
+    def _buscar_id(self, cursor, nome):
+        """Resolve o nome do produto para o id (com cache limitado)"""
+        produto_id = self._ids_por_nome.get(nome)
+        if produto_id is not None:
+            self._ids_por_nome.move_to_end(nome)
+            return produto_id
+        cursor.execute("SELECT id FROM produtos WHERE nome=? AND excluido_em IS NULL", (nome,))
+        resultado = cursor.fetchone()
+        if resultado is None:
+            raise RegistroInvalidoError(f"Produto não encontrado: {nome}")
+        return resultado[0]
+
+    def _lembrar_nome(self, nome, produto_id):
+        self._ids_por_nome[nome] = produto_id
+        self._ids_por_nome.move_to_end(nome)
+        if len(self._ids_por_nome) > CACHE_NOMES:
+            self._ids_por_nome.popitem(last=False)
+
+
+# ==============================================
+# LINHA DE COMANDO
+# ==============================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa produtos ou movimentações para o estoque")
+    parser.add_argument("arquivo", help="arquivo CSV ou JSON-lines (pode estar compactado com .gz)")
+    parser.add_argument("--tipo", choices=["produtos", "movimentacoes"],
+                        help="conteúdo do arquivo (detectado pelos campos se omitido)")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    parser.add_argument("--usuario", default="importacao", help="usuário das movimentações sem o campo 'usuario'")
+    parser.add_argument("--rejeitados", help="CSV onde as linhas recusadas serão gravadas")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="registros por transação")
+    args = parser.parse_args(argv)
+
+    def progresso(lidas, importadas, rejeitadas):
+        print(f"\r{lidas} lidas, {importadas} importadas, {rejeitadas} rejeitadas", end="", file=sys.stderr)
+
+    banco = Banco(args.banco)
+    try:
+        importador = Importador(banco, args.usuario, args.lote, progresso)
+        resumo = importador.importar(args.arquivo, args.tipo, args.rejeitados)
+    finally:
+        banco.fechar()
+    print(file=sys.stderr)
+    print(f"Importação concluída: {resumo.importadas} de {resumo.lidas} registros importados, "
+          f"{resumo.rejeitadas} rejeitados")
+    return 0 if resumo.rejeitadas == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,409 @@
+import argparse
+import functools
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# ==============================================
+# INSTRUMENTAÇÃO (TEMPOS DE CONSULTAS, TELAS E TAREFAS)
+# ==============================================
+#
+# Pensada para ficar sempre ligada:
+# - Cada comando SQL é medido por uma fábrica de conexões/cursores do sqlite3
+#   (ConexaoInstrumentada), sem alterar o código que faz as consultas. O tempo
+#   inclui a leitura das linhas (fetch). Comandos iguais com parâmetros
+#   diferentes contam juntos.
+# - Os tempos vão para histogramas de baldes fixos (potências de 2 em µs):
+#   registrar é uma busca binária e um incremento; a memória não cresce com o
+#   número de execuções.
+# - Comandos acima de LIMITE_LENTA_MS são gravados em um arquivo de consultas
+#   lentas com o plano (EXPLAIN QUERY PLAN), no máximo uma vez por comando a
+#   cada INTERVALO_PLANO_S.
+# - Categorias: 'sql' (comandos), 'tela' (abertura das telas, até a janela
+#   ficar ociosa), 'tarefa' (tarefas em segundo plano, espera + execução),
+#   'http' (requisições do servidor) e 'inicio' (tempo até a primeira janela
+#   e até o banco pronto, desde o início do processo).
+
+# Consultas a partir deste tempo vão para o arquivo de consultas lentas
+LIMITE_LENTA_MS = 100
+
+# Intervalo mínimo entre dois planos gravados para o mesmo comando
+INTERVALO_PLANO_S = 10 * 60
+
+# O arquivo de consultas lentas é renomeado para .1 ao passar deste tamanho
+TAMANHO_MAXIMO_LOG = 5 * 1024 * 1024
+
+# Limites superiores dos baldes, em microssegundos (1 µs a ~33 s)
+LIMITES_US = tuple(2 ** i for i in range(26))
+
+# Comprimento máximo do texto de um comando nas métricas
+TAMANHO_MAXIMO_SQL = 300
+
+# Comandos cujo plano pode ser consultado
+_COMANDOS_COM_PLANO = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_ESPACOS = re.compile(r"\s+")
+_LISTA_PARAMETROS = re.compile(r"\?(\s*,\s*\?)+")
+
+
+class Histograma:
+    """Contagem, soma, máximo e distribuição dos tempos (em baldes de LIMITES_US)"""
+
+    __slots__ = ("contagem", "total", "maximo", "baldes")
+
+    def __init__(self):
+        self.contagem = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.baldes = [0] * (len(LIMITES_US) + 1)
+
+    def registrar(self, segundos):
+        self.contagem += 1
+        self.total += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+        self.baldes[bisect_left(LIMITES_US, segundos * 1e6)] += 1
+
+    def percentil(self, p):
+        """Percentil p (0-100) em ms: limite superior do balde (nunca acima do máximo)"""
+        if not self.contagem:
+            return 0.0
+        alvo = self.contagem * p / 100
+        acumulado = 0
+        for indice, quantidade in enumerate(self.baldes):
+            acumulado += quantidade
+            if acumulado >= alvo and quantidade:
+                if indice >= len(LIMITES_US):
+                    break
+                return min(LIMITES_US[indice] / 1000, self.maximo * 1000)
+        return self.maximo * 1000
+
+    def resumo(self):
+        return {
+            "contagem": self.contagem,
+            "total_ms": round(self.total * 1000, 2),
+            "media_ms": round(self.total / self.contagem * 1000, 3) if self.contagem else 0.0,
+            "p50_ms": round(self.percentil(50), 3),
+            "p95_ms": round(self.percentil(95), 3),
+            "p99_ms": round(self.percentil(99), 3),
+            "max_ms": round(self.maximo * 1000, 3),
+        }
+
+
+class Metricas:
+    """
+    Histogramas por (categoria, nome), compartilhados por todas as threads
+    - ativo: False suspende o registro (as medições continuam custando quase nada)
+    """
+
+    def __init__(self):
+        self.ativo = True
+        self.desde = time.time()
+        self._lock = threading.Lock()
+        self._histogramas = {}
+
+    def registrar(self, categoria, nome, segundos):
+        if not self.ativo:
+            return
+        chave = (categoria, nome)
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = Histograma()
+            histograma.registrar(segundos)
+
+    @contextmanager
+    def medir(self, categoria, nome):
+        """Mede o bloco 'with' (registrado mesmo se houver exceção)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(categoria, nome, time.perf_counter() - inicio)
+
+    def resumo(self, categoria=None):
+        """Lista de {categoria, nome, contagem, total_ms, p50_ms...}, maior tempo total primeiro"""
+        with self._lock:
+            itens = [(chave, histograma.resumo()) for chave, histograma in self._histogramas.items()
+                     if categoria is None or chave[0] == categoria]
+        linhas = [{"categoria": c, "nome": n, **resumo} for (c, n), resumo in itens]
+        linhas.sort(key=lambda linha: linha["total_ms"], reverse=True)
+        return linhas
+
+    def zerar(self):
+        with self._lock:
+            self._histogramas.clear()
+            self.desde = time.time()
+
+    def exportar(self, caminho, extras=None):
+        """
+        Grava as métricas em JSON
+        - extras: dicionário com outras estatísticas (cache, tarefas...) incluídas no arquivo
+        """
+        dados = {
+            "gerado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "desde": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.desde)),
+            "metricas": self.resumo(),
+            **(extras or {}),
+        }
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            json.dump(dados, arquivo, indent=2, ensure_ascii=False, default=str)
+        return len(dados["metricas"])
+
+
+# Métricas do processo (usadas por padrão pelo Banco, pela interface e pelo servidor)
+METRICAS = Metricas()
+
+
+@functools.lru_cache(maxsize=2048)
+def normalizar_sql(sql):
+    """Texto do comando usado como nome nas métricas: espaços e listas 'IN (?, ?, ...)' compactados"""
+    texto = _LISTA_PARAMETROS.sub("?, ...", _ESPACOS.sub(" ", sql).strip())
+    if len(texto) > TAMANHO_MAXIMO_SQL:
+        texto = texto[:TAMANHO_MAXIMO_SQL] + "..."
+    return texto
+
+
+def caminho_log_lentas(caminho_banco):
+    """Arquivo de consultas lentas ao lado do banco (estoque.db -> estoque_lentas.log)"""
+    if not caminho_banco or caminho_banco == ":memory:":
+        return None
+    return os.path.splitext(caminho_banco)[0] + "_lentas.log"
+
+
+class RegistroLentas:
+    """
+    Arquivo de consultas lentas
+    Parâmetros:
+    - caminho: arquivo de texto (acrescentado; renomeado para .1 ao passar de TAMANHO_MAXIMO_LOG)
+    - limite_ms: tempo a partir do qual o comando é registrado
+    """
+
+    def __init__(self, caminho, limite_ms=LIMITE_LENTA_MS):
+        self.caminho = caminho
+        self.limite_ms = limite_ms
+        self.registradas = 0
+        self._lock = threading.Lock()
+        self._planos = {}  # comando normalizado -> instante do último plano gravado
+
+    def registrar(self, conexao, sql, parametros, segundos):
+        """Grava o comando (e o plano, se for a hora); parametros None = plano indisponível"""
+        nome = normalizar_sql(sql)
+        agora = time.monotonic()
+        plano = None
+        with self._lock:
+            ultimo = self._planos.get(nome)
+            incluir_plano = ultimo is None or agora - ultimo >= INTERVALO_PLANO_S
+            if incluir_plano:
+                self._planos[nome] = agora
+        if incluir_plano:
+            plano = self._plano(conexao, sql, parametros)
+
+        linhas = [f"{time.strftime('%Y-%m-%d %H:%M:%S')}  {segundos * 1000:.1f} ms  "
+                  f"[{threading.current_thread().name}]  {nome}"]
+        linhas.extend(f"    {linha}" for linha in plano or ())
+        try:
+            with self._lock:
+                self.registradas += 1
+                if os.path.exists(self.caminho) and os.path.getsize(self.caminho) > TAMANHO_MAXIMO_LOG:
+                    os.replace(self.caminho, self.caminho + ".1")
+                with open(self.caminho, "a", encoding="utf-8") as arquivo:
+                    arquivo.write("\n".join(linhas) + "\n")
+        except OSError:
+            pass  # o registro nunca pode interromper a consulta
+
+    @staticmethod
+    def _plano(conexao, sql, parametros):
+        """Linhas do EXPLAIN QUERY PLAN (sem passar pela instrumentação)"""
+        texto = sql.lstrip()
+        if parametros is None or not texto[:7].upper().startswith(_COMANDOS_COM_PLANO):
+            return None
+        try:
+            linhas = sqlite3.Connection.execute(conexao, "EXPLAIN QUERY PLAN " + texto, parametros).fetchall()
+        except sqlite3.Error as e:
+            return [f"(plano indisponível: {e})"]
+        # (id, pai, não usado, detalhe): recuo pela profundidade na árvore
+        profundidade = {0: -1}
+        resultado = []
+        for id_, pai, _, detalhe in linhas:
+            nivel = profundidade.get(pai, -1) + 1
+            profundidade[id_] = nivel
+            resultado.append("  " * nivel + detalhe)
+        return resultado
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """
+    Cursor que mede cada comando: execução + leitura das linhas
+    O tempo é registrado quando o resultado termina de ser lido, no próximo
+    comando do cursor ou quando o cursor é descartado.
+    """
+
+    _sql = None
+    _parametros = None
+    _decorrido = 0.0
+
+    def execute(self, sql, parametros=()):
+        if self._sql is not None:
+            self._finalizar()
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            self._sql, self._parametros = sql, parametros
+            self._decorrido = time.perf_counter() - inicio
+
+    def executemany(self, sql, sequencia):
+        if self._sql is not None:
+            self._finalizar()
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, sequencia)
+        finally:
+            # Sem parâmetros individuais: o plano não é consultado
+            self._sql, self._parametros = sql, None
+            self._decorrido = time.perf_counter() - inicio
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        linha = super().fetchone()
+        self._decorrido += time.perf_counter() - inicio
+        if linha is None and self._sql is not None:
+            self._finalizar()
+        return linha
+
+    def fetchmany(self, *args):
+        inicio = time.perf_counter()
+        linhas = super().fetchmany(*args)
+        self._decorrido += time.perf_counter() - inicio
+        if not linhas and self._sql is not None:
+            self._finalizar()
+        return linhas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        linhas = super().fetchall()
+        self._decorrido += time.perf_counter() - inicio
+        if self._sql is not None:
+            self._finalizar()
+        return linhas
+
+    def close(self):
+        if self._sql is not None:
+            self._finalizar()
+        super().close()
+
+    def __del__(self):
+        if self._sql is not None:
+            self._finalizar()
+
+    def _finalizar(self):
+        sql, self._sql = self._sql, None
+        self.connection.registrar_comando(sql, self._parametros, self._decorrido)
+
+
+class ConexaoInstrumentada(sqlite3.Connection):
+    """
+    Conexão sqlite3 cujos comandos são medidos (use como factory de sqlite3.connect)
+    Após conectar, defina 'metricas' (Metricas) e, opcionalmente, 'lentas' (RegistroLentas).
+    """
+
+    metricas = METRICAS
+    lentas = None
+
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.registrar_comando("COMMIT", None, time.perf_counter() - inicio)
+
+    def registrar_comando(self, sql, parametros, segundos):
+        self.metricas.registrar("sql", normalizar_sql(sql), segundos)
+        lentas = self.lentas
+        if lentas is not None and segundos * 1000 >= lentas.limite_ms:
+            lentas.registrar(self, sql, parametros, segundos)
+
+
+def medir_tela(nome):
+    """
+    Decorador dos métodos que montam as telas da interface
+    Registra ('tela', nome) do início da chamada até a janela ficar ociosa
+    (telas desenhadas); o objeto precisa ter 'root' e 'metricas'.
+    """
+    def decorador(metodo):
+        @functools.wraps(metodo)
+        def envolvido(self, *args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return metodo(self, *args, **kwargs)
+            finally:
+                self.root.after_idle(lambda: self.metricas.registrar("tela", nome, time.perf_counter() - inicio))
+        return envolvido
+    return decorador
+
+
+def formatar_resumo(linhas, limite=None):
+    """Texto em colunas de uma lista de Metricas.resumo()"""
+    saida = [f"{'categoria':8} {'contagem':>9} {'total ms':>11} {'p50':>9} {'p95':>9} {'p99':>9} {'máx':>9}  nome"]
+    for linha in linhas[:limite]:
+        saida.append(f"{linha['categoria']:8} {linha['contagem']:>9} {linha['total_ms']:>11.1f} "
+                     f"{linha['p50_ms']:>9.3f} {linha['p95_ms']:>9.3f} {linha['p99_ms']:>9.3f} "
+                     f"{linha['max_ms']:>9.3f}  {linha['nome']}")
+    return "\n".join(saida)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulta as métricas gravadas pela aplicação")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    resumo = subcomandos.add_parser("resumo", help="mostra um arquivo de métricas (JSON) em colunas")
+    resumo.add_argument("arquivo")
+    resumo.add_argument("--categoria", choices=("sql", "tela", "tarefa", "http", "inicio"))
+    resumo.add_argument("-n", "--limite", type=int, help="número máximo de linhas")
+    lentas = subcomandos.add_parser("lentas", help="últimas consultas lentas registradas")
+    lentas.add_argument("--banco", default="estoque.db", help="banco cujo arquivo de consultas lentas será lido")
+    lentas.add_argument("-n", "--limite", type=int, default=20, help="número de consultas")
+    args = parser.parse_args(argv)
+
+    if args.comando == "resumo":
+        with open(args.arquivo, encoding="utf-8") as arquivo:
+            dados = json.load(arquivo)
+        linhas = [linha for linha in dados["metricas"]
+                  if args.categoria is None or linha["categoria"] == args.categoria]
+        print(f"Métricas de {dados['desde']} a {dados['gerado_em']}", file=sys.stderr)
+        print(formatar_resumo(linhas, args.limite))
+        return 0
+
+    caminho = caminho_log_lentas(args.banco)
+    if not caminho or not os.path.exists(caminho):
+        print("Nenhuma consulta lenta registrada", file=sys.stderr)
+        return 0
+    with open(caminho, encoding="utf-8") as arquivo:
+        registros = []
+        for linha in arquivo:
+            if linha.startswith("    ") and registros:
+                registros[-1].append(linha)
+            else:
+                registros.append([linha])
+    for registro in registros[-args.limite:]:
+        sys.stdout.write("".join(registro))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
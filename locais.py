@@ -0,0 +1,177 @@
+import argparse
+import sqlite3
+import sys
+from collections import namedtuple
+
+from banco import Banco, CAMINHO_PADRAO, epoch_para_texto
+from movimentacao import LocalNaoEncontradoError, ServicoMovimentacao
+
+# ==============================================
+# LOCAIS (DEPÓSITOS) E ESTOQUE POR LOCAL
+# ==============================================
+#
+# O estoque de cada produto é guardado por local em estoque_local, com chave
+# (produto_id, local_id) (migração 10). produtos.quantidade continua sendo o
+# total de todos os locais, mantido pelos gatilhos de estoque_local, então a
+# lista de produtos e os alertas não precisam somar nada.
+#
+# - Estoque de um produto em todos os locais: prefixo da chave primária
+# - Estoque de um local: índice (local_id, quantidade), apenas as linhas com
+#   quantidade > 0 (os locais esvaziados não são lidos)
+# - Transferências: ServicoMovimentacao.transferir() grava a saída na origem
+#   e a entrada no destino na mesma transação
+#
+# O local 1 ('Principal') recebe o estoque que existia antes dos locais e as
+# movimentações que não informam o local.
+
+# Transferências retornadas por padrão em listar_transferencias()
+LIMITE_TRANSFERENCIAS = 100
+
+Local = namedtuple("Local", "id nome")
+
+# Produto com estoque em um local
+EstoqueLocal = namedtuple("EstoqueLocal", "produto_id nome quantidade")
+
+# Estoque de um produto em um local
+EstoqueNoLocal = namedtuple("EstoqueNoLocal", "local_id local quantidade")
+
+# Totais de um local: produtos com estoque e soma das quantidades
+ResumoLocal = namedtuple("ResumoLocal", "local_id nome produtos quantidade")
+
+Transferencia = namedtuple("Transferencia", "id produto_id origem destino quantidade data usuario")
+
+
+class LocalDuplicadoError(ValueError):
+    """Já existe um local com o nome informado"""
+
+
+def listar_locais(banco):
+    """Retorna [Local] em ordem de id"""
+    return [Local(*linha) for linha in banco.consultar("SELECT id, nome FROM locais ORDER BY id")]
+
+
+def criar_local(banco, nome):
+    """Cadastra um local e retorna o id (LocalDuplicadoError se o nome já existe)"""
+    nome = (nome or "").strip()
+    if not nome:
+        raise ValueError("Informe o nome do local!")
+    try:
+        return banco.executar("INSERT INTO locais (nome) VALUES (?)", (nome,)).lastrowid
+    except sqlite3.IntegrityError:
+        raise LocalDuplicadoError("Já existe um local com este nome!") from None
+
+
+def _exigir_local(banco, local_id):
+    if not banco.consultar_um("SELECT 1 FROM locais WHERE id=?", (local_id,)):
+        raise LocalNaoEncontradoError(local_id)
+
+
+def estoque_do_local(banco, local_id):
+    """
+    Retorna [EstoqueLocal] dos produtos com estoque no local, por nome
+    Lança LocalNaoEncontradoError se o local não existe.
+    """
+    _exigir_local(banco, local_id)
+    return [EstoqueLocal(*linha) for linha in banco.consultar('''
+        SELECT e.produto_id, p.nome, e.quantidade
+        FROM estoque_local e
+        JOIN produtos p ON p.id = e.produto_id AND p.excluido_em IS NULL
+        WHERE e.local_id = ? AND e.quantidade > 0
+        ORDER BY p.nome
+    ''', (local_id,))]
+
+
+def estoque_por_local(banco, produto_id):
+    """Retorna [EstoqueNoLocal] do produto, apenas os locais com estoque"""
+    return [EstoqueNoLocal(*linha) for linha in banco.consultar('''
+        SELECT e.local_id, l.nome, e.quantidade
+        FROM estoque_local e
+        JOIN locais l ON l.id = e.local_id
+        WHERE e.produto_id = ? AND e.quantidade <> 0
+        ORDER BY e.local_id
+    ''', (produto_id,))]
+
+
+def resumo_locais(banco):
+    """Retorna [ResumoLocal] de todos os locais (inclusive os vazios)"""
+    return [ResumoLocal(*linha) for linha in banco.consultar('''
+        SELECT l.id, l.nome, COUNT(e.produto_id), COALESCE(SUM(e.quantidade), 0)
+        FROM locais l
+        LEFT JOIN (estoque_local e JOIN produtos p ON p.id = e.produto_id AND p.excluido_em IS NULL)
+               ON e.local_id = l.id AND e.quantidade > 0
+        GROUP BY l.id
+        ORDER BY l.id
+    ''')]
+
+
+def listar_transferencias(banco, produto_id=None, limite=LIMITE_TRANSFERENCIAS):
+    """Retorna [Transferencia], das mais recentes para as mais antigas"""
+    if produto_id is None:
+        linhas = banco.consultar(
+            "SELECT id, produto_id, origem, destino, quantidade, data, usuario "
+            "FROM transferencias ORDER BY id DESC LIMIT ?", (limite,)
+        )
+    else:
+        linhas = banco.consultar(
+            "SELECT id, produto_id, origem, destino, quantidade, data, usuario "
+            "FROM transferencias WHERE produto_id = ? ORDER BY id DESC LIMIT ?", (produto_id, limite)
+        )
+    return [Transferencia(*linha) for linha in linhas]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Locais (depósitos) e estoque por local")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    subcomandos.add_parser("listar", help="lista os locais com o total de produtos e unidades")
+    criar = subcomandos.add_parser("criar", help="cadastra um local")
+    criar.add_argument("nome")
+    estoque = subcomandos.add_parser("estoque", help="estoque de um local")
+    estoque.add_argument("local", type=int, help="id do local")
+    produto = subcomandos.add_parser("produto", help="estoque de um produto em cada local")
+    produto.add_argument("produto", type=int, help="id do produto")
+    transferir = subcomandos.add_parser("transferir", help="transfere estoque entre dois locais")
+    transferir.add_argument("produto", type=int, help="id do produto")
+    transferir.add_argument("origem", type=int, help="id do local de origem")
+    transferir.add_argument("destino", type=int, help="id do local de destino")
+    transferir.add_argument("quantidade", type=int)
+    transferir.add_argument("--usuario", default="admin", help="usuário gravado no histórico")
+    subcomandos.add_parser("transferencias", help="lista as últimas transferências")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    args = parser.parse_args(argv)
+
+    banco = Banco(args.banco)
+    try:
+        banco.inicializar()
+        try:
+            if args.comando == "listar":
+                for resumo in resumo_locais(banco):
+                    print(f"{resumo.local_id}\t{resumo.nome}\t{resumo.produtos} produto(s)\t"
+                          f"{resumo.quantidade} unidade(s)")
+            elif args.comando == "criar":
+                print(criar_local(banco, args.nome))
+            elif args.comando == "estoque":
+                itens = estoque_do_local(banco, args.local)
+                for item in itens:
+                    print(f"{item.produto_id}\t{item.nome}\t{item.quantidade}")
+                print(f"{len(itens)} produto(s) com estoque", file=sys.stderr)
+            elif args.comando == "produto":
+                for item in estoque_por_local(banco, args.produto):
+                    print(f"{item.local_id}\t{item.local}\t{item.quantidade}")
+            elif args.comando == "transferir":
+                transferencia_id = ServicoMovimentacao(banco).transferir(
+                    args.produto, args.origem, args.destino, args.quantidade, args.usuario
+                )
+                print(f"Transferência {transferencia_id} registrada", file=sys.stderr)
+            else:
+                for t in listar_transferencias(banco):
+                    print(f"{t.id}\t{epoch_para_texto(t.data)}\tproduto {t.produto_id}\t"
+                          f"{t.origem} -> {t.destino}\t{t.quantidade}\t{t.usuario}")
+        except ValueError as e:
+            parser.error(str(e))
+    finally:
+        banco.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
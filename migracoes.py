@@ -0,0 +1,550 @@
+import os
+import sqlite3
+
+# ==============================================
+# MIGRAÇÕES DA ESTRUTURA DO BANCO
+# ==============================================
+#
+# Cada migração recebe um cursor já dentro de uma transação e leva o banco
+# da versão anterior para a sua versão. A versão atual fica gravada em
+# PRAGMA user_version, o que permite atualizar bancos existentes no lugar.
+# Novas migrações devem sempre ser adicionadas ao FINAL da lista MIGRACOES.
+
+
+def _v1_tabelas_iniciais(cursor):
+    """Cria as tabelas originais (já existentes em bancos antigos, versão 0)"""
+    # Tabela de usuários (admin/comum)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY,
+            username TEXT UNIQUE,
+            password TEXT,
+            perfil TEXT
+        )
+    ''')
+
+    # Tabela de produtos em estoque
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS produtos (
+            id INTEGER PRIMARY KEY,
+            nome TEXT UNIQUE,
+            quantidade INTEGER,
+            quantidade_minima INTEGER
+        )
+    ''')
+
+    # Tabela de histórico de movimentações
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS movimentacoes (
+            id INTEGER PRIMARY KEY,
+            produto_id INTEGER,
+            tipo TEXT,
+            quantidade INTEGER,
+            data TEXT,
+            usuario TEXT,
+            FOREIGN KEY (produto_id) REFERENCES produtos(id)
+        )
+    ''')
+
+
+def _v2_data_epoch_e_indices(cursor):
+    """
+    Converte movimentacoes.data de texto ('AAAA-MM-DD HH:MM:SS', hora local)
+    para inteiro (segundos desde 1970, UTC) e cria os índices de histórico
+    - (produto_id, data): exclusão e histórico por produto
+    - (data): histórico geral ordenado por data
+    """
+    # O SQLite não altera o tipo de uma coluna: a tabela é recriada
+    cursor.execute('''
+        CREATE TABLE movimentacoes_nova (
+            id INTEGER PRIMARY KEY,
+            produto_id INTEGER,
+            tipo TEXT,
+            quantidade INTEGER,
+            data INTEGER,
+            usuario TEXT,
+            FOREIGN KEY (produto_id) REFERENCES produtos(id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO movimentacoes_nova (id, produto_id, tipo, quantidade, data, usuario)
+        SELECT id, produto_id, tipo, quantidade,
+               CASE WHEN typeof(data) = 'text'
+                    THEN CAST(strftime('%s', data, 'utc') AS INTEGER)
+                    ELSE data END,
+               usuario
+        FROM movimentacoes
+    ''')
+    cursor.execute("DROP TABLE movimentacoes")
+    cursor.execute("ALTER TABLE movimentacoes_nova RENAME TO movimentacoes")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_movimentacoes_produto_data ON movimentacoes (produto_id, data)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_movimentacoes_data ON movimentacoes (data)")
+
+
+def _v3_indice_usuario(cursor):
+    """Índice (usuario, data) para o filtro por usuário do histórico"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_movimentacoes_usuario_data ON movimentacoes (usuario, data)")
+
+
+def _v4_versao_produtos(cursor):
+    """
+    Contador de alterações dos produtos (atualização incremental da lista)
+    - controle_versao: contador global, incrementado a cada alteração
+    - produtos.versao: valor do contador na última alteração do produto
+    - produtos_removidos: produtos excluídos e a versão da exclusão
+    Mantidos por gatilhos, valem para qualquer processo que altere o banco.
+    """
+    cursor.execute("ALTER TABLE produtos ADD COLUMN versao INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_versao ON produtos (versao)")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS controle_versao (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            versao INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO controle_versao (id, versao) VALUES (1, 0)")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS produtos_removidos (
+            produto_id INTEGER PRIMARY KEY,
+            versao INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_removidos_versao ON produtos_removidos (versao)")
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_versao_insert AFTER INSERT ON produtos
+        BEGIN
+            UPDATE controle_versao SET versao = versao + 1 WHERE id = 1;
+            UPDATE produtos SET versao = (SELECT versao FROM controle_versao WHERE id = 1) WHERE id = NEW.id;
+            DELETE FROM produtos_removidos WHERE produto_id = NEW.id;
+        END
+    ''')
+    # Apenas as colunas exibidas: a própria atualização de 'versao' não dispara o gatilho
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_versao_update
+        AFTER UPDATE OF nome, quantidade, quantidade_minima ON produtos
+        BEGIN
+            UPDATE controle_versao SET versao = versao + 1 WHERE id = 1;
+            UPDATE produtos SET versao = (SELECT versao FROM controle_versao WHERE id = 1) WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_versao_delete AFTER DELETE ON produtos
+        BEGIN
+            UPDATE controle_versao SET versao = versao + 1 WHERE id = 1;
+            INSERT OR REPLACE INTO produtos_removidos (produto_id, versao)
+            VALUES (OLD.id, (SELECT versao FROM controle_versao WHERE id = 1));
+        END
+    ''')
+
+
+def _v5_indice_estoque_baixo(cursor):
+    """
+    Índice parcial com apenas os produtos abaixo do mínimo (alertas)
+    O SQLite o mantém a cada movimentação e a cada alteração do mínimo, e a
+    consulta dos alertas percorre só as suas entradas, não o catálogo inteiro.
+    Ordenado pela falta (quantidade - quantidade_minima): mais críticos primeiro.
+    """
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_produtos_estoque_baixo
+        ON produtos (quantidade - quantidade_minima, nome)
+        WHERE quantidade < quantidade_minima
+    ''')
+
+
+def _v6_snapshots(cursor):
+    """
+    Retratos periódicos do estoque (consulta do estoque em uma data passada)
+    - snapshots: momento de cada retrato (epoch); o retrato contém o efeito
+      de todas as movimentações com data anterior a ele
+    - snapshots_estoque: quantidade de cada produto no retrato (zeros omitidos)
+    Uma movimentação gravada com data anterior a um retrato já existente
+    (importação retroativa) corrige os retratos posteriores pelo gatilho.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY,
+            data INTEGER NOT NULL UNIQUE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshots_estoque (
+            snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+            produto_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (snapshot_id, produto_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_estoque_produto ON snapshots_estoque (produto_id, snapshot_id)")
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_movimentacoes_snapshots AFTER INSERT ON movimentacoes
+        WHEN EXISTS (SELECT 1 FROM snapshots WHERE data > NEW.data)
+        BEGIN
+            INSERT INTO snapshots_estoque (snapshot_id, produto_id, quantidade)
+            SELECT id, NEW.produto_id,
+                   CASE NEW.tipo WHEN 'entrada' THEN NEW.quantidade ELSE -NEW.quantidade END
+            FROM snapshots WHERE data > NEW.data
+            ON CONFLICT (snapshot_id, produto_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_snapshots_delete AFTER DELETE ON produtos
+        BEGIN
+            DELETE FROM snapshots_estoque WHERE produto_id = OLD.id;
+        END
+    ''')
+
+
+# Dia e mês (hora local) de uma movimentação, usados pelos totais de consumo
+SQL_DIA = "date({data}, 'unixepoch', 'localtime')"
+SQL_MES = "strftime('%Y-%m', {data}, 'unixepoch', 'localtime')"
+
+
+def _gatilho_consumo(condicao):
+    """Comando que cria o gatilho dos totais de consumo para as movimentações que atendem a condição"""
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS trg_movimentacoes_consumo AFTER INSERT ON movimentacoes
+        WHEN {condicao}
+        BEGIN
+            INSERT INTO consumo_diario (produto_id, dia, entradas, saidas)
+            VALUES (NEW.produto_id, {SQL_DIA.format(data="NEW.data")},
+                    CASE NEW.tipo WHEN 'entrada' THEN NEW.quantidade ELSE 0 END,
+                    CASE NEW.tipo WHEN 'saida' THEN NEW.quantidade ELSE 0 END)
+            ON CONFLICT (produto_id, dia) DO UPDATE
+            SET entradas = entradas + excluded.entradas, saidas = saidas + excluded.saidas;
+
+            INSERT INTO consumo_mensal (produto_id, mes, entradas, saidas)
+            VALUES (NEW.produto_id, {SQL_MES.format(data="NEW.data")},
+                    CASE NEW.tipo WHEN 'entrada' THEN NEW.quantidade ELSE 0 END,
+                    CASE NEW.tipo WHEN 'saida' THEN NEW.quantidade ELSE 0 END)
+            ON CONFLICT (produto_id, mes) DO UPDATE
+            SET entradas = entradas + excluded.entradas, saidas = saidas + excluded.saidas;
+        END
+    '''
+
+
+def _v7_totais_consumo(cursor):
+    """
+    Totais de entradas e saídas por produto e dia/mês (relatórios de consumo)
+    - consumo_diario: (produto_id, dia 'AAAA-MM-DD')
+    - consumo_mensal: (produto_id, mes 'AAAA-MM')
+    Mantidos por gatilho a cada movimentação gravada e preenchidos aqui com o
+    histórico existente (relatorios.reconstruir_totais refaz em blocos).
+    """
+    for tabela, coluna in (("consumo_diario", "dia"), ("consumo_mensal", "mes")):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                produto_id INTEGER NOT NULL,
+                {coluna} TEXT NOT NULL,
+                entradas INTEGER NOT NULL DEFAULT 0,
+                saidas INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (produto_id, {coluna})
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_{coluna} ON {tabela} ({coluna})")
+
+    cursor.execute(_gatilho_consumo("NEW.produto_id IS NOT NULL AND NEW.data IS NOT NULL"))
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_consumo_delete AFTER DELETE ON produtos
+        BEGIN
+            DELETE FROM consumo_diario WHERE produto_id = OLD.id;
+            DELETE FROM consumo_mensal WHERE produto_id = OLD.id;
+        END
+    ''')
+
+    # Histórico já existente
+    for tabela, coluna, expressao in (("consumo_diario", "dia", SQL_DIA), ("consumo_mensal", "mes", SQL_MES)):
+        cursor.execute(f'''
+            INSERT INTO {tabela} (produto_id, {coluna}, entradas, saidas)
+            SELECT produto_id, {expressao.format(data="data")},
+                   SUM(CASE tipo WHEN 'entrada' THEN quantidade ELSE 0 END),
+                   SUM(CASE tipo WHEN 'saida' THEN quantidade ELSE 0 END)
+            FROM movimentacoes WHERE produto_id IS NOT NULL AND data IS NOT NULL
+            GROUP BY 1, 2
+        ''')
+
+
+def _v8_arquivamento(cursor):
+    """
+    Controle do arquivamento do histórico (arquivamento.py)
+    - arquivos_historico: um banco de arquivo por ano ('estoque_2025.db', na
+      pasta do banco) e o número de movimentações movidas para ele
+    - controle_arquivamento: arquivado_ate (epoch); as movimentações com data
+      anterior estão nos arquivos (exceto as gravadas depois com data retroativa,
+      que continuam aqui até o próximo arquivamento)
+    - saldos_abertura: entradas - saídas das movimentações arquivadas de cada
+      produto; com as movimentações restantes, reproduz produtos.quantidade
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS arquivos_historico (
+            ano INTEGER PRIMARY KEY,
+            arquivo TEXT NOT NULL,
+            movimentacoes INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS controle_arquivamento (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            arquivado_ate INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO controle_arquivamento (id, arquivado_ate) VALUES (1, 0)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS saldos_abertura (
+            produto_id INTEGER PRIMARY KEY,
+            quantidade INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_saldos_abertura_delete AFTER DELETE ON produtos
+        BEGIN
+            DELETE FROM saldos_abertura WHERE produto_id = OLD.id;
+        END
+    ''')
+
+
+def _v9_exclusao_logica(cursor):
+    """
+    Exclusão lógica de produtos (exclusao.py)
+    - produtos.excluido_em: momento da exclusão (epoch); NULL = produto ativo.
+      O produto some das listas na hora e o histórico é apagado depois, em
+      blocos, por uma tarefa em segundo plano que remove a linha no final
+    - idx_produtos_excluidos: apenas os produtos aguardando a remoção
+    - idx_produtos_estoque_baixo passa a ignorar os produtos excluídos
+    - a exclusão lógica conta como remoção para o contador de alterações
+    """
+    cursor.execute("ALTER TABLE produtos ADD COLUMN excluido_em INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_excluidos ON produtos (id) WHERE excluido_em IS NOT NULL")
+
+    cursor.execute("DROP INDEX IF EXISTS idx_produtos_estoque_baixo")
+    cursor.execute('''
+        CREATE INDEX idx_produtos_estoque_baixo
+        ON produtos (quantidade - quantidade_minima, nome)
+        WHERE quantidade < quantidade_minima AND excluido_em IS NULL
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_versao_exclusao
+        AFTER UPDATE OF excluido_em ON produtos
+        WHEN NEW.excluido_em IS NOT NULL AND OLD.excluido_em IS NULL
+        BEGIN
+            UPDATE controle_versao SET versao = versao + 1 WHERE id = 1;
+            INSERT OR REPLACE INTO produtos_removidos (produto_id, versao)
+            VALUES (OLD.id, (SELECT versao FROM controle_versao WHERE id = 1));
+        END
+    ''')
+
+
+def _v10_locais(cursor):
+    """
+    Estoque por local (depósitos)
+    - locais: depósitos cadastrados; o local 1 (LOCAL_PADRAO) recebe o estoque
+      existente e as movimentações sem local informado
+    - estoque_local: quantidade de cada produto em cada local, chave
+      (produto_id, local_id); idx_estoque_local_local (local_id, quantidade)
+      cobre as consultas de um local sem ler a tabela
+    - produtos.quantidade passa a ser o total de todos os locais, mantido pelos
+      gatilhos de estoque_local (o índice de alertas continua valendo)
+    - movimentacoes.local_id: local da movimentação (as antigas ficam no local 1)
+    - transferencias: cada transferência grava uma saída na origem e uma
+      entrada no destino com o mesmo transferencia_id; elas não contam nos
+      totais de consumo
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS locais (
+            id INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL UNIQUE
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO locais (id, nome) VALUES (1, 'Principal')")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS estoque_local (
+            produto_id INTEGER NOT NULL,
+            local_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (produto_id, local_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_estoque_local_local ON estoque_local (local_id, quantidade)")
+
+    # Estoque existente no local padrão (antes dos gatilhos, que somariam de novo)
+    cursor.execute("UPDATE produtos SET quantidade = 0 WHERE quantidade IS NULL")
+    cursor.execute('''
+        INSERT OR IGNORE INTO estoque_local (produto_id, local_id, quantidade)
+        SELECT id, 1, quantidade FROM produtos WHERE quantidade <> 0
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_estoque_local_insert AFTER INSERT ON estoque_local
+        BEGIN
+            UPDATE produtos SET quantidade = quantidade + NEW.quantidade WHERE id = NEW.produto_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_estoque_local_update AFTER UPDATE OF quantidade ON estoque_local
+        WHEN NEW.quantidade <> OLD.quantidade
+        BEGIN
+            UPDATE produtos SET quantidade = quantidade + NEW.quantidade - OLD.quantidade WHERE id = NEW.produto_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_estoque_local_delete AFTER DELETE ON estoque_local
+        BEGIN
+            UPDATE produtos SET quantidade = quantidade - OLD.quantidade WHERE id = OLD.produto_id;
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transferencias (
+            id INTEGER PRIMARY KEY,
+            produto_id INTEGER NOT NULL,
+            origem INTEGER NOT NULL,
+            destino INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            data INTEGER NOT NULL,
+            usuario TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transferencias_produto ON transferencias (produto_id)")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_estoque_local_delete AFTER DELETE ON produtos
+        BEGIN
+            DELETE FROM estoque_local WHERE produto_id = OLD.id;
+            DELETE FROM transferencias WHERE produto_id = OLD.id;
+        END
+    ''')
+
+    # Valor padrão: as linhas existentes não são regravadas
+    cursor.execute("ALTER TABLE movimentacoes ADD COLUMN local_id INTEGER NOT NULL DEFAULT 1")
+    cursor.execute("ALTER TABLE movimentacoes ADD COLUMN transferencia_id INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_movimentacoes_local_data ON movimentacoes (local_id, data)")
+
+    cursor.execute("DROP TRIGGER IF EXISTS trg_movimentacoes_consumo")
+    cursor.execute(_gatilho_consumo(
+        "NEW.produto_id IS NOT NULL AND NEW.data IS NOT NULL AND NEW.transferencia_id IS NULL"
+    ))
+
+
+def _maior_id_arquivado(cursor):
+    """Maior id de movimentação nos arquivos anuais (0 se não houver arquivos)"""
+    caminho = next((linha[2] for linha in cursor.execute("PRAGMA database_list").fetchall()
+                    if linha[1] == "main"), "")
+    if not caminho:
+        return 0  # banco em memória: sem arquivos
+    pasta = os.path.dirname(caminho)
+    maior = 0
+    for (nome,) in cursor.execute("SELECT arquivo FROM arquivos_historico").fetchall():
+        arquivo = os.path.join(pasta, nome)
+        if not os.path.exists(arquivo):
+            continue
+        conn = sqlite3.connect(f"file:{arquivo}?mode=ro", uri=True)
+        try:
+            maior = max(maior, conn.execute("SELECT MAX(id) FROM movimentacoes").fetchone()[0] or 0)
+        except sqlite3.OperationalError:
+            pass  # arquivo criado sem a tabela (arquivamento interrompido)
+        finally:
+            conn.close()
+    return maior
+
+
+def _v11_ids_sem_reuso(cursor):
+    """
+    movimentacoes.id passa a ser AUTOINCREMENT
+    Sem ele o SQLite reaproveita os ids acima do maior id presente na tabela:
+    depois que a movimentação de maior id fosse arquivada ou apagada (exclusão
+    de produtos), ids que já estão nos arquivos voltariam a ser usados
+    (linhas repetidas nas consultas que juntam os arquivos e cópias
+    descartadas pelo INSERT OR IGNORE do arquivamento).
+    O contador (sqlite_sequence) começa no maior id do banco e dos arquivos.
+    """
+    # O SQLite não acrescenta AUTOINCREMENT a uma tabela: ela é recriada com
+    # os mesmos índices e gatilhos
+    objetos = [linha[0] for linha in cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'movimentacoes' AND type IN ('index', 'trigger') "
+        "AND sql IS NOT NULL"
+    ).fetchall()]
+    cursor.execute('''
+        CREATE TABLE movimentacoes_nova (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER,
+            tipo TEXT,
+            quantidade INTEGER,
+            data INTEGER,
+            usuario TEXT,
+            local_id INTEGER NOT NULL DEFAULT 1,
+            transferencia_id INTEGER,
+            FOREIGN KEY (produto_id) REFERENCES produtos(id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO movimentacoes_nova (id, produto_id, tipo, quantidade, data, usuario, local_id, transferencia_id)
+        SELECT id, produto_id, tipo, quantidade, data, usuario, local_id, transferencia_id FROM movimentacoes
+    ''')
+    cursor.execute("DROP TABLE movimentacoes")
+    cursor.execute("ALTER TABLE movimentacoes_nova RENAME TO movimentacoes")
+    for sql in objetos:
+        cursor.execute(sql)
+
+    maior = max(cursor.execute("SELECT COALESCE(MAX(id), 0) FROM movimentacoes").fetchone()[0],
+                _maior_id_arquivado(cursor))
+    cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'movimentacoes'")
+    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('movimentacoes', ?)", (maior,))
+
+
+# Lista ordenada de migrações: (versão, função)
+MIGRACOES = [
+    (1, _v1_tabelas_iniciais),
+    (2, _v2_data_epoch_e_indices),
+    (3, _v3_indice_usuario),
+    (4, _v4_versao_produtos),
+    (5, _v5_indice_estoque_baixo),
+    (6, _v6_snapshots),
+    (7, _v7_totais_consumo),
+    (8, _v8_arquivamento),
+    (9, _v9_exclusao_logica),
+    (10, _v10_locais),
+    (11, _v11_ids_sem_reuso),
+]
+
+VERSAO_ATUAL = MIGRACOES[-1][0]
+
+
+def versao_banco(conn):
+    """Retorna a versão da estrutura gravada no banco"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migracoes(conn):
+    """
+    Aplica as migrações pendentes, cada uma em sua própria transação
+    Usa BEGIN IMMEDIATE para que dois terminais iniciando ao mesmo tempo
+    não executem a mesma migração duas vezes.
+    Retorna a lista de versões aplicadas.
+    """
+    # Caso comum (banco já atualizado): uma única leitura de PRAGMA
+    if versao_banco(conn) >= VERSAO_ATUAL:
+        return []
+
+    aplicadas = []
+    for versao, migracao in MIGRACOES:
+        if versao_banco(conn) >= versao:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Outro processo pode ter migrado enquanto aguardávamos o bloqueio
+            if versao_banco(conn) < versao:
+                migracao(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {versao}")
+                aplicadas.append(versao)
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+    return aplicadas
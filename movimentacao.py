@@ -0,0 +1,339 @@
+from collections import namedtuple
+from contextlib import contextmanager
+
+from banco import agora_epoch
+
+# ==============================================
+# MOVIMENTAÇÃO DE ESTOQUE (SEM INTERFACE GRÁFICA)
+# ==============================================
+
+TIPOS_MOVIMENTACAO = ("entrada", "saida")
+
+# Local das movimentações sem local informado (criado pela migração 10)
+LOCAL_PADRAO = 1
+
+# Limite de parâmetros por consulta "IN (...)" (SQLITE_MAX_VARIABLE_NUMBER)
+TAMANHO_BLOCO_IN = 500
+
+# Resultado de cada linha de um lote
+# - linha: posição na lista enviada (começando em 1)
+# - ok: se a linha é válida/foi aplicada
+# - mensagem: motivo da falha (ou "OK")
+# - saldo: estoque total do produto (todos os locais) após a linha (None se a linha falhou)
+ResultadoLote = namedtuple("ResultadoLote", "linha produto_id tipo quantidade ok mensagem saldo")
+
+
+class ProdutoNaoEncontradoError(ValueError):
+    """O produto informado não existe no banco"""
+
+
+class LocalNaoEncontradoError(ValueError):
+    """O local informado não existe no banco"""
+
+    def __init__(self, local_id):
+        super().__init__(f"Local {local_id} não encontrado!")
+        self.local_id = local_id
+
+
+class EstoqueInsuficienteError(ValueError):
+    """
+    A saída pedida é maior que o estoque disponível no local
+    - disponivel: estoque do produto no local
+    - total: estoque do produto em todos os locais (None se não foi lido)
+    """
+
+    def __init__(self, produto_id, disponivel, total=None):
+        super().__init__(f"Estoque insuficiente! Disponível: {disponivel}")
+        self.produto_id = produto_id
+        self.disponivel = disponivel
+        self.total = total
+
+
+class LoteInvalidoError(ValueError):
+    """Uma ou mais linhas do lote são inválidas; nada foi gravado"""
+
+    def __init__(self, resultados):
+        falhas = [r for r in resultados if not r.ok]
+        super().__init__(f"{len(falhas)} linha(s) inválida(s) no lote. Nenhuma movimentação foi gravada.")
+        self.resultados = resultados
+        self.falhas = falhas
+
+
+def validar_movimentacao(tipo, quantidade):
+    """Valida o tipo e a quantidade de uma movimentação (lança ValueError)"""
+    if tipo not in TIPOS_MOVIMENTACAO:
+        raise ValueError(f"Tipo de movimentação inválido: {tipo}")
+    if not isinstance(quantidade, int) or isinstance(quantidade, bool) or quantidade <= 0:
+        raise ValueError("A quantidade deve ser maior que zero!")
+
+
+# Soma uma diferença ao estoque de um produto em um local (cria a linha se preciso)
+SQL_AJUSTE_LOCAL = '''
+    INSERT INTO estoque_local (produto_id, local_id, quantidade) VALUES (?, ?, ?)
+    ON CONFLICT (produto_id, local_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+'''
+
+
+def ajustar_estoque_local(cursor, produto_id, local_id, diferenca):
+    """
+    Soma 'diferenca' ao estoque do produto no local, na transação do cursor
+    O total em produtos.quantidade acompanha pelos gatilhos de estoque_local.
+    Usada nas alterações de quantidade fora de registrar() (cadastro, edição e
+    importação de produtos, que gravam a movimentação à parte). Lança EstoqueInsuficienteError
+    se o estoque do local ficaria negativo.
+    """
+    if diferenca > 0:
+        cursor.execute(SQL_AJUSTE_LOCAL, (produto_id, local_id, diferenca))
+    elif diferenca < 0:
+        cursor.execute(
+            "UPDATE estoque_local SET quantidade = quantidade + ? "
+            "WHERE produto_id=? AND local_id=? AND quantidade + ? >= 0",
+            (diferenca, produto_id, local_id, diferenca)
+        )
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT quantidade FROM estoque_local WHERE produto_id=? AND local_id=?",
+                           (produto_id, local_id))
+            atual = cursor.fetchone()
+            raise EstoqueInsuficienteError(produto_id, atual[0] if atual else 0)
+
+
+class ServicoMovimentacao:
+    """
+    Aplica entradas, saídas e transferências de estoque de forma atômica
+    - O estoque de cada local (estoque_local) é alterado por diferença
+      (quantidade = quantidade ± n), nunca sobrescrito com um valor calculado
+      fora do banco; o total do produto acompanha pelos gatilhos
+    - A saída só é aplicada se houver saldo no local (WHERE quantidade >= n),
+      então dois terminais simultâneos não conseguem vender o mesmo item duas vezes
+    - A atualização do estoque e o registro no histórico ficam na mesma
+      transação BEGIN IMMEDIATE
+    - Se houver um CacheProdutos, o novo total é gravado nele após o commit
+    """
+
+    # Comandos fixos: reaproveitados pelo cache de comandos preparados da conexão
+    SQL_TOTAL = "SELECT quantidade FROM produtos WHERE id=? AND excluido_em IS NULL"
+    SQL_ENTRADA = (
+        "INSERT INTO estoque_local (produto_id, local_id, quantidade) SELECT ?, id, ? FROM locais WHERE id=? "
+        "ON CONFLICT (produto_id, local_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade"
+    )
+    SQL_SAIDA = ("UPDATE estoque_local SET quantidade = quantidade - ? "
+                 "WHERE produto_id=? AND local_id=? AND quantidade >= ?")
+    SQL_HISTORICO = ("INSERT INTO movimentacoes (produto_id, tipo, quantidade, data, usuario, local_id, "
+                     "transferencia_id) VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+    def __init__(self, banco, cache=None):
+        self.banco = banco
+        self.cache = cache
+
+    def registrar(self, produto_id, tipo, quantidade, usuario, local_id=LOCAL_PADRAO):
+        """
+        Registra uma movimentação no local e retorna o novo estoque total do produto
+        Lança:
+        - ValueError: tipo ou quantidade inválidos
+        - ProdutoNaoEncontradoError: produto inexistente
+        - LocalNaoEncontradoError: local inexistente
+        - EstoqueInsuficienteError: saída maior que o estoque do local
+        """
+        validar_movimentacao(tipo, quantidade)
+        with self._corrigir_cache(produto_id):
+            saldo = self.banco.executar_transacao(
+                self._aplicar, produto_id, tipo, quantidade, usuario, agora_epoch(), local_id
+            )
+        if self.cache is not None:
+            self.cache.atualizar_quantidade(produto_id, saldo)
+        return saldo
+
+    @contextmanager
+    def _corrigir_cache(self, produto_id):
+        """Corrige o cache com o que os erros da transação informam sobre o produto"""
+        try:
+            yield
+        except EstoqueInsuficienteError as e:
+            # O total informado pelo erro foi lido na transação
+            if self.cache is not None and e.total is not None:
+                self.cache.atualizar_quantidade(produto_id, e.total)
+            raise
+        except ProdutoNaoEncontradoError:
+            if self.cache is not None:
+                self.cache.remover(produto_id)
+            raise
+
+    def _aplicar(self, cursor, produto_id, tipo, quantidade, usuario, data, local_id=LOCAL_PADRAO,
+                 transferencia_id=None):
+        """
+        Aplica a movimentação usando o cursor de uma transação já aberta
+        Nada é gravado se a movimentação for recusada. Retorna o novo total do produto.
+        """
+        # O total também confirma que o produto existe (e não foi excluído)
+        cursor.execute(self.SQL_TOTAL, (produto_id,))
+        total = cursor.fetchone()
+        if total is None:
+            raise ProdutoNaoEncontradoError(f"Produto {produto_id} não encontrado!")
+
+        if tipo == "entrada":
+            cursor.execute(self.SQL_ENTRADA, (produto_id, quantidade, local_id))
+            if cursor.rowcount == 0:
+                raise LocalNaoEncontradoError(local_id)
+            novo_total = total[0] + quantidade
+        else:
+            cursor.execute(self.SQL_SAIDA, (quantidade, produto_id, local_id, quantidade))
+            if cursor.rowcount == 0:
+                # Nenhuma linha alterada: local inexistente ou saldo insuficiente no local
+                cursor.execute("SELECT quantidade FROM estoque_local WHERE produto_id=? AND local_id=?",
+                               (produto_id, local_id))
+                atual = cursor.fetchone()
+                if atual is None:
+                    cursor.execute("SELECT 1 FROM locais WHERE id=?", (local_id,))
+                    if cursor.fetchone() is None:
+                        raise LocalNaoEncontradoError(local_id)
+                raise EstoqueInsuficienteError(produto_id, atual[0] if atual else 0, total[0])
+            novo_total = total[0] - quantidade
+
+        cursor.execute(self.SQL_HISTORICO, (produto_id, tipo, quantidade, data, usuario, local_id, transferencia_id))
+        return novo_total
+
+    def transferir(self, produto_id, origem, destino, quantidade, usuario):
+        """
+        Transfere estoque entre dois locais e retorna o id da transferência
+        A saída na origem e a entrada no destino são gravadas na mesma
+        transação (as duas ou nenhuma), com o mesmo transferencia_id; o total
+        do produto não muda. Lança os mesmos erros de registrar().
+        """
+        validar_movimentacao("saida", quantidade)
+        if origem == destino:
+            raise ValueError("A origem e o destino devem ser diferentes!")
+        with self._corrigir_cache(produto_id):
+            return self.banco.executar_transacao(
+                self._transferir, produto_id, origem, destino, quantidade, usuario, agora_epoch()
+            )
+
+    def _transferir(self, cursor, produto_id, origem, destino, quantidade, usuario, data):
+        cursor.execute(
+            "INSERT INTO transferencias (produto_id, origem, destino, quantidade, data, usuario) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (produto_id, origem, destino, quantidade, data, usuario)
+        )
+        transferencia_id = cursor.lastrowid
+        # Em caso de erro, a transação inteira é desfeita (inclusive a transferência)
+        self._aplicar(cursor, produto_id, "saida", quantidade, usuario, data, origem, transferencia_id)
+        self._aplicar(cursor, produto_id, "entrada", quantidade, usuario, data, destino, transferencia_id)
+        return transferencia_id
+
+    def registrar_varias(self, itens):
+        """
+        Registra movimentações independentes (de vários usuários) em uma única transação
+        Diferente de registrar_lote(), cada item é aceito ou recusado sozinho.
+        Parâmetros:
+        - itens: lista de tuplas (produto_id, tipo, quantidade, usuario, local_id)
+        Retorna uma lista, na ordem dos itens, com o novo total de cada item
+        aplicado ou a exceção (ValueError) que o recusou.
+        """
+        itens = list(itens)
+        resultados = self.banco.executar_transacao(self._aplicar_varias, itens, agora_epoch())
+        if self.cache is not None:
+            for (produto_id, _, _, _, _), resultado in zip(itens, resultados):
+                if isinstance(resultado, EstoqueInsuficienteError):
+                    if resultado.total is not None:
+                        self.cache.atualizar_quantidade(produto_id, resultado.total)
+                elif isinstance(resultado, ProdutoNaoEncontradoError):
+                    self.cache.remover(produto_id)
+                elif not isinstance(resultado, Exception):
+                    self.cache.atualizar_quantidade(produto_id, resultado)
+        return resultados
+
+    def _aplicar_varias(self, cursor, itens, data):
+        """Aplica cada item com o cursor de uma transação já aberta (um item recusado não grava nada)"""
+        resultados = []
+        for produto_id, tipo, quantidade, usuario, local_id in itens:
+            try:
+                validar_movimentacao(tipo, quantidade)
+                resultados.append(self._aplicar(cursor, produto_id, tipo, quantidade, usuario, data, local_id))
+            except ValueError as e:
+                resultados.append(e)
+        return resultados
+
+    def registrar_lote(self, itens, usuario, local_id=LOCAL_PADRAO):
+        """
+        Registra várias movimentações em uma única transação (tudo ou nada)
+        Parâmetros:
+        - itens: lista de tuplas (produto_id, tipo, quantidade)
+        - usuario: usuário responsável pelo lote
+        - local_id: local de todas as linhas do lote
+        Retorna a lista de ResultadoLote (uma por linha, na mesma ordem).
+        Lança LoteInvalidoError (com os resultados por linha) se qualquer
+        linha for inválida ou deixar o estoque negativo.
+        """
+        itens = list(itens)
+        if not itens:
+            raise ValueError("O lote está vazio!")
+        resultados = self.banco.executar_transacao(self._aplicar_lote, itens, usuario, agora_epoch(), local_id)
+        if self.cache is not None:
+            # O saldo de cada linha é o acumulado: a última linha do produto prevalece
+            for resultado in resultados:
+                self.cache.atualizar_quantidade(resultado.produto_id, resultado.saldo)
+        return resultados
+
+    def _aplicar_lote(self, cursor, itens, usuario, data, local_id):
+        """Valida e aplica o lote com o cursor de uma transação já aberta"""
+        cursor.execute("SELECT 1 FROM locais WHERE id=?", (local_id,))
+        if cursor.fetchone() is None:
+            raise LocalNaoEncontradoError(local_id)
+
+        # Estoque atual de todos os produtos do lote (lido com a escrita já reservada):
+        # o total valida a existência do produto e o do local valida as saídas
+        ids = {produto_id for produto_id, _, _ in itens if isinstance(produto_id, int)}
+        totais = self._carregar_saldos(cursor, ids)
+        saldos = self._carregar_saldos(cursor, totais, local_id)
+
+        # Simula as linhas em ordem, acumulando a diferença por produto
+        resultados = []
+        diferencas = {}
+        for linha, (produto_id, tipo, quantidade) in enumerate(itens, start=1):
+            try:
+                validar_movimentacao(tipo, quantidade)
+                if produto_id not in totais:
+                    raise ProdutoNaoEncontradoError(f"Produto {produto_id} não encontrado!")
+                delta = quantidade if tipo == "entrada" else -quantidade
+                saldo_local = saldos.get(produto_id, 0)
+                if saldo_local + delta < 0:
+                    raise EstoqueInsuficienteError(produto_id, saldo_local, totais[produto_id])
+            except ValueError as e:
+                resultados.append(ResultadoLote(linha, produto_id, tipo, quantidade, False, str(e), None))
+                continue
+            saldos[produto_id] = saldo_local + delta
+            totais[produto_id] += delta
+            diferencas[produto_id] = diferencas.get(produto_id, 0) + delta
+            resultados.append(ResultadoLote(linha, produto_id, tipo, quantidade, True, "OK", totais[produto_id]))
+
+        if any(not r.ok for r in resultados):
+            raise LoteInvalidoError(resultados)
+
+        # Uma atualização por produto e todas as linhas do histórico de uma vez
+        cursor.executemany(
+            SQL_AJUSTE_LOCAL,
+            [(produto_id, local_id, delta) for produto_id, delta in diferencas.items() if delta]
+        )
+        cursor.executemany(
+            self.SQL_HISTORICO,
+            [(produto_id, tipo, quantidade, data, usuario, local_id, None) for produto_id, tipo, quantidade in itens]
+        )
+        return resultados
+
+    def _carregar_saldos(self, cursor, ids, local_id=None):
+        """
+        Retorna {produto_id: quantidade} consultando os ids em blocos
+        Sem local_id, o total de cada produto; com local_id, o estoque no local
+        (produtos sem estoque no local ficam de fora).
+        """
+        ids = list(ids)
+        saldos = {}
+        for inicio in range(0, len(ids), TAMANHO_BLOCO_IN):
+            bloco = ids[inicio:inicio + TAMANHO_BLOCO_IN]
+            marcadores = ",".join("?" * len(bloco))
+            if local_id is None:
+                cursor.execute(f"SELECT id, quantidade FROM produtos WHERE id IN ({marcadores}) AND excluido_em IS NULL", bloco)
+            else:
+                cursor.execute(f"SELECT produto_id, quantidade FROM estoque_local "
+                               f"WHERE local_id = ? AND produto_id IN ({marcadores})", [local_id] + bloco)
+            saldos.update(cursor.fetchall())
+        return saldos
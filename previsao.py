@@ -0,0 +1,251 @@
+import argparse
+import itertools
+import math
+import sys
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from statistics import NormalDist
+
+import numpy as np
+
+from banco import Banco, CAMINHO_PADRAO
+
+# ==============================================
+# PREVISÃO DE DEMANDA E PONTO DE REPOSIÇÃO
+# ==============================================
+#
+# Requer numpy (opcional: a interface importa este módulo apenas ao calcular).
+#
+# As saídas diárias de todos os produtos vêm de uma única consulta à tabela
+# de totais consumo_diario (migração 7) e viram arrays. Médias móveis,
+# variância e ponto de reposição são calculados para o catálogo inteiro de
+# uma vez (np.bincount por produto), sem laços em Python por produto e sem
+# montar uma matriz produtos x dias.
+#
+# Para cada produto, a série começa no primeiro dia com movimentação dentro
+# do histórico (produtos novos não têm a média diluída por dias anteriores ao
+# cadastro); dias sem saída contam como demanda zero. Produtos sem nenhuma
+# movimentação no histórico não recebem sugestão (o mínimo atual é mantido).
+#
+# Ponto de reposição = demanda diária x prazo de entrega
+#                      + z(nível de serviço) x desvio diário x raiz(prazo)
+
+# Dias de histórico considerados
+DIAS_HISTORICO = 730
+
+# Janelas das médias móveis calculadas (dias)
+JANELAS_MEDIA = (7, 28, 90)
+
+# Janela da média usada como demanda prevista e janela da variância
+JANELA_DEMANDA = 28
+JANELA_VARIANCIA = 90
+
+PRAZO_ENTREGA_DIAS = 7
+NIVEL_SERVICO = 0.95
+
+# Sugestão de um produto
+# - demanda_diaria/desvio_diario: média e desvio padrão das saídas por dia
+Sugestao = namedtuple("Sugestao", "produto_id minimo_atual minimo_sugerido demanda_diaria desvio_diario")
+
+
+class PrevisaoEstoque:
+    """
+    Resultado de calcular_previsoes(): arrays numpy alinhados por produto
+    (produto_ids em ordem crescente)
+    - medias: {janela em dias: média móvel das saídas diárias}
+    - desvio: desvio padrão diário (JANELA_VARIANCIA)
+    - ponto_reposicao: valor calculado; sugestao: arredondado para cima
+    - com_serie: produtos com movimentação no histórico (os demais não têm sugestão)
+    """
+
+    def __init__(self, produto_ids, minimos_atuais, medias, desvio, ponto_reposicao, com_serie,
+                 prazo_entrega, nivel_servico, hoje):
+        self.produto_ids = produto_ids
+        self.minimos_atuais = minimos_atuais
+        self.medias = medias
+        self.desvio = desvio
+        self.ponto_reposicao = ponto_reposicao
+        self.sugestao = np.ceil(ponto_reposicao).astype(np.int64)
+        self.com_serie = com_serie
+        self.prazo_entrega = prazo_entrega
+        self.nivel_servico = nivel_servico
+        self.hoje = hoje
+        self.calculado_em = time.time()
+
+    def __len__(self):
+        return len(self.produto_ids)
+
+    def _posicao(self, produto_id):
+        posicao = int(np.searchsorted(self.produto_ids, produto_id))
+        if posicao < len(self.produto_ids) and self.produto_ids[posicao] == produto_id:
+            return posicao
+        return None
+
+    def _sugestao(self, posicao):
+        return Sugestao(int(self.produto_ids[posicao]), int(self.minimos_atuais[posicao]),
+                        int(self.sugestao[posicao]), float(self.medias[JANELA_DEMANDA][posicao]),
+                        float(self.desvio[posicao]))
+
+    def sugestao_produto(self, produto_id):
+        """
+        Retorna a Sugestao de um produto
+        None se o produto não estava no cálculo ou não tem movimentações no histórico.
+        """
+        posicao = self._posicao(produto_id)
+        if posicao is None or not self.com_serie[posicao]:
+            return None
+        return self._sugestao(posicao)
+
+    def divergentes(self, tolerancia=0):
+        """
+        Sugestões cujo mínimo sugerido difere do atual em mais que 'tolerancia', maiores diferenças primeiro
+        Produtos sem movimentações no histórico ficam de fora (sem dados, a sugestão seria zero).
+        """
+        diferenca = np.abs(self.sugestao - self.minimos_atuais)
+        posicoes = np.flatnonzero((diferenca > tolerancia) & self.com_serie)
+        posicoes = posicoes[np.argsort(-diferenca[posicoes], kind="stable")]
+        return [self._sugestao(p) for p in posicoes]
+
+
+def fator_seguranca(nivel_servico):
+    """Valor z da normal padrão para o nível de serviço (0.95 -> 1.645)"""
+    if not 0 < nivel_servico < 1:
+        raise ValueError("O nível de serviço deve estar entre 0 e 1")
+    return NormalDist().inv_cdf(nivel_servico)
+
+
+def consultar_series(banco, dias_historico=DIAS_HISTORICO, hoje=None):
+    """
+    Lê as movimentações diárias do histórico em uma única consulta
+    Retorna (produto_ids, minimos_atuais, indices, dias, saidas):
+    - produto_ids/minimos_atuais: todos os produtos, por id
+    - indices: posição do produto em produto_ids de cada linha
+    - dias: dia da linha (0 = primeiro dia do histórico, dias_historico - 1 = hoje)
+    - saidas: saídas do produto no dia
+    """
+    hoje = hoje or date.today()
+    inicio = hoje - timedelta(days=dias_historico - 1)
+
+    with banco.transacao(imediata=False) as cursor:
+        cursor.execute("SELECT id, COALESCE(quantidade_minima, 0) FROM produtos "
+                       "WHERE excluido_em IS NULL ORDER BY id")
+        produtos = cursor.fetchall()
+        # O histórico costuma cobrir quase toda a tabela: '+dia' evita o índice
+        # por dia e faz uma leitura sequencial (bem mais rápida nesse caso)
+        cursor.execute('''
+            SELECT produto_id, CAST(julianday(dia) - julianday(?) AS INTEGER), saidas
+            FROM consumo_diario
+            WHERE +dia >= ? AND +dia <= ?
+        ''', (inicio.isoformat(), inicio.isoformat(), hoje.isoformat()))
+        linhas = cursor.fetchall()
+
+    total = len(produtos)
+    valores = np.fromiter(itertools.chain.from_iterable(produtos), dtype=np.int64, count=2 * total)
+    produto_ids, minimos = valores[0::2], valores[1::2]
+
+    valores = np.fromiter(itertools.chain.from_iterable(linhas), dtype=np.int64, count=3 * len(linhas))
+    ids, dias, saidas = valores[0::3], valores[1::3], valores[2::3]
+
+    # Linhas de produtos excluídos (ou removidos após a consulta dos produtos) são descartadas
+    indices = np.searchsorted(produto_ids, ids)
+    validas = indices < total
+    validas[validas] = produto_ids[indices[validas]] == ids[validas]
+    return produto_ids, minimos, indices[validas], dias[validas], saidas[validas]
+
+
+def calcular_previsoes(banco, prazo_entrega=PRAZO_ENTREGA_DIAS, nivel_servico=NIVEL_SERVICO,
+                       dias_historico=DIAS_HISTORICO, hoje=None):
+    """
+    Calcula médias móveis, desvio e ponto de reposição de todos os produtos
+    Parâmetros:
+    - prazo_entrega: dias entre o pedido e a chegada da mercadoria
+    - nivel_servico: probabilidade desejada de não faltar estoque durante o prazo
+    - dias_historico: dias de histórico lidos
+    - hoje: data final do histórico (padrão: hoje)
+    Retorna PrevisaoEstoque.
+    """
+    z = fator_seguranca(nivel_servico)
+    hoje = hoje or date.today()
+    produto_ids, minimos, indices, dias, saidas = consultar_series(banco, dias_historico, hoje)
+    total = len(produto_ids)
+    saidas = saidas.astype(np.float64)
+
+    # Primeiro dia com movimentação de cada produto
+    primeiro_dia = np.full(total, dias_historico, dtype=np.int64)
+    np.minimum.at(primeiro_dia, indices, dias)
+
+    def janela(tamanho, pesos):
+        """(soma dos pesos por produto nos últimos 'tamanho' dias, dias da série na janela)"""
+        inicio = dias_historico - tamanho
+        na_janela = dias >= inicio
+        soma = np.bincount(indices[na_janela], weights=pesos[na_janela], minlength=total)
+        quantidade = dias_historico - np.maximum(primeiro_dia, inicio)
+        return soma, quantidade
+
+    def media(soma, quantidade):
+        return np.divide(soma, quantidade, out=np.zeros(total), where=quantidade > 0)
+
+    medias = {}
+    for tamanho in sorted(set(JANELAS_MEDIA) | {JANELA_DEMANDA}):
+        medias[tamanho] = media(*janela(tamanho, saidas))
+
+    # Variância amostral das saídas diárias (dias sem saída contam como zero)
+    soma, quantidade = janela(JANELA_VARIANCIA, saidas)
+    soma_quadrados, _ = janela(JANELA_VARIANCIA, saidas * saidas)
+    media_variancia = media(soma, quantidade)
+    variancia = np.divide(soma_quadrados - quantidade * media_variancia ** 2, quantidade - 1,
+                          out=np.zeros(total), where=quantidade > 1)
+    desvio = np.sqrt(np.maximum(variancia, 0))
+
+    demanda = medias[JANELA_DEMANDA]
+    ponto = demanda * prazo_entrega + z * desvio * math.sqrt(prazo_entrega)
+    return PrevisaoEstoque(produto_ids, minimos, medias, desvio, ponto, primeiro_dia < dias_historico,
+                           prazo_entrega, nivel_servico, hoje)
+
+
+def aplicar_sugestoes(banco, sugestoes):
+    """Grava o mínimo sugerido de cada Sugestao como quantidade_minima; retorna a quantidade gravada"""
+    with banco.transacao() as cursor:
+        cursor.executemany("UPDATE produtos SET quantidade_minima=? WHERE id=?",
+                           [(s.minimo_sugerido, s.produto_id) for s in sugestoes])
+    return len(sugestoes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sugere estoques mínimos a partir do consumo")
+    parser.add_argument("--prazo", type=float, default=PRAZO_ENTREGA_DIAS, help="prazo de entrega em dias")
+    parser.add_argument("--nivel", type=float, default=NIVEL_SERVICO, help="nível de serviço (0 a 1)")
+    parser.add_argument("--dias", type=int, default=DIAS_HISTORICO, help="dias de histórico")
+    parser.add_argument("--tolerancia", type=int, default=0,
+                        help="lista apenas diferenças maiores que este valor")
+    parser.add_argument("-n", "--limite", type=int, help="número máximo de produtos listados")
+    parser.add_argument("--aplicar", action="store_true", help="grava os mínimos sugeridos listados")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    args = parser.parse_args(argv)
+
+    banco = Banco(args.banco)
+    try:
+        banco.inicializar()
+        inicio = time.perf_counter()
+        try:
+            previsao = calcular_previsoes(banco, args.prazo, args.nivel, args.dias)
+        except ValueError as e:
+            parser.error(str(e))
+        duracao = time.perf_counter() - inicio
+
+        sugestoes = previsao.divergentes(args.tolerancia)[:args.limite]
+        for s in sugestoes:
+            print(f"{s.produto_id}\tmínimo {s.minimo_atual} -> {s.minimo_sugerido}\t"
+                  f"demanda {s.demanda_diaria:.2f}/dia\tdesvio {s.desvio_diario:.2f}")
+        print(f"{len(previsao)} produtos calculados em {duracao * 1000:.0f} ms; "
+              f"{len(sugestoes)} sugestões", file=sys.stderr)
+        if args.aplicar and sugestoes:
+            print(f"{aplicar_sugestoes(banco, sugestoes)} mínimos atualizados", file=sys.stderr)
+    finally:
+        banco.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+# ==============================================
+# CONSULTAS DE PRODUTOS
+# ==============================================
+
+
+def consultar_alteracoes(banco, desde=None):
+    """
+    Retorna os produtos alterados desde uma versão do contador de alterações
+    Parâmetros:
+    - desde: versão retornada pela consulta anterior (None = todos os produtos)
+    Retorna (versao_atual, alterados, removidos, completo):
+    - alterados: [(id, nome, quantidade, quantidade_minima)] incluídos ou alterados
+    - removidos: [id] dos produtos excluídos (inclusive os que aguardam a remoção do histórico)
+    - completo: True se a lista de alterados contém todos os produtos
+    """
+    # Leitura consistente: contador e linhas vêm do mesmo instante do banco
+    with banco.transacao(imediata=False) as cursor:
+        cursor.execute("SELECT versao FROM controle_versao WHERE id = 1")
+        versao = cursor.fetchone()[0]
+
+        # Banco substituído ou contador reiniciado: recarrega tudo
+        if desde is None or desde > versao:
+            cursor.execute("SELECT id, nome, quantidade, quantidade_minima FROM produtos "
+                           "WHERE excluido_em IS NULL ORDER BY nome")
+            return versao, cursor.fetchall(), [], True
+
+        cursor.execute(
+            "SELECT id, nome, quantidade, quantidade_minima FROM produtos "
+            "WHERE versao > ? AND excluido_em IS NULL", (desde,)
+        )
+        alterados = cursor.fetchall()
+        cursor.execute("SELECT produto_id FROM produtos_removidos WHERE versao > ?", (desde,))
+        removidos = [linha[0] for linha in cursor.fetchall()]
+    return versao, alterados, removidos, False
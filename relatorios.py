@@ -0,0 +1,293 @@
+import argparse
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from banco import Banco, CAMINHO_PADRAO
+from migracoes import SQL_DIA, SQL_MES
+import arquivamento
+
+# ==============================================
+# RELATÓRIOS DE CONSUMO
+# ==============================================
+#
+# Os relatórios leem as tabelas de totais consumo_diario e consumo_mensal
+# (migração 7), atualizadas por gatilho a cada movimentação gravada, e nunca
+# agrupam a tabela movimentacoes:
+# - por dia: consumo_diario
+# - por semana (segunda a domingo): consumo_diario agrupado (até 7 linhas)
+# - por mês: consumo_mensal
+# - total do período: meses completos em consumo_mensal e os dias das pontas
+#   em consumo_diario
+#
+# Consumo = saídas - entradas. Os dias e meses seguem a hora local do
+# computador que gravou a movimentação.
+# reconstruir_totais() recalcula as tabelas a partir do histórico, em blocos,
+# e troca o conteúdo de uma só vez no final.
+
+PERIODOS = ("dia", "semana", "mes")
+
+# Máximo de linhas retornadas por padrão (a tela exibe as mais recentes)
+LIMITE_LINHAS = 5000
+
+TAMANHO_BLOCO_RECONSTRUCAO = 50000
+
+# Tabelas de totais: (tabela, coluna do período, expressão da data)
+TOTAIS = (("consumo_diario", "dia", SQL_DIA), ("consumo_mensal", "mes", SQL_MES))
+
+# Linha do relatório; periodo: 'AAAA-MM-DD' (dia ou segunda-feira da semana) ou 'AAAA-MM'
+LinhaConsumo = namedtuple("LinhaConsumo", "periodo produto_id produto entradas saidas consumo")
+
+# Expressão do período de cada linha de consumo_diario
+_EXPRESSAO_PERIODO = {
+    "dia": "c.dia",
+    "semana": "date(c.dia, 'weekday 0', '-6 days')",
+}
+
+
+def validar_data(texto):
+    """Converte 'AAAA-MM-DD' em date (lança ValueError se inválida)"""
+    return datetime.strptime(texto.strip(), "%Y-%m-%d").date()
+
+
+def consultar_consumo(banco, periodo="dia", de=None, ate=None, produto_id=None, limite=LIMITE_LINHAS):
+    """
+    Consumo por produto e período, do período mais recente para o mais antigo
+    Parâmetros:
+    - periodo: 'dia', 'semana' ou 'mes'
+    - de/ate: datas 'AAAA-MM-DD' inclusivas (opcionais); por mês valem os meses inteiros
+    - produto_id: id do produto (opcional)
+    - limite: quantidade máxima de linhas (None = todas)
+    Retorna [LinhaConsumo]. Lança ValueError se o período ou as datas forem inválidos.
+    """
+    if periodo not in PERIODOS:
+        raise ValueError(f"Período inválido: {periodo}")
+    inicio = validar_data(de).isoformat() if de else None
+    fim = validar_data(ate).isoformat() if ate else None
+
+    if periodo == "mes":
+        tabela, coluna, expressao = "consumo_mensal", "mes", "c.mes"
+        inicio, fim = inicio and inicio[:7], fim and fim[:7]
+    else:
+        tabela, coluna, expressao = "consumo_diario", "dia", _EXPRESSAO_PERIODO[periodo]
+
+    # Produtos excluídos somem do relatório antes de os totais serem removidos
+    condicoes = ["p.excluido_em IS NULL"]
+    parametros = []
+    if produto_id is not None:
+        condicoes.append("c.produto_id = ?")
+        parametros.append(produto_id)
+    if inicio:
+        condicoes.append(f"c.{coluna} >= ?")
+        parametros.append(inicio)
+    if fim:
+        condicoes.append(f"c.{coluna} <= ?")
+        parametros.append(fim)
+    where = "WHERE " + " AND ".join(condicoes)
+
+    sql = f'''
+        SELECT {expressao} AS periodo, c.produto_id, p.nome,
+               SUM(c.entradas), SUM(c.saidas), SUM(c.saidas) - SUM(c.entradas) AS consumo
+        FROM {tabela} c
+        LEFT JOIN produtos p ON p.id = c.produto_id
+        {where}
+        GROUP BY periodo, c.produto_id
+        ORDER BY periodo DESC, consumo DESC
+    '''
+    if limite is not None:
+        sql += " LIMIT ?"
+        parametros.append(limite)
+    return [LinhaConsumo(*linha) for linha in banco.consultar(sql, parametros)]
+
+
+def _dividir_intervalo(inicio, fim):
+    """
+    Divide [inicio, fim] (datas inclusivas) em meses completos e dias avulsos
+    Retorna (primeiro_mes, ultimo_mes, [(dia_de, dia_ate)]) com os meses em
+    'AAAA-MM' (None se não houver mês completo) e os dias em 'AAAA-MM-DD'.
+    """
+    primeiro = inicio if inicio.day == 1 else (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    depois_do_fim = fim + timedelta(days=1)
+    ultimo_inicio = depois_do_fim.replace(day=1)  # início do mês após o último mês completo
+    if primeiro >= ultimo_inicio:
+        return None, None, [(inicio.isoformat(), fim.isoformat())]
+
+    dias = []
+    if inicio < primeiro:
+        dias.append((inicio.isoformat(), (primeiro - timedelta(days=1)).isoformat()))
+    if ultimo_inicio <= fim:
+        dias.append((ultimo_inicio.isoformat(), fim.isoformat()))
+    ultimo_mes = (ultimo_inicio - timedelta(days=1)).strftime("%Y-%m")
+    return primeiro.strftime("%Y-%m"), ultimo_mes, dias
+
+
+def consumo_total(banco, de, ate, produto_id=None, limite=None):
+    """
+    Consumo de cada produto no período [de, ate] (datas 'AAAA-MM-DD'), do maior para o menor
+    Usa os totais mensais para os meses completos e os diários apenas nas pontas.
+    Retorna [LinhaConsumo] com periodo = 'de a ate'.
+    """
+    inicio, fim = validar_data(de), validar_data(ate)
+    if inicio > fim:
+        raise ValueError("A data inicial é posterior à final")
+    primeiro_mes, ultimo_mes, dias = _dividir_intervalo(inicio, fim)
+
+    filtro_produto = " AND produto_id = ?" if produto_id is not None else ""
+    extra = (produto_id,) if produto_id is not None else ()
+    partes = []
+    parametros = []
+    if primeiro_mes:
+        partes.append("SELECT produto_id, entradas, saidas FROM consumo_mensal "
+                      "WHERE mes BETWEEN ? AND ?" + filtro_produto)
+        parametros += [primeiro_mes, ultimo_mes, *extra]
+    for dia_de, dia_ate in dias:
+        partes.append("SELECT produto_id, entradas, saidas FROM consumo_diario "
+                      "WHERE dia BETWEEN ? AND ?" + filtro_produto)
+        parametros += [dia_de, dia_ate, *extra]
+
+    sql = f'''
+        SELECT t.produto_id, p.nome, SUM(t.entradas), SUM(t.saidas),
+               SUM(t.saidas) - SUM(t.entradas) AS consumo
+        FROM ({" UNION ALL ".join(partes)}) t
+        LEFT JOIN produtos p ON p.id = t.produto_id
+        WHERE p.excluido_em IS NULL
+        GROUP BY t.produto_id
+        ORDER BY consumo DESC, p.nome
+    '''
+    if limite is not None:
+        sql += " LIMIT ?"
+        parametros.append(limite)
+    periodo = f"{inicio.isoformat()} a {fim.isoformat()}"
+    return [LinhaConsumo(periodo, *linha) for linha in banco.consultar(sql, parametros)]
+
+
+def _somar_em(cursor, tabela, extras, inicio, fim):
+    """Soma as movimentações com inicio < id <= fim de 'tabela' nos totais temporários; retorna quantas leu"""
+    condicoes = "".join(f" AND {sql}" for sql, _ in extras)
+    parametros = (inicio, fim, *[valor for _, params in extras for valor in params])
+    for destino, coluna, expressao in TOTAIS:
+        cursor.execute(f'''
+            INSERT INTO temp.novo_{destino} (produto_id, {coluna}, entradas, saidas)
+            SELECT m.produto_id, {expressao.format(data="m.data")},
+                   SUM(CASE m.tipo WHEN 'entrada' THEN m.quantidade ELSE 0 END),
+                   SUM(CASE m.tipo WHEN 'saida' THEN m.quantidade ELSE 0 END)
+            FROM {tabela} m
+            WHERE m.id > ? AND m.id <= ? AND m.produto_id IS NOT NULL AND m.data IS NOT NULL
+                  AND m.transferencia_id IS NULL{condicoes}
+            GROUP BY 1, 2
+            ON CONFLICT (produto_id, {coluna}) DO UPDATE
+            SET entradas = entradas + excluded.entradas, saidas = saidas + excluded.saidas
+        ''', parametros)
+    cursor.execute(f"SELECT COUNT(*) FROM {tabela} m WHERE m.id > ? AND m.id <= ?{condicoes}", parametros)
+    return cursor.fetchone()[0]
+
+
+def reconstruir_totais(banco, tamanho_bloco=TAMANHO_BLOCO_RECONSTRUCAO, progresso=None):
+    """
+    Recalcula consumo_diario e consumo_mensal a partir de movimentacoes e dos
+    arquivos do histórico (arquivamento.py)
+    Os totais novos são montados em tabelas temporárias (só desta conexão),
+    lendo as movimentações em blocos de ids, cada bloco em sua própria
+    transação. No final, uma única transação soma as movimentações gravadas
+    nesse meio tempo e troca o conteúdo das tabelas: até lá os relatórios
+    continuam lendo os totais antigos, completos, e nunca veem as tabelas
+    vazias ou pela metade. Não deve rodar junto com o arquivamento (um bloco
+    movido durante a reconstrução poderia ser contado duas vezes ou nenhuma).
+    Parâmetros:
+    - progresso: função opcional chamada com (id processado, último id) de cada tabela
+    Retorna o número de movimentações processadas.
+    """
+    fontes = arquivamento.fontes_movimentacoes(banco, todos=True)
+    for destino, coluna, _ in TOTAIS:
+        banco.executar(f"DROP TABLE IF EXISTS temp.novo_{destino}")
+        banco.executar(f'''
+            CREATE TEMP TABLE novo_{destino} (
+                produto_id INTEGER NOT NULL,
+                {coluna} TEXT NOT NULL,
+                entradas INTEGER NOT NULL,
+                saidas INTEGER NOT NULL,
+                PRIMARY KEY (produto_id, {coluna})
+            ) WITHOUT ROWID
+        ''')
+    try:
+        with banco.transacao(imediata=False) as cursor:
+            ultimos_ids = []
+            for tabela, _ in fontes:
+                cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabela}")
+                ultimos_ids.append(cursor.fetchone()[0])
+
+        # Só as tabelas temporárias são gravadas: os blocos não bloqueiam os terminais
+        total = 0
+        for (tabela, extras), ultimo_id in zip(fontes, ultimos_ids):
+            for inicio in range(0, ultimo_id, tamanho_bloco):
+                fim = min(inicio + tamanho_bloco, ultimo_id)
+                with banco.transacao(imediata=False) as cursor:
+                    total += _somar_em(cursor, tabela, extras, inicio, fim)
+                if progresso:
+                    progresso(fim, ultimo_id)
+
+        # Troca: as movimentações gravadas durante a reconstrução (ids novos,
+        # só no banco principal) entram antes, na mesma transação
+        (tabela, extras), ultimo_id = fontes[0], ultimos_ids[0]
+        with banco.transacao() as cursor:
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabela}")
+            total += _somar_em(cursor, tabela, extras, ultimo_id, cursor.fetchone()[0])
+            for destino, coluna, _ in TOTAIS:
+                cursor.execute(f"DELETE FROM {destino}")
+                # Produtos removidos durante a reconstrução não voltam
+                cursor.execute(f'''
+                    INSERT INTO {destino} (produto_id, {coluna}, entradas, saidas)
+                    SELECT produto_id, {coluna}, entradas, saidas FROM temp.novo_{destino}
+                    WHERE produto_id IN (SELECT id FROM produtos)
+                ''')
+    finally:
+        for destino, _, _ in TOTAIS:
+            banco.executar(f"DROP TABLE IF EXISTS temp.novo_{destino}")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatórios de consumo por produto")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    consumo = subcomandos.add_parser("consumo", help="consumo por dia, semana ou mês")
+    consumo.add_argument("--periodo", choices=PERIODOS, default="dia")
+    consumo.add_argument("--de", help="data inicial (AAAA-MM-DD)")
+    consumo.add_argument("--ate", help="data final (AAAA-MM-DD, inclusiva)")
+    consumo.add_argument("--produto", type=int, help="id do produto")
+    consumo.add_argument("-n", "--limite", type=int, help="número máximo de linhas")
+    total = subcomandos.add_parser("total", help="consumo de cada produto em um período")
+    total.add_argument("de", help="data inicial (AAAA-MM-DD)")
+    total.add_argument("ate", help="data final (AAAA-MM-DD, inclusiva)")
+    total.add_argument("--produto", type=int, help="id do produto")
+    total.add_argument("-n", "--limite", type=int, help="número máximo de linhas")
+    reconstruir = subcomandos.add_parser("reconstruir", help="recalcula os totais a partir do histórico")
+    reconstruir.add_argument("--bloco", type=int, default=TAMANHO_BLOCO_RECONSTRUCAO)
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    args = parser.parse_args(argv)
+
+    banco = Banco(args.banco)
+    try:
+        banco.inicializar()
+        if args.comando == "reconstruir":
+            def progresso(atual, ultimo):
+                print(f"{atual}/{ultimo}", file=sys.stderr)
+
+            processadas = reconstruir_totais(banco, args.bloco, progresso)
+            print(f"{processadas} movimentações processadas", file=sys.stderr)
+            return 0
+        try:
+            if args.comando == "consumo":
+                linhas = consultar_consumo(banco, args.periodo, args.de, args.ate, args.produto, args.limite)
+            else:
+                linhas = consumo_total(banco, args.de, args.ate, args.produto, args.limite)
+        except ValueError as e:
+            parser.error(str(e))
+    finally:
+        banco.fechar()
+    for linha in linhas:
+        print("\t".join(str(valor) for valor in linha))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+import sqlite3
+
+from autenticacao import Autenticador, CUSTO_BCRYPT
+from banco import agora_epoch
+from cache import RegistroProduto, SQL_PRODUTO
+from movimentacao import LOCAL_PADRAO, ServicoMovimentacao, ProdutoNaoEncontradoError, ajustar_estoque_local
+import alertas
+import exclusao
+import historico
+import locais
+import produtos
+
+# ==============================================
+# SERVIÇO DE ESTOQUE (SEM INTERFACE GRÁFICA)
+# ==============================================
+#
+# Operações de produtos, movimentações, usuários e consultas usadas pela
+# interface Tkinter e pelo servidor HTTP (servidor.py). Nada aqui depende de
+# widgets ou de messagebox: os erros de validação são ValueError (com a
+# mensagem a exibir) e os demais erros do banco são propagados.
+
+PERFIS = ("Administrador", "Comum")
+
+
+class ProdutoDuplicadoError(ValueError):
+    """Já existe um produto com o nome informado"""
+
+    def __init__(self, mensagem="Já existe um produto com este nome!"):
+        super().__init__(mensagem)
+
+
+class ProdutoEmExclusaoError(ProdutoDuplicadoError):
+    """O nome pertence a um produto excluído cujo histórico ainda está sendo removido"""
+
+    def __init__(self):
+        super().__init__("Este nome pertence a um produto em exclusão; tente novamente em instantes.")
+
+
+class UsuarioDuplicadoError(ValueError):
+    """Já existe um usuário com o nome informado"""
+
+    def __init__(self):
+        super().__init__("Nome de usuário já existe!")
+
+
+class PermissaoNegadaError(ValueError):
+    """A operação exige o perfil de administrador"""
+
+    def __init__(self):
+        super().__init__("Operação permitida apenas para administradores!")
+
+
+def criar_usuario_padrao(banco, custo=CUSTO_BCRYPT):
+    """
+    Cria o usuário admin padrão se não existir
+    Login: admin
+    Senha: admin123 (criptografada com o custo de bcrypt informado)
+    Retorna True se o usuário foi criado.
+    """
+    # Consulta barata primeiro: o bcrypt só roda na primeira execução
+    if banco.consultar_um("SELECT 1 FROM usuarios WHERE username='admin'"):
+        return False
+
+    import bcrypt  # carregado apenas quando necessário
+
+    # Usa INSERT OR IGNORE para evitar duplicação (outro terminal pode ter criado antes)
+    cursor = banco.executar(
+        "INSERT OR IGNORE INTO usuarios (username, password, perfil) VALUES (?, ?, ?)",
+        ("admin", bcrypt.hashpw(b"admin123", bcrypt.gensalt(custo)).decode('utf-8'), "Administrador")
+    )
+    return cursor.rowcount > 0
+
+
+def exigir_administrador(usuario):
+    """Lança PermissaoNegadaError se o usuario ({'username', 'perfil'}) não for administrador"""
+    if usuario is None or usuario.get('perfil') != "Administrador":
+        raise PermissaoNegadaError()
+
+
+def validar_campos_produto(nome, quantidade, quantidade_minima):
+    """
+    Valida os campos de um produto e retorna (nome, quantidade, quantidade_minima)
+    Aceita números ou texto com dígitos; lança ValueError com a mensagem a exibir.
+    """
+    nome = (nome or "").strip()
+    if not nome or quantidade in (None, "") or quantidade_minima in (None, ""):
+        raise ValueError("Preencha todos os campos!")
+    valores = []
+    for valor in (quantidade, quantidade_minima):
+        if isinstance(valor, bool):
+            raise ValueError("As quantidades devem ser números inteiros!")
+        try:
+            valor = int(valor)
+        except (TypeError, ValueError):
+            raise ValueError("As quantidades devem ser números inteiros!") from None
+        if valor < 0:
+            raise ValueError("As quantidades não podem ser negativas!")
+        valores.append(valor)
+    return nome, valores[0], valores[1]
+
+
+class ServicoEstoque:
+    """
+    Operações do controle de estoque, independentes da interface
+    Parâmetros:
+    - banco: instância de Banco (conexões por thread: pode ser usado por várias threads)
+    - cache: CacheProdutos opcional, atualizado a cada gravação (write-through)
+      e usado nas leituras de um produto
+    - autenticador: Autenticador (custo do bcrypt, cache de credenciais e sessões);
+      se omitido, um com a configuração padrão
+    """
+
+    def __init__(self, banco, cache=None, autenticador=None):
+        self.banco = banco
+        self.cache = cache
+        self.autenticador = autenticador or Autenticador(banco)
+        self.movimentacoes = ServicoMovimentacao(banco, cache=cache)
+
+    def encerrar(self):
+        """Libera os recursos do serviço (pool de bcrypt)"""
+        self.autenticador.encerrar()
+
+    # ----- Usuários e sessões -----
+    def autenticar(self, username, senha):
+        """Retorna {'username', 'perfil'} ou lança CredenciaisInvalidasError"""
+        return self.autenticador.verificar_senha(username, senha)
+
+    def iniciar_sessao(self, username, senha):
+        """Autentica e abre uma sessão; retorna a Sessao (token, usuario, expira_em)"""
+        return self.autenticador.criar_sessao(self.autenticar(username, senha))
+
+    def validar_sessao(self, token):
+        """Retorna o usuário da sessão ou lança SessaoExpiradaError (sem bcrypt)"""
+        return self.autenticador.validar_sessao(token)
+
+    def encerrar_sessao(self, token):
+        self.autenticador.encerrar_sessao(token)
+
+    def cadastrar_usuario(self, username, senha, perfil):
+        """Cadastra um novo usuário com a senha criptografada"""
+        username = (username or "").strip()
+        if not username or not senha or not perfil:
+            raise ValueError("Preencha todos os campos!")
+        if perfil not in PERFIS:
+            raise ValueError(f"Perfil inválido: {perfil}")
+
+        senha_hash = self.autenticador.gerar_hash(senha)
+        try:
+            self.banco.executar(
+                "INSERT INTO usuarios (username, password, perfil) VALUES (?, ?, ?)",
+                (username, senha_hash, perfil)
+            )
+        except sqlite3.IntegrityError:
+            raise UsuarioDuplicadoError() from None
+
+    def listar_usuarios(self):
+        """Retorna [(username, perfil)] em ordem alfabética"""
+        return self.banco.consultar("SELECT username, perfil FROM usuarios ORDER BY username")
+
+    # ----- Produtos -----
+    def alteracoes_produtos(self, desde=None):
+        """
+        Produtos alterados desde uma versão do contador (ver produtos.consultar_alteracoes)
+        Com cache, as alterações também são aplicadas nele.
+        """
+        marca = self.cache.marca_atual() if self.cache is not None else None
+        resultado = produtos.consultar_alteracoes(self.banco, desde)
+        if self.cache is not None:
+            self.cache.aplicar_alteracoes(resultado, marca)
+        return resultado
+
+    def obter_produto(self, produto_id):
+        """Retorna o RegistroProduto ou lança ProdutoNaoEncontradoError"""
+        if self.cache is not None:
+            registro = self.cache.obter(produto_id)
+        else:
+            linha = self.banco.consultar_um(SQL_PRODUTO, (produto_id,))
+            registro = RegistroProduto(*linha) if linha else None
+        if registro is None:
+            raise ProdutoNaoEncontradoError(f"Produto {produto_id} não encontrado!")
+        return registro
+
+    def cadastrar_produto(self, nome, quantidade, quantidade_minima, usuario):
+        """Cadastra um produto com a entrada inicial (no local padrão) no histórico; retorna o id"""
+        nome, quantidade, quantidade_minima = validar_campos_produto(nome, quantidade, quantidade_minima)
+
+        def cadastrar(cursor):
+            # A quantidade chega em produtos pelo gatilho de estoque_local
+            cursor.execute(
+                "INSERT INTO produtos (nome, quantidade, quantidade_minima) VALUES (?, 0, ?)",
+                (nome, quantidade_minima)
+            )
+            produto_id = cursor.lastrowid
+            ajustar_estoque_local(cursor, produto_id, LOCAL_PADRAO, quantidade)
+            # Registra a entrada inicial
+            cursor.execute(ServicoMovimentacao.SQL_HISTORICO,
+                           (produto_id, "entrada", quantidade, agora_epoch(), usuario, LOCAL_PADRAO, None))
+            return produto_id
+
+        try:
+            produto_id = self.banco.executar_transacao(cadastrar)
+        except sqlite3.IntegrityError:
+            raise self._erro_nome_duplicado(nome) from None
+        if self.cache is not None:
+            self.cache.gravar(produto_id, nome, quantidade, quantidade_minima)
+        return produto_id
+
+    def atualizar_produto(self, produto_id, nome, quantidade, quantidade_minima, usuario):
+        """
+        Atualiza nome, quantidade e mínimo de um produto existente
+        A quantidade é o total de todos os locais: a diferença é aplicada no
+        local padrão (EstoqueInsuficienteError se ele não tiver o suficiente)
+        e registrada no histórico como entrada ou saída.
+        """
+        nome, quantidade, quantidade_minima = validar_campos_produto(nome, quantidade, quantidade_minima)
+
+        def atualizar(cursor):
+            cursor.execute("SELECT quantidade FROM produtos WHERE id=? AND excluido_em IS NULL", (produto_id,))
+            atual = cursor.fetchone()
+            if atual is None:
+                raise ProdutoNaoEncontradoError(f"Produto {produto_id} não encontrado!")
+            cursor.execute("UPDATE produtos SET nome=?, quantidade_minima=? WHERE id=?",
+                           (nome, quantidade_minima, produto_id))
+            diferenca = quantidade - atual[0]
+            ajustar_estoque_local(cursor, produto_id, LOCAL_PADRAO, diferenca)
+            # Mantém o histórico coerente com o estoque (retratos, totais, saldos de abertura)
+            if diferenca:
+                cursor.execute(ServicoMovimentacao.SQL_HISTORICO,
+                               (produto_id, "entrada" if diferenca > 0 else "saida", abs(diferenca),
+                                agora_epoch(), usuario, LOCAL_PADRAO, None))
+
+        try:
+            self.banco.executar_transacao(atualizar)
+        except sqlite3.IntegrityError:
+            raise self._erro_nome_duplicado(nome) from None
+        if self.cache is not None:
+            self.cache.gravar(produto_id, nome, quantidade, quantidade_minima)
+
+    def _erro_nome_duplicado(self, nome):
+        """Erro para um nome já usado: ProdutoEmExclusaoError se o dono do nome foi excluído"""
+        if self.banco.consultar_um("SELECT 1 FROM produtos WHERE nome=? AND excluido_em IS NOT NULL", (nome,)):
+            return ProdutoEmExclusaoError()
+        return ProdutoDuplicadoError()
+
+    def excluir_produto(self, produto_id):
+        """
+        Exclui um produto (exclusão lógica, imediata)
+        As movimentações continuam no banco até purgar_produto(), que deve ser
+        executada em segundo plano (ver exclusao.py).
+        """
+        try:
+            exclusao.excluir_produto(self.banco, produto_id)
+        finally:
+            if self.cache is not None:
+                self.cache.remover(produto_id)
+
+    def purgar_produto(self, produto_id, progresso=None, interromper=None):
+        """Remove em blocos o histórico de um produto excluído; retorna quantas movimentações"""
+        return exclusao.purgar_produto(self.banco, produto_id, progresso=progresso, interromper=interromper)
+
+    def purgar_pendentes(self, progresso=None, interromper=None):
+        """Termina a remoção dos produtos excluídos (interrompida ao fechar a aplicação, por exemplo)"""
+        return exclusao.purgar_pendentes(self.banco, progresso=progresso, interromper=interromper)
+
+    # ----- Movimentações -----
+    def registrar_movimentacao(self, produto_id, tipo, quantidade, usuario, local_id=LOCAL_PADRAO):
+        """Registra uma entrada ou saída e retorna o novo saldo total (ver ServicoMovimentacao.registrar)"""
+        return self.movimentacoes.registrar(produto_id, tipo, quantidade, usuario, local_id)
+
+    def registrar_lote(self, itens, usuario, local_id=LOCAL_PADRAO):
+        """Lote tudo ou nada (ver ServicoMovimentacao.registrar_lote)"""
+        return self.movimentacoes.registrar_lote(itens, usuario, local_id)
+
+    def registrar_varias(self, itens):
+        """Movimentações independentes em uma transação (ver ServicoMovimentacao.registrar_varias)"""
+        return self.movimentacoes.registrar_varias(itens)
+
+    def transferir(self, produto_id, origem, destino, quantidade, usuario):
+        """Transfere estoque entre locais; retorna o id da transferência (ver ServicoMovimentacao.transferir)"""
+        return self.movimentacoes.transferir(produto_id, origem, destino, quantidade, usuario)
+
+    # ----- Locais -----
+    def listar_locais(self):
+        return locais.listar_locais(self.banco)
+
+    def criar_local(self, nome):
+        """Cadastra um local; retorna o id (ver locais.criar_local)"""
+        return locais.criar_local(self.banco, nome)
+
+    def estoque_do_local(self, local_id):
+        """[EstoqueLocal] dos produtos com estoque no local (ver locais.estoque_do_local)"""
+        return locais.estoque_do_local(self.banco, local_id)
+
+    def estoque_por_local(self, produto_id):
+        """[EstoqueNoLocal] do produto em cada local (ver locais.estoque_por_local)"""
+        return locais.estoque_por_local(self.banco, produto_id)
+
+    # ----- Consultas -----
+    def consultar_historico(self, filtro=None, antes=None, depois=None, limite=historico.TAMANHO_PAGINA):
+        """Página do histórico (ver historico.consultar_pagina)"""
+        return historico.consultar_pagina(self.banco, filtro, antes=antes, depois=depois, limite=limite)
+
+    def contar_historico(self, filtro=None):
+        return historico.contar_movimentacoes(self.banco, filtro)
+
+    def consultar_alertas(self, limite=None):
+        """Produtos abaixo do mínimo, mais críticos primeiro (ver alertas.consultar_alertas)"""
+        return alertas.consultar_alertas(self.banco, limite)
+
+    def contar_alertas(self):
+        return alertas.contar_alertas(self.banco)
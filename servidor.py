@@ -0,0 +1,593 @@
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from autenticacao import Autenticador, CredenciaisInvalidasError, SessaoExpiradaError, CUSTO_BCRYPT
+from banco import Banco, CAMINHO_PADRAO
+from historico import FiltroHistorico, TAMANHO_PAGINA
+from instrumentacao import METRICAS
+from locais import LocalDuplicadoError
+from movimentacao import (LOCAL_PADRAO, EstoqueInsuficienteError, LocalNaoEncontradoError, LoteInvalidoError,
+                          ProdutoNaoEncontradoError)
+from servico import (ServicoEstoque, PermissaoNegadaError,
+                     ProdutoDuplicadoError, UsuarioDuplicadoError, criar_usuario_padrao,
+                     exigir_administrador)
+
+# ==============================================
+# SERVIDOR HTTP/JSON LOCAL
+# ==============================================
+#
+# Expõe o ServicoEstoque para coletores, leitores de código de barras e
+# integrações (ERP) sem passar pela interface gráfica.
+#
+# - asyncio atende as conexões (HTTP/1.1 com keep-alive) em uma única thread
+# - Leituras e demais operações rodam em um pool de threads; cada thread
+#   mantém a sua conexão persistente com o banco (WAL: leituras simultâneas)
+# - Movimentações recebidas em paralelo são agrupadas: enquanto uma transação
+#   grava, as que chegam esperam e entram todas juntas na próxima
+# - Autenticação HTTP Basic com os usuários do sistema (senhas verificadas
+#   ficam alguns minutos no cache do Autenticador) ou 'Bearer TOKEN' com o
+#   token de POST /sessoes, validado em memória sem bcrypt
+# - Cada requisição é medida (categoria 'http', por método e rota), além das
+#   consultas ao banco; GET /metricas mostra os tempos
+#
+# Rotas (JSON no corpo e nas respostas):
+#   GET    /saude                          (sem autenticação)
+#   POST   /sessoes                        abre uma sessão (só HTTP Basic): {token, expira_em}
+#   DELETE /sessoes                        encerra a sessão do token
+#   GET    /produtos?desde=VERSAO          produtos alterados desde a versão
+#   POST   /produtos                       {nome, quantidade, quantidade_minima}
+#   GET    /produtos/ID
+#   PUT    /produtos/ID                    {nome, quantidade, quantidade_minima}
+#   DELETE /produtos/ID
+#   GET    /produtos/ID/locais             estoque do produto em cada local
+#   POST   /movimentacoes                  {produto_id, tipo, quantidade, local_id} ou lista delas
+#   POST   /movimentacoes/lote             {itens: [...], local_id} (tudo ou nada)
+#   POST   /transferencias                 {produto_id, origem, destino, quantidade}
+#   GET    /locais
+#   POST   /locais                         {nome} (administrador)
+#   GET    /locais/ID/estoque              produtos com estoque no local
+#   GET    /historico?de=&ate=&produto=&tipo=&usuario=&local=&antes=DATA,ID&limite=
+#   GET    /alertas?limite=
+#   GET    /usuarios                       (administrador)
+#   POST   /usuarios                       {username, senha, perfil} (administrador)
+#   GET    /metricas?categoria=            tempos de requisições e consultas (administrador)
+
+ENDERECO_PADRAO = "127.0.0.1"
+PORTA_PADRAO = 8765
+
+# Threads para leituras, bcrypt e gravações que não são movimentações
+TRABALHADORES = 8
+
+# Máximo de movimentações gravadas em uma mesma transação pelo agrupador
+LOTE_MAXIMO = 256
+
+TAMANHO_MAXIMO_CORPO = 1024 * 1024
+
+# Máximo de linhas por página do histórico
+LIMITE_PAGINA_MAXIMO = 1000
+
+MENSAGENS_STATUS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+    404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class ErroHttp(Exception):
+    """Erro com o status HTTP e dados extras da resposta"""
+
+    def __init__(self, status, mensagem, **extras):
+        super().__init__(mensagem)
+        self.status = status
+        self.extras = extras
+
+
+def resposta_erro(erro):
+    """Converte uma exceção em (status, corpo JSON)"""
+    extras = {}
+    if isinstance(erro, ErroHttp):
+        status, extras = erro.status, erro.extras
+    elif isinstance(erro, (CredenciaisInvalidasError, SessaoExpiradaError)):
+        status = 401
+    elif isinstance(erro, PermissaoNegadaError):
+        status = 403
+    elif isinstance(erro, (ProdutoNaoEncontradoError, LocalNaoEncontradoError)):
+        status = 404
+    elif isinstance(erro, EstoqueInsuficienteError):
+        status, extras = 409, {"disponivel": erro.disponivel}
+    elif isinstance(erro, LoteInvalidoError):
+        status, extras = 409, {"resultados": [r._asdict() for r in erro.resultados]}
+    elif isinstance(erro, (ProdutoDuplicadoError, UsuarioDuplicadoError, LocalDuplicadoError)):
+        status = 409
+    elif isinstance(erro, ValueError):
+        status = 400
+    else:
+        status = 500
+    return status, {"erro": str(erro), **extras}
+
+
+def produto_json(registro):
+    return {"id": registro.id, "nome": registro.nome, "quantidade": registro.quantidade,
+            "quantidade_minima": registro.quantidade_minima}
+
+
+def _inteiro(valor, campo):
+    """Valida um número inteiro vindo do JSON ou da URL"""
+    if isinstance(valor, bool):
+        raise ValueError(f"Campo '{campo}' inválido")
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Campo '{campo}' inválido") from None
+
+
+def _local(dados):
+    """local_id de um objeto JSON (LOCAL_PADRAO se omitido)"""
+    return _inteiro(dados["local_id"], "local_id") if dados.get("local_id") is not None else LOCAL_PADRAO
+
+
+def _item_movimentacao(dados):
+    """(produto_id, tipo, quantidade, local_id) de um objeto JSON de movimentação"""
+    if not isinstance(dados, dict):
+        raise ValueError("Cada movimentação deve ser um objeto JSON")
+    return (_inteiro(dados.get("produto_id"), "produto_id"), dados.get("tipo"), dados.get("quantidade"),
+            _local(dados))
+
+
+class AgrupadorMovimentacoes:
+    """
+    Grava as movimentações que chegam em paralelo em transações compartilhadas
+    Não há espera artificial: com pouca carga cada movimentação tem a sua
+    transação; sob carga, as que chegam durante uma gravação entram juntas na
+    próxima (até LOTE_MAXIMO). Cada movimentação é aceita ou recusada sozinha.
+    """
+
+    def __init__(self, servico, maximo=LOTE_MAXIMO):
+        self.servico = servico
+        self.maximo = maximo
+        self.fila = asyncio.Queue()
+        # Uma única thread de gravação: as transações não disputam o bloqueio do banco
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gravacao")
+        self.transacoes = 0
+        self.movimentacoes = 0
+        self._tarefa = None
+
+    def iniciar(self):
+        self._tarefa = asyncio.get_running_loop().create_task(self._gravar())
+
+    async def encerrar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+        self.executor.shutdown(wait=True)
+
+    async def registrar(self, produto_id, tipo, quantidade, local_id, usuario):
+        """Enfileira uma movimentação e retorna o novo saldo total (ou lança o erro do item)"""
+        futuro = asyncio.get_running_loop().create_future()
+        self.fila.put_nowait(((produto_id, tipo, quantidade, usuario, local_id), futuro))
+        resultado = await futuro
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    async def _gravar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            grupo = [await self.fila.get()]
+            while len(grupo) < self.maximo and not self.fila.empty():
+                grupo.append(self.fila.get_nowait())
+            try:
+                resultados = await loop.run_in_executor(
+                    self.executor, self.servico.registrar_varias, [item for item, _ in grupo]
+                )
+            except Exception as e:
+                resultados = [e] * len(grupo)
+            self.transacoes += 1
+            self.movimentacoes += len(grupo)
+            for (_, futuro), resultado in zip(grupo, resultados):
+                if not futuro.done():
+                    futuro.set_result(resultado)
+
+
+class ServidorEstoque:
+    """
+    Servidor HTTP/JSON sobre o ServicoEstoque
+    Parâmetros:
+    - servico: ServicoEstoque compartilhado pelas threads
+    - trabalhadores: threads para leituras e demais operações
+    - metricas: Metricas que recebem o tempo de cada requisição
+    """
+
+    def __init__(self, servico, trabalhadores=TRABALHADORES, metricas=METRICAS):
+        self.servico = servico
+        self.metricas = metricas
+        self.executor = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="servico")
+        self.agrupador = None
+        # Remoção do histórico dos produtos excluídos: uma thread própria, fora do pool das requisições
+        self.purga = ThreadPoolExecutor(max_workers=1, thread_name_prefix="purga")
+        self.interromper_purga = threading.Event()
+        self.rotas = [
+            ("GET", r"/saude", self._saude),
+            ("POST", r"/sessoes", self._abrir_sessao),
+            ("DELETE", r"/sessoes", self._encerrar_sessao),
+            ("GET", r"/produtos", self._listar_produtos),
+            ("POST", r"/produtos", self._cadastrar_produto),
+            ("GET", r"/produtos/(\d+)", self._obter_produto),
+            ("GET", r"/produtos/(\d+)/locais", self._estoque_por_local),
+            ("PUT", r"/produtos/(\d+)", self._atualizar_produto),
+            ("DELETE", r"/produtos/(\d+)", self._excluir_produto),
+            ("POST", r"/movimentacoes", self._registrar_movimentacoes),
+            ("POST", r"/movimentacoes/lote", self._registrar_lote),
+            ("POST", r"/transferencias", self._transferir),
+            ("GET", r"/locais", self._listar_locais),
+            ("POST", r"/locais", self._criar_local),
+            ("GET", r"/locais/(\d+)/estoque", self._estoque_do_local),
+            ("GET", r"/historico", self._consultar_historico),
+            ("GET", r"/alertas", self._consultar_alertas),
+            ("GET", r"/usuarios", self._listar_usuarios),
+            ("POST", r"/usuarios", self._cadastrar_usuario),
+            ("GET", r"/metricas", self._consultar_metricas),
+        ]
+        # O padrão em texto identifica a rota nas métricas ('GET /produtos/(\d+)')
+        self.rotas = [(metodo, re.compile(padrao + "$"), funcao, f"{metodo} {padrao}")
+                      for metodo, padrao, funcao in self.rotas]
+
+    async def iniciar(self, host=ENDERECO_PADRAO, porta=PORTA_PADRAO):
+        """Abre a porta e retorna o asyncio.Server"""
+        self.agrupador = AgrupadorMovimentacoes(self.servico)
+        self.agrupador.iniciar()
+        self._agendar_purga()  # exclusões interrompidas na última execução
+        return await asyncio.start_server(self._atender, host, porta)
+
+    async def encerrar(self):
+        if self.agrupador is not None:
+            await self.agrupador.encerrar()
+        # A remoção em andamento para no próximo bloco e continua na próxima execução
+        self.interromper_purga.set()
+        self.purga.shutdown(wait=True, cancel_futures=True)
+        self.executor.shutdown(wait=True)
+
+    def _agendar_purga(self):
+        """Agenda a remoção do histórico dos produtos excluídos (sem bloquear a resposta)"""
+        def purgar():
+            try:
+                self.servico.purgar_pendentes(interromper=self.interromper_purga)
+            except Exception as e:
+                print(f"Falha ao remover o histórico dos produtos excluídos: {e}", file=sys.stderr)
+        self.purga.submit(purgar)
+
+    async def _executar(self, funcao, *args):
+        """Executa uma função do serviço no pool de threads"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, lambda: funcao(*args))
+
+    # ----- Protocolo HTTP -----
+    async def _atender(self, reader, writer):
+        """Atende as requisições de uma conexão (keep-alive)"""
+        try:
+            while True:
+                try:
+                    requisicao = await self._ler_requisicao(reader)
+                except ErroHttp as e:
+                    self._responder(writer, *resposta_erro(e), manter=False)
+                    await writer.drain()
+                    break
+                if requisicao is None:
+                    break
+                metodo, alvo, versao, cabecalhos, corpo = requisicao
+                status, dados = await self._processar(metodo, alvo, cabecalhos, corpo)
+                manter = (versao == "HTTP/1.1" and cabecalhos.get("connection", "").lower() != "close")
+                self._responder(writer, status, dados, manter)
+                await writer.drain()
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _ler_requisicao(self, reader):
+        """Lê (método, alvo, versão, cabeçalhos, corpo) ou None se a conexão foi fechada"""
+        linha = await reader.readline()
+        if not linha:
+            return None
+        try:
+            metodo, alvo, versao = linha.decode("latin-1").split()
+        except ValueError:
+            raise ErroHttp(400, "Requisição inválida") from None
+
+        cabecalhos = {}
+        while True:
+            linha = await reader.readline()
+            if linha in (b"\r\n", b"\n", b""):
+                break
+            nome, _, valor = linha.decode("latin-1").partition(":")
+            cabecalhos[nome.strip().lower()] = valor.strip()
+
+        try:
+            tamanho = int(cabecalhos.get("content-length", 0))
+        except ValueError:
+            raise ErroHttp(400, "Content-Length inválido") from None
+        if tamanho < 0:
+            raise ErroHttp(400, "Content-Length inválido")
+        if tamanho > TAMANHO_MAXIMO_CORPO:
+            raise ErroHttp(413, "Corpo da requisição muito grande")
+        corpo = await reader.readexactly(tamanho) if tamanho else b""
+        return metodo.upper(), alvo, versao, cabecalhos, corpo
+
+    def _responder(self, writer, status, dados, manter):
+        corpo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+        cabecalho = (
+            f"HTTP/1.1 {status} {MENSAGENS_STATUS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(corpo)}\r\n"
+            f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n"
+        )
+        writer.write(cabecalho.encode("latin-1") + corpo)
+
+    async def _processar(self, metodo, alvo, cabecalhos, corpo):
+        """Localiza a rota, autentica e executa; retorna (status, dados)"""
+        inicio = time.perf_counter()
+        nome = "sem rota"
+        partes = urlsplit(alvo)
+        parametros = {chave: valores[-1] for chave, valores in parse_qs(partes.query).items()}
+        try:
+            encontrada = False
+            for metodo_rota, padrao, funcao, nome_rota in self.rotas:
+                combinacao = padrao.match(partes.path.rstrip("/") or "/")
+                if combinacao is None:
+                    continue
+                encontrada = True
+                if metodo_rota != metodo:
+                    continue
+                nome = nome_rota
+                usuario = None
+                if funcao != self._saude:
+                    usuario = await self._autenticar(cabecalhos.get("authorization"))
+                dados = self._ler_json(corpo)
+                return await funcao(usuario, parametros, dados, *combinacao.groups())
+            if encontrada:
+                raise ErroHttp(405, "Método não permitido")
+            raise ErroHttp(404, "Rota não encontrada")
+        except Exception as e:
+            return resposta_erro(e)
+        finally:
+            if self.metricas is not None:
+                self.metricas.registrar("http", nome, time.perf_counter() - inicio)
+
+    async def _autenticar(self, cabecalho):
+        """
+        Verifica o cabeçalho Authorization ('Basic' ou 'Bearer TOKEN')
+        Retorna o usuário; com token, o usuário inclui a chave 'token'.
+        """
+        tipo, _, credenciais = (cabecalho or "").partition(" ")
+        if tipo.lower() == "bearer":
+            token = credenciais.strip()
+            return dict(self.servico.validar_sessao(token), token=token)
+        if tipo.lower() != "basic":
+            raise ErroHttp(401, "Autenticação necessária (HTTP Basic ou Bearer)")
+        try:
+            username, _, senha = base64.b64decode(credenciais, validate=True).decode("utf-8").partition(":")
+        except (binascii.Error, UnicodeDecodeError):
+            raise ErroHttp(401, "Credenciais inválidas!") from None
+        return await self._executar(self.servico.autenticar, username, senha)
+
+    @staticmethod
+    def _ler_json(corpo):
+        if not corpo:
+            return {}
+        try:
+            return json.loads(corpo)
+        except (ValueError, UnicodeDecodeError):
+            raise ErroHttp(400, "JSON inválido") from None
+
+    # ----- Rotas -----
+    async def _saude(self, usuario, parametros, dados):
+        agrupador = self.agrupador
+        return 200, {"ok": True, "transacoes_movimentacao": agrupador.transacoes,
+                     "movimentacoes": agrupador.movimentacoes}
+
+    async def _abrir_sessao(self, usuario, parametros, dados):
+        # Só com usuário e senha: um token não pode abrir outra sessão (renovação sem fim)
+        if "token" in usuario:
+            raise ErroHttp(401, "Abra a sessão com usuário e senha (HTTP Basic)")
+        usuario = {'username': usuario['username'], 'perfil': usuario['perfil']}
+        sessao = self.servico.autenticador.criar_sessao(usuario)
+        return 201, {"token": sessao.token, "expira_em": int(sessao.expira_em), **usuario}
+
+    async def _encerrar_sessao(self, usuario, parametros, dados):
+        if "token" not in usuario:
+            raise ValueError("Informe o token da sessão (Authorization: Bearer TOKEN)")
+        self.servico.encerrar_sessao(usuario["token"])
+        return 200, {"ok": True}
+
+    async def _listar_produtos(self, usuario, parametros, dados):
+        desde = _inteiro(parametros["desde"], "desde") if "desde" in parametros else None
+        versao, alterados, removidos, completo = await self._executar(self.servico.alteracoes_produtos, desde)
+        return 200, {
+            "versao": versao,
+            "completo": completo,
+            "produtos": [{"id": p[0], "nome": p[1], "quantidade": p[2], "quantidade_minima": p[3]}
+                         for p in alterados],
+            "removidos": removidos,
+        }
+
+    async def _obter_produto(self, usuario, parametros, dados, produto_id):
+        registro = await self._executar(self.servico.obter_produto, int(produto_id))
+        return 200, produto_json(registro)
+
+    async def _cadastrar_produto(self, usuario, parametros, dados):
+        produto_id = await self._executar(
+            self.servico.cadastrar_produto, dados.get("nome"), dados.get("quantidade"),
+            dados.get("quantidade_minima"), usuario['username']
+        )
+        return 201, {"id": produto_id}
+
+    async def _atualizar_produto(self, usuario, parametros, dados, produto_id):
+        await self._executar(self.servico.atualizar_produto, int(produto_id), dados.get("nome"),
+                             dados.get("quantidade"), dados.get("quantidade_minima"), usuario['username'])
+        return 200, {"id": int(produto_id)}
+
+    async def _excluir_produto(self, usuario, parametros, dados, produto_id):
+        await self._executar(self.servico.excluir_produto, int(produto_id))
+        self._agendar_purga()
+        return 200, {"id": int(produto_id)}
+
+    async def _registrar_movimentacoes(self, usuario, parametros, dados):
+        """Uma movimentação ({...}) ou várias independentes ([{...}, ...])"""
+        if isinstance(dados, dict):
+            saldo = await self.agrupador.registrar(*_item_movimentacao(dados), usuario['username'])
+            return 201, {"saldo": saldo}
+
+        if not isinstance(dados, list) or not dados:
+            raise ValueError("Envie uma movimentação ou uma lista de movimentações")
+
+        async def registrar(item):
+            try:
+                saldo = await self.agrupador.registrar(*_item_movimentacao(item), usuario['username'])
+            except ValueError as e:
+                return {"ok": False, **resposta_erro(e)[1]}
+            return {"ok": True, "saldo": saldo}
+
+        resultados = await asyncio.gather(*(registrar(item) for item in dados))
+        return 200, {"resultados": resultados}
+
+    async def _registrar_lote(self, usuario, parametros, dados):
+        itens = dados.get("itens") if isinstance(dados, dict) else None
+        if not isinstance(itens, list):
+            raise ValueError("Envie {\"itens\": [...]}")
+        lista = []
+        for item in itens:
+            if not isinstance(item, dict):
+                raise ValueError("Cada movimentação deve ser um objeto JSON")
+            lista.append((item.get("produto_id"), item.get("tipo"), item.get("quantidade")))
+        resultados = await self._executar(self.servico.registrar_lote, lista, usuario['username'], _local(dados))
+        return 201, {"resultados": [r._asdict() for r in resultados]}
+
+    async def _transferir(self, usuario, parametros, dados):
+        if not isinstance(dados, dict):
+            raise ValueError("Envie {\"produto_id\", \"origem\", \"destino\", \"quantidade\"}")
+        transferencia_id = await self._executar(
+            self.servico.transferir, _inteiro(dados.get("produto_id"), "produto_id"),
+            _inteiro(dados.get("origem"), "origem"), _inteiro(dados.get("destino"), "destino"),
+            dados.get("quantidade"), usuario['username']
+        )
+        return 201, {"id": transferencia_id}
+
+    async def _estoque_por_local(self, usuario, parametros, dados, produto_id):
+        itens = await self._executar(self.servico.estoque_por_local, int(produto_id))
+        return 200, {"locais": [item._asdict() for item in itens]}
+
+    async def _listar_locais(self, usuario, parametros, dados):
+        lista = await self._executar(self.servico.listar_locais)
+        return 200, {"locais": [local._asdict() for local in lista]}
+
+    async def _criar_local(self, usuario, parametros, dados):
+        exigir_administrador(usuario)
+        local_id = await self._executar(self.servico.criar_local, dados.get("nome"))
+        return 201, {"id": local_id}
+
+    async def _estoque_do_local(self, usuario, parametros, dados, local_id):
+        itens = await self._executar(self.servico.estoque_do_local, int(local_id))
+        return 200, {"produtos": [item._asdict() for item in itens]}
+
+    async def _consultar_historico(self, usuario, parametros, dados):
+        produto_id = _inteiro(parametros["produto"], "produto") if "produto" in parametros else None
+        local_id = _inteiro(parametros["local"], "local") if "local" in parametros else None
+        filtro = FiltroHistorico.por_datas(parametros.get("de"), parametros.get("ate"), produto_id=produto_id,
+                                           tipo=parametros.get("tipo"), usuario=parametros.get("usuario"),
+                                           local_id=local_id)
+        antes = None
+        if "antes" in parametros:
+            data, _, id_ = parametros["antes"].partition(",")
+            antes = (_inteiro(data, "antes"), _inteiro(id_, "antes"))
+        limite = min(_inteiro(parametros.get("limite", TAMANHO_PAGINA), "limite"), LIMITE_PAGINA_MAXIMO)
+        linhas = await self._executar(self.servico.consultar_historico, filtro, antes, None, limite)
+        proxima = f"{linhas[-1][1]},{linhas[-1][0]}" if len(linhas) == limite else None
+        return 200, {
+            "movimentacoes": [{"id": l[0], "data": l[1], "produto": l[2], "tipo": l[3],
+                               "quantidade": l[4], "usuario": l[5], "local": l[6]} for l in linhas],
+            "proxima": proxima,
+        }
+
+    async def _consultar_alertas(self, usuario, parametros, dados):
+        limite = _inteiro(parametros["limite"], "limite") if "limite" in parametros else None
+        lista = await self._executar(self.servico.consultar_alertas, limite)
+        return 200, {"alertas": [a._asdict() for a in lista]}
+
+    async def _listar_usuarios(self, usuario, parametros, dados):
+        exigir_administrador(usuario)
+        usuarios = await self._executar(self.servico.listar_usuarios)
+        return 200, {"usuarios": [{"username": u, "perfil": p} for u, p in usuarios]}
+
+    async def _cadastrar_usuario(self, usuario, parametros, dados):
+        exigir_administrador(usuario)
+        await self._executar(self.servico.cadastrar_usuario, dados.get("username"),
+                             dados.get("senha"), dados.get("perfil"))
+        return 201, {"username": dados.get("username")}
+
+    async def _consultar_metricas(self, usuario, parametros, dados):
+        exigir_administrador(usuario)
+        if self.metricas is None:
+            raise ErroHttp(404, "Métricas desativadas")
+        return 200, {
+            "desde": self.metricas.desde,
+            "metricas": self.metricas.resumo(parametros.get("categoria")),
+            "autenticacao": self.servico.autenticador.estatisticas(),
+        }
+
+
+async def servir(banco, host=ENDERECO_PADRAO, porta=PORTA_PADRAO, trabalhadores=TRABALHADORES,
+                 custo_bcrypt=CUSTO_BCRYPT, arquivo_metricas=None):
+    """
+    Executa o servidor até ser interrompido
+    - arquivo_metricas: JSON gravado com as métricas ao encerrar (opcional)
+    """
+    servico = ServicoEstoque(banco, autenticador=Autenticador(banco, custo=custo_bcrypt))
+    servidor = ServidorEstoque(servico, trabalhadores)
+    asyncio_server = await servidor.iniciar(host, porta)
+    print(f"Servidor em http://{host}:{porta}", file=sys.stderr)
+    try:
+        async with asyncio_server:
+            await asyncio_server.serve_forever()
+    finally:
+        await servidor.encerrar()
+        servico.encerrar()
+        if arquivo_metricas:
+            servidor.metricas.exportar(arquivo_metricas, {"autenticacao": servico.autenticador.estatisticas()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor HTTP/JSON do controle de estoque")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    parser.add_argument("--host", default=ENDERECO_PADRAO, help="endereço (padrão: apenas local)")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--trabalhadores", type=int, default=TRABALHADORES, help="threads do serviço")
+    parser.add_argument("--custo-bcrypt", type=int, default=CUSTO_BCRYPT,
+                        help="custo do bcrypt para senhas novas (as de custo menor são regravadas no login)")
+    parser.add_argument("--metricas", metavar="ARQUIVO",
+                        help="grava as métricas (requisições e consultas) em JSON ao encerrar")
+    args = parser.parse_args(argv)
+
+    banco = Banco(args.banco)
+    banco.inicializar()
+    criar_usuario_padrao(banco, args.custo_bcrypt)
+    try:
+        asyncio.run(servir(banco, args.host, args.porta, args.trabalhadores, args.custo_bcrypt,
+                           args.metricas))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        banco.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import argparse
+import sys
+from datetime import datetime
+
+from banco import Banco, CAMINHO_PADRAO, agora_epoch, epoch_para_texto, texto_para_epoch
+from historico import intervalo_datas
+import arquivamento
+
+# ==============================================
+# RETRATOS DO ESTOQUE (SNAPSHOTS)
+# ==============================================
+#
+# produtos.quantidade guarda apenas o saldo atual. Para saber o estoque em
+# uma data passada sem reprocessar todo o histórico, a quantidade de cada
+# produto é gravada periodicamente (um retrato por dia, ao abrir a aplicação
+# ou por 'python snapshots.py criar').
+#
+# Um retrato com data S contém o efeito de todas as movimentações com
+# data < S. O estoque em um instante T parte do ponto de partida mais próximo
+# e aplica apenas as movimentações entre os dois (índice por data):
+# - retrato anterior a T: retrato + movimentações em [S, T)
+# - retrato posterior a T: retrato - movimentações em [T, S)
+# - saldo atual (produtos): atual - movimentações a partir de T
+
+# Intervalo mínimo entre retratos automáticos (segundos)
+INTERVALO_SNAPSHOT = 24 * 60 * 60
+
+# Retratos mais antigos que isso ficam apenas um por mês (o primeiro)
+RETENCAO_DIAS = 90
+
+
+def _saldo_movimentacoes(cursor, fontes, inicio, fim=None, produto_id=None):
+    """
+    Soma das movimentações (entradas - saídas) por produto com inicio <= data < fim
+    (fim None = sem limite superior); usa os índices por data
+    - fontes: tabelas de arquivamento.fontes_movimentacoes (já anexadas)
+    """
+    partes = []
+    parametros = []
+    for tabela, extras in fontes:
+        condicoes = ["m.data >= ?"]
+        parametros.append(inicio)
+        if fim is not None:
+            condicoes.append("m.data < ?")
+            parametros.append(fim)
+        if produto_id is not None:
+            condicoes.append("m.produto_id = ?")
+            parametros.append(produto_id)
+        for sql, params in extras:
+            condicoes.append(sql)
+            parametros.extend(params)
+        partes.append(f'''
+            SELECT m.produto_id AS produto_id,
+                   SUM(CASE m.tipo WHEN 'entrada' THEN m.quantidade ELSE -m.quantidade END) AS saldo
+            FROM {tabela} m
+            WHERE {" AND ".join(condicoes)}
+            GROUP BY m.produto_id
+        ''')
+    if len(partes) == 1:
+        cursor.execute(partes[0], parametros)
+    else:
+        cursor.execute(f"SELECT produto_id, SUM(saldo) FROM ({' UNION ALL '.join(partes)}) GROUP BY produto_id",
+                       parametros)
+    return cursor.fetchall()
+
+
+def criar_snapshot(banco):
+    """
+    Grava um retrato com a quantidade atual de todos os produtos
+    Retorna (id, data) do retrato.
+    """
+    with banco.transacao() as cursor:
+        # Movimentações gravadas depois, mas no mesmo segundo, entram pelo gatilho
+        data = agora_epoch() + 1
+        cursor.execute("SELECT MAX(data) FROM snapshots")
+        ultima = cursor.fetchone()[0]
+        if ultima is not None and data <= ultima:
+            data = ultima + 1
+        cursor.execute("INSERT INTO snapshots (data) VALUES (?)", (data,))
+        snapshot_id = cursor.lastrowid
+        cursor.execute('''
+            INSERT INTO snapshots_estoque (snapshot_id, produto_id, quantidade)
+            SELECT ?, id, quantidade FROM produtos WHERE quantidade <> 0 AND excluido_em IS NULL
+        ''', (snapshot_id,))
+    return snapshot_id, data
+
+
+def criar_snapshot_se_necessario(banco, intervalo=INTERVALO_SNAPSHOT):
+    """
+    Cria um retrato se o último tiver mais de 'intervalo' segundos e apaga os
+    retratos antigos que não precisam mais ser mantidos
+    Retorna (id, data) do novo retrato ou None.
+    """
+    ultima = banco.consultar_um("SELECT MAX(data) FROM snapshots")[0]
+    if ultima is not None and agora_epoch() - ultima < intervalo:
+        return None
+    resultado = criar_snapshot(banco)
+    podar_snapshots(banco)
+    return resultado
+
+
+def podar_snapshots(banco, dias=RETENCAO_DIAS):
+    """
+    Apaga os retratos com mais de 'dias' dias, exceto o primeiro de cada mês
+    Retorna o número de retratos apagados.
+    """
+    limite = agora_epoch() - dias * 24 * 60 * 60
+    antigos = banco.consultar("SELECT id, data FROM snapshots WHERE data < ? ORDER BY data", (limite,))
+    meses = set()
+    apagar = []
+    for snapshot_id, data in antigos:
+        mes = datetime.fromtimestamp(data).strftime("%Y-%m")
+        if mes in meses:
+            apagar.append((snapshot_id,))
+        meses.add(mes)
+    if apagar:
+        with banco.transacao() as cursor:
+            cursor.executemany("DELETE FROM snapshots_estoque WHERE snapshot_id = ?", apagar)
+            cursor.executemany("DELETE FROM snapshots WHERE id = ?", apagar)
+    return len(apagar)
+
+
+def listar_snapshots(banco):
+    """Retorna [(id, data, número de produtos)] do mais recente para o mais antigo"""
+    return banco.consultar('''
+        SELECT s.id, s.data, (SELECT COUNT(*) FROM snapshots_estoque e WHERE e.snapshot_id = s.id)
+        FROM snapshots s ORDER BY s.data DESC
+    ''')
+
+
+def estoque_em(banco, momento, produto_id=None):
+    """
+    Retorna {produto_id: quantidade} considerando as movimentações com data < momento
+    Parâmetros:
+    - momento: instante epoch
+    - produto_id: restringe a consulta a um produto (opcional)
+    Produtos sem estoque no momento podem vir com 0 ou não vir.
+    """
+    # Arquivos que o cálculo pode alcançar: a partir do retrato anterior (anexados fora da transação)
+    anterior = banco.consultar_um("SELECT MAX(data) FROM snapshots WHERE data <= ?", (momento,))[0]
+    fontes = arquivamento.fontes_movimentacoes(banco, anterior if anterior is not None else momento)
+
+    # Leitura consistente: retrato, produtos e movimentações do mesmo instante
+    with banco.transacao(imediata=False) as cursor:
+        cursor.execute("SELECT id, data FROM snapshots WHERE data <= ? ORDER BY data DESC LIMIT 1", (momento,))
+        anterior = cursor.fetchone()
+        cursor.execute("SELECT id, data FROM snapshots WHERE data > ? ORDER BY data LIMIT 1", (momento,))
+        posterior = cursor.fetchone()
+
+        # Ponto de partida mais próximo de 'momento' (menos movimentações a aplicar)
+        distancia_posterior = posterior[1] - momento if posterior else agora_epoch() - momento
+        if anterior is not None and momento - anterior[1] <= distancia_posterior:
+            base, sinal = anterior[0], 1
+            saldos = _saldo_movimentacoes(cursor, fontes, anterior[1], momento, produto_id)
+        elif posterior is not None:
+            base, sinal = posterior[0], -1
+            saldos = _saldo_movimentacoes(cursor, fontes, momento, posterior[1], produto_id)
+        else:
+            # Parte do saldo atual (inclui eventuais movimentações com data futura)
+            base, sinal = None, -1
+            saldos = _saldo_movimentacoes(cursor, fontes, momento, None, produto_id)
+
+        if base is None:
+            sql, parametros = "SELECT id, quantidade FROM produtos", []
+            if produto_id is not None:
+                sql += " WHERE id = ?"
+                parametros.append(produto_id)
+        else:
+            sql = "SELECT produto_id, quantidade FROM snapshots_estoque WHERE snapshot_id = ?"
+            parametros = [base]
+            if produto_id is not None:
+                sql += " AND produto_id = ?"
+                parametros.append(produto_id)
+        cursor.execute(sql, parametros)
+        estoque = dict(cursor.fetchall())
+        # Produtos excluídos: o histórico pode estar no meio da remoção
+        cursor.execute("SELECT id FROM produtos WHERE excluido_em IS NOT NULL")
+        excluidos = {linha[0] for linha in cursor.fetchall()}
+
+    for id_, saldo in saldos:
+        estoque[id_] = estoque.get(id_, 0) + sinal * saldo
+    for id_ in excluidos:
+        estoque.pop(id_, None)
+    return estoque
+
+
+def estoque_na_data(banco, data, produto_id=None):
+    """Estoque ao final do dia 'AAAA-MM-DD' (hora local): {produto_id: quantidade}"""
+    _, fim = intervalo_datas(ate=data)
+    return estoque_em(banco, fim, produto_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retratos do estoque e consulta do estoque em uma data")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    subcomandos.add_parser("criar", help="grava um retrato do estoque atual")
+    subcomandos.add_parser("listar", help="lista os retratos gravados")
+    podar = subcomandos.add_parser("podar", help="apaga retratos antigos (mantém um por mês)")
+    podar.add_argument("--dias", type=int, default=RETENCAO_DIAS)
+    consulta = subcomandos.add_parser("estoque", help="estoque ao final de uma data")
+    consulta.add_argument("data", help="AAAA-MM-DD (final do dia) ou 'AAAA-MM-DD HH:MM:SS'")
+    consulta.add_argument("--produto", type=int, help="id do produto")
+    parser.add_argument("--banco", default=CAMINHO_PADRAO, help="arquivo do banco de dados")
+    args = parser.parse_args(argv)
+
+    banco = Banco(args.banco)
+    try:
+        banco.inicializar()
+        if args.comando == "criar":
+            snapshot_id, data = criar_snapshot(banco)
+            print(f"Retrato {snapshot_id} gravado ({epoch_para_texto(data)})", file=sys.stderr)
+        elif args.comando == "listar":
+            for snapshot_id, data, total in listar_snapshots(banco):
+                print(f"{snapshot_id}\t{epoch_para_texto(data)}\t{total} produtos")
+        elif args.comando == "podar":
+            print(f"{podar_snapshots(banco, args.dias)} retratos apagados", file=sys.stderr)
+        else:
+            try:
+                if len(args.data.strip()) > 10:
+                    estoque = estoque_em(banco, texto_para_epoch(args.data), args.produto)
+                else:
+                    estoque = estoque_na_data(banco, args.data, args.produto)
+            except ValueError as e:
+                parser.error(str(e))
+            nomes = dict(banco.consultar("SELECT id, nome FROM produtos WHERE excluido_em IS NULL"))
+            for produto_id in sorted(estoque):
+                print(f"{produto_id}\t{nomes.get(produto_id, '')}\t{estoque[produto_id]}")
+    finally:
+        banco.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
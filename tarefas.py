@@ -0,0 +1,230 @@
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ==============================================
+# TAREFAS EM SEGUNDO PLANO
+# ==============================================
+#
+# Consultas ao banco e cálculos de bcrypt rodam em um pool de threads.
+# Os resultados voltam por uma fila que a thread do Tkinter lê com
+# root.after(), de modo que os callbacks sempre rodam na thread da interface
+# e a janela continua respondendo enquanto as tarefas executam.
+# Um callback que falha (ex.: widget destruído após a troca de tela) não
+# interrompe a leitura da fila: o erro vai para ao_erro e os demais
+# resultados continuam chegando.
+
+TRABALHADORES = 4
+
+# Intervalo (ms) de leitura da fila de resultados enquanto há tarefas pendentes
+INTERVALO_VERIFICACAO_MS = 15
+
+
+class Tarefa:
+    """Uma chamada submetida ao executor"""
+
+    __slots__ = ("nome", "grupo", "geracao", "ao_concluir", "ao_falhar", "futuro", "submetida_em")
+
+    def __init__(self, nome, grupo, geracao, ao_concluir, ao_falhar):
+        self.nome = nome
+        self.grupo = grupo
+        self.geracao = geracao
+        self.ao_concluir = ao_concluir
+        self.ao_falhar = ao_falhar
+        self.futuro = None
+        self.submetida_em = time.perf_counter()
+
+
+class EstatisticaTarefa:
+    """Latências (em segundos) acumuladas das tarefas com o mesmo nome"""
+
+    __slots__ = ("quantidade", "descartadas", "espera_total", "execucao_total", "execucao_maxima", "ultima")
+
+    def __init__(self):
+        self.quantidade = 0
+        self.descartadas = 0
+        self.espera_total = 0.0
+        self.execucao_total = 0.0
+        self.execucao_maxima = 0.0
+        self.ultima = 0.0
+
+    def registrar(self, espera, execucao):
+        self.quantidade += 1
+        self.espera_total += espera
+        self.execucao_total += execucao
+        self.execucao_maxima = max(self.execucao_maxima, execucao)
+        self.ultima = execucao
+
+    def como_dict(self):
+        n = self.quantidade or 1
+        return {
+            "quantidade": self.quantidade,
+            "descartadas": self.descartadas,
+            "espera_media_ms": self.espera_total / n * 1000,
+            "execucao_media_ms": self.execucao_total / n * 1000,
+            "execucao_maxima_ms": self.execucao_maxima * 1000,
+            "ultima_ms": self.ultima * 1000,
+        }
+
+
+class ExecutorTarefas:
+    """
+    Executa funções em threads e entrega o resultado na thread do Tkinter
+    Parâmetros:
+    - root: janela principal (usada para agendar a leitura da fila)
+    - trabalhadores: quantidade de threads do pool
+    - ao_mudar_ocupado: função opcional ao_mudar_ocupado(ocupado) chamada
+      quando o executor passa a ter (ou deixa de ter) tarefas pendentes
+    - ao_erro: tratamento padrão das exceções das tarefas sem ao_falhar
+    - metricas: Metricas opcional que recebe ('tarefa', nome) com espera + execução
+    """
+
+    def __init__(self, root, trabalhadores=TRABALHADORES, ao_mudar_ocupado=None, ao_erro=None, metricas=None):
+        self.root = root
+        self.metricas = metricas
+        self.ao_mudar_ocupado = ao_mudar_ocupado
+        self.ao_erro = ao_erro
+        self._pool = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="estoque")
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._geracoes = {}  # grupo -> geração atual (tarefas de gerações antigas são descartadas)
+        self._ativas = {}  # grupo -> conjunto de tarefas pendentes
+        self._pendentes = 0
+        self._verificando = False
+        self._estatisticas = {}
+
+    # ----- API usada pela interface (thread do Tkinter) -----
+    def submeter(self, funcao, *args, ao_concluir=None, ao_falhar=None, grupo=None, nome=None, **kwargs):
+        """
+        Executa funcao(*args, **kwargs) em segundo plano
+        - ao_concluir(resultado): chamado na thread da interface em caso de sucesso
+        - ao_falhar(excecao): chamado na thread da interface em caso de erro
+        - grupo: tarefas do mesmo grupo podem ser canceladas juntas (ex.: 'tela')
+        - nome: identifica a tarefa nas estatísticas (padrão: nome da função)
+        Retorna a Tarefa criada.
+        """
+        tarefa = Tarefa(nome or getattr(funcao, "__name__", "tarefa"), grupo,
+                        self._geracoes.get(grupo, 0), ao_concluir, ao_falhar)
+        if grupo is not None:
+            self._ativas.setdefault(grupo, set()).add(tarefa)
+        self._alterar_pendentes(+1)
+        tarefa.futuro = self._pool.submit(self._executar, tarefa, funcao, args, kwargs)
+        self._iniciar_verificacao()
+        return tarefa
+
+    def cancelar(self, grupo):
+        """
+        Cancela as tarefas do grupo: as que ainda não começaram não executam e
+        os resultados das que já estão rodando são descartados
+        """
+        self._geracoes[grupo] = self._geracoes.get(grupo, 0) + 1
+        for tarefa in self._ativas.pop(grupo, set()):
+            if tarefa.futuro.cancel():
+                self._contabilizar(tarefa, None, None, descartada=True)
+                self._alterar_pendentes(-1)
+
+    @property
+    def ocupado(self):
+        return self._pendentes > 0
+
+    def estatisticas(self):
+        """Retorna {nome_da_tarefa: {quantidade, latências em ms...}}"""
+        with self._lock:
+            return {nome: est.como_dict() for nome, est in sorted(self._estatisticas.items())}
+
+    def encerrar(self):
+        """Descarta as tarefas que ainda não começaram e aguarda as que estão rodando"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    # ----- API segura para as threads de trabalho -----
+    def na_interface(self, funcao, *args):
+        """Agenda funcao(*args) para rodar na thread do Tkinter (ex.: progresso)"""
+        self._fila.put((None, funcao, args))
+
+    # ----- Interno -----
+    def _executar(self, tarefa, funcao, args, kwargs):
+        """Roda na thread de trabalho e coloca o resultado na fila"""
+        inicio = time.perf_counter()
+        try:
+            resultado = funcao(*args, **kwargs)
+            ok = True
+        except BaseException as e:
+            resultado = e
+            ok = False
+        fim = time.perf_counter()
+        self._fila.put((tarefa, ok, (resultado, inicio - tarefa.submetida_em, fim - inicio)))
+
+    def _iniciar_verificacao(self):
+        if not self._verificando:
+            self._verificando = True
+            self.root.after(INTERVALO_VERIFICACAO_MS, self._verificar_fila)
+
+    def _verificar_fila(self):
+        """Entrega os resultados prontos (roda na thread do Tkinter)"""
+        try:
+            while True:
+                try:
+                    tarefa, ok, dados = self._fila.get_nowait()
+                except queue.Empty:
+                    break
+
+                if tarefa is None:
+                    # Chamada agendada por na_interface()
+                    funcao, args = ok, dados
+                    self._chamar(funcao, *args)
+                    continue
+
+                resultado, espera, execucao = dados
+                if tarefa.grupo is not None:
+                    self._ativas.get(tarefa.grupo, set()).discard(tarefa)
+                descartada = tarefa.geracao != self._geracoes.get(tarefa.grupo, 0)
+                self._contabilizar(tarefa, espera, execucao, descartada)
+                self._alterar_pendentes(-1)
+
+                if descartada:
+                    continue
+                if ok:
+                    if tarefa.ao_concluir:
+                        self._chamar(tarefa.ao_concluir, resultado)
+                elif tarefa.ao_falhar:
+                    self._chamar(tarefa.ao_falhar, resultado)
+                elif self.ao_erro:
+                    self._chamar(self.ao_erro, resultado)
+        finally:
+            # Sempre reagenda (ou libera) a leitura: senão nenhum resultado chegaria mais à interface
+            if self._pendentes > 0 or not self._fila.empty():
+                self.root.after(INTERVALO_VERIFICACAO_MS, self._verificar_fila)
+            else:
+                self._verificando = False
+
+    def _chamar(self, funcao, *args):
+        """Executa um callback na thread da interface; se ele falhar, o erro vai para ao_erro"""
+        try:
+            funcao(*args)
+        except Exception as e:
+            if self.ao_erro is None or funcao is self.ao_erro:
+                print(f"Erro no retorno da tarefa: {e!r}", file=sys.stderr)
+                return
+            try:
+                self.ao_erro(e)
+            except Exception as erro:
+                print(f"Erro no retorno da tarefa: {e!r} ({erro!r})", file=sys.stderr)
+
+    def _contabilizar(self, tarefa, espera, execucao, descartada):
+        with self._lock:
+            estatistica = self._estatisticas.setdefault(tarefa.nome, EstatisticaTarefa())
+            if descartada:
+                estatistica.descartadas += 1
+            if espera is not None:
+                estatistica.registrar(espera, execucao)
+        if espera is not None and self.metricas is not None:
+            self.metricas.registrar("tarefa", tarefa.nome, espera + execucao)
+
+    def _alterar_pendentes(self, delta):
+        antes = self._pendentes > 0
+        self._pendentes += delta
+        depois = self._pendentes > 0
+        if antes != depois and self.ao_mudar_ocupado:
+            self.ao_mudar_ocupado(depois)
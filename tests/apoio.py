@@ -0,0 +1,54 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Os módulos do projeto ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banco import Banco, agora_epoch  # noqa: E402
+from movimentacao import LOCAL_PADRAO, ServicoMovimentacao, ajustar_estoque_local  # noqa: E402
+
+# ==============================================
+# APOIO DOS TESTES
+# ==============================================
+
+
+class TesteComBanco(unittest.TestCase):
+    """
+    Cada teste recebe um banco novo, em arquivo (WAL, como na aplicação),
+    em uma pasta temporária removida ao final
+    """
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp(prefix="estoque_teste_")
+        self.caminho = os.path.join(self.pasta, "estoque.db")
+        self.banco = self.abrir_banco()
+
+    def tearDown(self):
+        self.banco.fechar()
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def abrir_banco(self):
+        """Abre (e migra) o banco do teste, sem métricas nem arquivo de consultas lentas"""
+        banco = Banco(self.caminho, metricas=None, limite_lenta_ms=None)
+        banco.inicializar()
+        return banco
+
+    def criar_produto(self, nome, quantidade, data=None, quantidade_minima=0):
+        """Cadastra um produto com a entrada inicial no local padrão (na data informada); retorna o id"""
+        def cadastrar(cursor):
+            cursor.execute("INSERT INTO produtos (nome, quantidade, quantidade_minima) VALUES (?, 0, ?)",
+                           (nome, quantidade_minima))
+            produto_id = cursor.lastrowid
+            ajustar_estoque_local(cursor, produto_id, LOCAL_PADRAO, quantidade)
+            if quantidade:
+                cursor.execute(ServicoMovimentacao.SQL_HISTORICO,
+                               (produto_id, "entrada", quantidade, agora_epoch() if data is None else data,
+                                "teste", LOCAL_PADRAO, None))
+            return produto_id
+        return self.banco.executar_transacao(cadastrar)
+
+    def quantidade(self, produto_id):
+        return self.banco.consultar_um("SELECT quantidade FROM produtos WHERE id=?", (produto_id,))[0]
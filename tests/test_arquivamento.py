@@ -0,0 +1,69 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+import arquivamento
+import exclusao
+from apoio import TesteComBanco
+from banco import agora_epoch
+from movimentacao import ServicoMovimentacao
+
+
+class TesteArquivamentoEExclusao(TesteComBanco):
+    def setUp(self):
+        super().setUp()
+        self.antiga = int((datetime.now() - timedelta(days=800)).timestamp())
+        self.recente = agora_epoch()
+        servico = ServicoMovimentacao(self.banco)
+        self.produto_a = self.criar_produto("A", 50, data=self.antiga)
+        self.produto_b = self.criar_produto("B", 20, data=self.antiga)
+        # Movimentações antigas (arquivadas) e recentes (ficam no banco principal)
+        for dias, tipo, quantidade in ((700, "saida", 5), (500, "entrada", 8), (400, "saida", 3)):
+            data = int((datetime.now() - timedelta(days=dias)).timestamp())
+            for produto_id in (self.produto_a, self.produto_b):
+                self.banco.executar_transacao(servico._aplicar, produto_id, tipo, quantidade, "teste", data)
+        servico.registrar(self.produto_a, "saida", 2, "teste")
+        servico.registrar(self.produto_b, "saida", 1, "teste")
+
+    def _movimentacoes(self, produto_id):
+        total = self.banco.consultar_um("SELECT COUNT(*) FROM movimentacoes WHERE produto_id=?", (produto_id,))[0]
+        for tabela, _ in arquivamento.fontes_movimentacoes(self.banco, todos=True)[1:]:
+            total += self.banco.consultar_um(f"SELECT COUNT(*) FROM {tabela} WHERE produto_id=?", (produto_id,))[0]
+        return total
+
+    def test_arquivar_mantem_os_saldos(self):
+        movidas = arquivamento.arquivar(self.banco, dias=365, tamanho_bloco=2)
+
+        self.assertEqual(movidas, 8)
+        self.assertEqual(self.banco.consultar_um("SELECT COUNT(*) FROM movimentacoes")[0], 2)
+        self.assertTrue(all(os.path.exists(a.caminho) for a in arquivamento.listar_arquivos(self.banco)))
+        self.assertEqual(arquivamento.conferir_saldos(self.banco), [])
+        self.assertEqual(self.quantidade(self.produto_a), 48)
+        # Repetir não move nada
+        self.assertEqual(arquivamento.arquivar(self.banco, dias=365), 0)
+
+    def test_excluir_e_purgar_depois_de_arquivar(self):
+        arquivamento.arquivar(self.banco, dias=365)
+        maior_arquivado = max(
+            self.banco.consultar_um(f"SELECT MAX(id) FROM {tabela}")[0] or 0
+            for tabela, _ in arquivamento.fontes_movimentacoes(self.banco, todos=True)
+        )
+
+        exclusao.excluir_produto(self.banco, self.produto_b)
+        removidas = exclusao.purgar_produto(self.banco, self.produto_b, tamanho_bloco=2, pausa=0)
+
+        self.assertEqual(removidas, 5)
+        self.assertEqual(self._movimentacoes(self.produto_b), 0)
+        self.assertIsNone(self.banco.consultar_um("SELECT 1 FROM produtos WHERE id=?", (self.produto_b,)))
+        for tabela in ("saldos_abertura", "estoque_local", "consumo_diario", "consumo_mensal"):
+            self.assertEqual(self.banco.consultar_um(
+                f"SELECT COUNT(*) FROM {tabela} WHERE produto_id=?", (self.produto_b,))[0], 0, tabela)
+        self.assertEqual(arquivamento.conferir_saldos(self.banco), [])
+
+        # A purga apagou a movimentação de maior id: os ids novos continuam acima dos arquivados
+        ServicoMovimentacao(self.banco).registrar(self.produto_a, "entrada", 1, "teste")
+        self.assertGreater(self.banco.consultar_um("SELECT MAX(id) FROM movimentacoes")[0], maior_arquivado)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import sqlite3
+import unittest
+from datetime import datetime
+
+from apoio import TesteComBanco
+from arquivamento import conferir_saldos
+from migracoes import VERSAO_ATUAL
+
+
+class TesteMigracaoBancoAntigo(TesteComBanco):
+    def abrir_banco(self):
+        # Banco da versão original: datas em texto ('AAAA-MM-DD HH:MM:SS', hora local)
+        conn = sqlite3.connect(self.caminho)
+        conn.executescript('''
+            CREATE TABLE usuarios (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, perfil TEXT);
+            CREATE TABLE produtos (id INTEGER PRIMARY KEY, nome TEXT UNIQUE, quantidade INTEGER,
+                                   quantidade_minima INTEGER);
+            CREATE TABLE movimentacoes (id INTEGER PRIMARY KEY, produto_id INTEGER, tipo TEXT, quantidade INTEGER,
+                                        data TEXT, usuario TEXT, FOREIGN KEY (produto_id) REFERENCES produtos(id));
+            INSERT INTO produtos (id, nome, quantidade, quantidade_minima) VALUES (1, 'Parafuso', 7, 2);
+            INSERT INTO movimentacoes (produto_id, tipo, quantidade, data, usuario)
+            VALUES (1, 'entrada', 10, '2024-03-05 10:20:30', 'admin'),
+                   (1, 'saida', 3, '2024-03-06 08:00:00', 'admin');
+        ''')
+        conn.close()
+        return super().abrir_banco()
+
+    def test_versao_atual(self):
+        self.assertEqual(self.banco.consultar_um("PRAGMA user_version")[0], VERSAO_ATUAL)
+
+    def test_datas_em_texto_viram_epoch(self):
+        datas = [linha[0] for linha in self.banco.consultar("SELECT data FROM movimentacoes ORDER BY id")]
+        self.assertEqual(datas, [int(datetime(2024, 3, 5, 10, 20, 30).timestamp()),
+                                 int(datetime(2024, 3, 6, 8, 0, 0).timestamp())])
+
+    def test_estoque_e_totais_preservados(self):
+        self.assertEqual(self.quantidade(1), 7)
+        self.assertEqual(self.banco.consultar("SELECT local_id, quantidade FROM estoque_local WHERE produto_id=1"),
+                         [(1, 7)])
+        self.assertEqual(self.banco.consultar("SELECT dia, entradas, saidas FROM consumo_diario ORDER BY dia"),
+                         [("2024-03-05", 10, 0), ("2024-03-06", 0, 3)])
+        self.assertEqual(conferir_saldos(self.banco), [])
+
+    def test_migrar_de_novo_nao_altera_nada(self):
+        self.banco.fechar()
+        self.banco = super().abrir_banco()
+        self.assertEqual(self.banco.consultar_um("SELECT COUNT(*) FROM movimentacoes")[0], 2)
+        self.assertEqual(self.quantidade(1), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import threading
+import unittest
+
+from apoio import TesteComBanco
+from locais import criar_local
+from movimentacao import EstoqueInsuficienteError, LoteInvalidoError, ServicoMovimentacao
+
+
+class TesteSaidasConcorrentes(TesteComBanco):
+    def test_saidas_simultaneas_nunca_deixam_o_estoque_negativo(self):
+        """20 threads retiram 10 unidades de um estoque de 100: exatamente 10 conseguem"""
+        produto_id = self.criar_produto("Parafuso", 100)
+        servico = ServicoMovimentacao(self.banco)
+        largada = threading.Barrier(20)
+        aceitas, recusadas, erros = [], [], []
+
+        def retirar():
+            largada.wait()
+            try:
+                aceitas.append(servico.registrar(produto_id, "saida", 10, "teste"))
+            except EstoqueInsuficienteError:
+                recusadas.append(1)
+            except Exception as e:
+                erros.append(e)
+
+        threads = [threading.Thread(target=retirar) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(erros, [])
+        self.assertEqual(len(aceitas), 10)
+        self.assertEqual(len(recusadas), 10)
+        self.assertEqual(sorted(aceitas), list(range(0, 100, 10)))
+        self.assertEqual(self.quantidade(produto_id), 0)
+        self.assertEqual(self.banco.consultar_um(
+            "SELECT COUNT(*) FROM movimentacoes WHERE produto_id=? AND tipo='saida'", (produto_id,))[0], 10)
+
+
+class TesteLote(TesteComBanco):
+    def test_lote_com_linha_invalida_nao_grava_nada(self):
+        produto_a = self.criar_produto("A", 10)
+        produto_b = self.criar_produto("B", 5)
+        movimentacoes_antes = self.banco.consultar_um("SELECT COUNT(*) FROM movimentacoes")[0]
+        servico = ServicoMovimentacao(self.banco)
+
+        with self.assertRaises(LoteInvalidoError) as contexto:
+            servico.registrar_lote([
+                (produto_a, "saida", 4),
+                (produto_b, "entrada", 3),
+                (produto_a, "saida", 7),  # 10 - 4 - 7 < 0
+                (999, "entrada", 1),  # produto inexistente
+            ], "teste")
+
+        self.assertEqual([r.linha for r in contexto.exception.falhas], [3, 4])
+        self.assertEqual(self.quantidade(produto_a), 10)
+        self.assertEqual(self.quantidade(produto_b), 5)
+        self.assertEqual(self.banco.consultar_um("SELECT COUNT(*) FROM movimentacoes")[0], movimentacoes_antes)
+
+    def test_lote_valido_grava_todas_as_linhas(self):
+        produto_a = self.criar_produto("A", 10)
+        resultados = ServicoMovimentacao(self.banco).registrar_lote(
+            [(produto_a, "saida", 4), (produto_a, "entrada", 2)], "teste"
+        )
+        self.assertEqual([r.saldo for r in resultados], [6, 8])
+        self.assertEqual(self.quantidade(produto_a), 8)
+
+
+class TesteTransferencias(TesteComBanco):
+    def _soma_locais(self, produto_id):
+        return self.banco.consultar_um("SELECT SUM(quantidade) FROM estoque_local WHERE produto_id=?",
+                                       (produto_id,))[0]
+
+    def test_transferencia_mantem_o_total_igual_a_soma_dos_locais(self):
+        produto_id = self.criar_produto("Cabo", 30)
+        deposito = criar_local(self.banco, "Depósito")
+        servico = ServicoMovimentacao(self.banco)
+
+        servico.transferir(produto_id, 1, deposito, 12, "teste")
+        servico.registrar(produto_id, "saida", 5, "teste", deposito)
+
+        self.assertEqual(self.quantidade(produto_id), 25)
+        self.assertEqual(self._soma_locais(produto_id), 25)
+        self.assertEqual(self.banco.consultar(
+            "SELECT local_id, quantidade FROM estoque_local WHERE produto_id=? ORDER BY local_id", (produto_id,)),
+            [(1, 18), (deposito, 7)])
+        # A transferência não conta como consumo
+        self.assertEqual(self.banco.consultar_um(
+            "SELECT SUM(saidas) FROM consumo_diario WHERE produto_id=?", (produto_id,))[0], 5)
+
+    def test_transferencia_recusada_nao_grava_nada(self):
+        produto_id = self.criar_produto("Cabo", 30)
+        deposito = criar_local(self.banco, "Depósito")
+
+        with self.assertRaises(EstoqueInsuficienteError):
+            ServicoMovimentacao(self.banco).transferir(produto_id, 1, deposito, 31, "teste")
+
+        self.assertEqual(self.quantidade(produto_id), 30)
+        self.assertEqual(self._soma_locais(produto_id), 30)
+        self.assertEqual(self.banco.consultar_um("SELECT COUNT(*) FROM transferencias")[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()